@@ -0,0 +1,134 @@
+"""
+Air Quality Index from pollutant concentrations (CPCB National AQI).
+
+Each pollutant has a breakpoint table mapping concentration ranges onto the
+AQI bands 0-50, 51-100, 101-200, 201-300, 301-400 and 401-500; the sub-index
+is linear within a range and the overall AQI is the highest sub-index::
+
+    PM2.5 (µg/m³)  0-30  31-60  61-90  91-120  121-250  250+
+    NO2   (µg/m³)  0-40  41-80  81-180 181-280 281-400  400+
+    CO    (mg/m³)  0-1   1.1-2  2.1-10 10.1-17 17.1-34  34+
+
+Concentrations above the last breakpoint are capped at 500.
+
+``compute`` takes whole arrays (the ingest pipeline and the simulator pass
+one batch at a time); ``reading_aqi`` is the scalar shortcut. Categories are
+the ``core.AqiCategory`` codes, so readings store a small integer instead of
+name and color strings.
+"""
+import numpy as np
+
+from core.models import AqiCategory
+
+AQI_BREAKPOINTS = np.array([0, 50, 100, 200, 300, 400, 500], dtype=float)
+
+# pollutant -> concentration at each AQI breakpoint
+BREAKPOINTS = {
+    'pm25': np.array([0, 30, 60, 90, 120, 250, 380], dtype=float),
+    'no2': np.array([0, 40, 80, 180, 280, 400, 520], dtype=float),
+    'co': np.array([0, 1, 2, 10, 17, 34, 51], dtype=float),
+}
+
+# Upper AQI bound of every category but the last, for searchsorted
+_UPPER_BOUNDS = np.array([level[4] for level in AqiCategory.LEVELS[:-1]], dtype=float)
+
+# Names written by older clients and the old simulator
+LEGACY_NAMES = {
+    'excellent': AqiCategory.GOOD,
+    'unhealthy': AqiCategory.VERY_POOR,
+}
+CODES_BY_NAME = {level[1].lower(): level[0] for level in AqiCategory.LEVELS}
+CODES_BY_NAME.update(LEGACY_NAMES)
+
+
+def _as_array(values):
+    """1-d float array; numpy turns None into NaN."""
+    return np.atleast_1d(np.asarray(values, dtype=float))
+
+
+def sub_index(pollutant, concentrations):
+    """AQI sub-index of ``pollutant`` for an array of concentrations (NaN stays NaN)."""
+    values = _as_array(concentrations)
+    result = np.interp(np.clip(values, 0, None), BREAKPOINTS[pollutant], AQI_BREAKPOINTS)
+    result[np.isnan(values)] = np.nan
+    return result
+
+
+def category_codes(aqi):
+    """``AqiCategory`` code for each AQI value; 0 where the AQI is unknown."""
+    values = _as_array(aqi)
+    codes = np.searchsorted(_UPPER_BOUNDS, np.floor(values + 0.5), side='left') + 1
+    return np.where(np.isnan(values), 0, codes).astype(np.int16)
+
+
+def compute(pm25=None, no2=None, co=None):
+    """
+    AQI for a batch of readings.
+
+    Returns ``(aqi, codes)``: the rounded overall AQI (NaN where no pollutant
+    is known) and the category codes (0 for those).
+    """
+    indices = [
+        sub_index(name, values)
+        for name, values in (('pm25', pm25), ('no2', no2), ('co', co))
+        if values is not None
+    ]
+    if not indices:
+        raise ValueError("compute() needs at least one pollutant")
+    aqi = np.floor(np.fmax.reduce(indices) + 0.5)
+    return aqi, category_codes(aqi)
+
+
+def reading_aqi(pm25=None, no2=None, co=None):
+    """``(aqi, code)`` for one reading, or ``(None, None)`` if nothing is known."""
+    if pm25 is None and no2 is None and co is None:
+        return None, None
+    aqi, codes = compute(pm25, no2, co)
+    if np.isnan(aqi[0]):
+        return None, None
+    return int(aqi[0]), int(codes[0])
+
+
+def classify(rows):
+    """
+    Fill ``category_id`` of a batch of reading field dicts in place, computing
+    ``air_quality`` from pm25 / no_level (NO2) / co_level (CO) where missing.
+    """
+    if not rows:
+        return rows
+    aqi = _as_array([row.get('air_quality') for row in rows])
+    missing = np.isnan(aqi)
+    if missing.any():
+        computed, _ = compute(
+            [row.get('pm25') for row in rows],
+            [row.get('no_level') for row in rows],
+            [row.get('co_level') for row in rows],
+        )
+        aqi = np.where(missing, computed, aqi)
+    for row, was_missing, value, code in zip(rows, missing, aqi.tolist(), category_codes(aqi).tolist()):
+        if was_missing and value == value:
+            row['air_quality'] = value
+        if code:
+            row['category_id'] = code
+    return rows
+
+
+def category_code(aqi):
+    if aqi is None:
+        return None
+    return int(category_codes([aqi])[0]) or None
+
+
+def category_for(value):
+    """Code for a category given as code or name (any case), or None."""
+    try:
+        code = int(value)
+    except (TypeError, ValueError):
+        return CODES_BY_NAME.get(str(value).strip().lower())
+    return code if code in AqiCategory.BY_CODE else None
+
+
+def describe(code):
+    """``(name, color)`` of a category code, empty strings when unknown."""
+    level = AqiCategory.BY_CODE.get(code)
+    return (level[1], level[2]) if level else ("", "")
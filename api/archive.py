@@ -0,0 +1,490 @@
+"""
+Columnar archive of historical readings (Parquet via pyarrow).
+
+Readings are exported one file per sensor and UTC day::
+
+    <READING_ARCHIVE_DIR>/sensor=<sensor_id>/<YYYY-MM-DD>.parquet
+
+with ``sensor_id`` dictionary-encoded, so the repeated string costs a few
+bytes per row, and the AQI category kept as its int8 ``core.AqiCategory``
+code. Files written before the code replaced the name/color strings are
+converted when read. Once a day is archived, ``prune_archived`` deletes its rows from the
+hot ``Reading`` table - only rows whose ids are verifiably in the partition
+file - and records the cut-off in ``_manifest.json``.
+
+``read_archive`` / ``merge_rows`` let the read endpoints serve ranges older
+than that cut-off from the archive and the rest from the database, de-duplicated
+by reading id, so pruning is transparent to callers. Rollups are not pruned:
+bucketed history keeps coming from the rollup tables.
+
+pyarrow is an optional dependency; without it every entry point raises
+``ArchiveError`` and the read endpoints simply skip the archive.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Reading
+from .cache import invalidate_sensors
+from . import aqi
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "_manifest.json"
+UNASSIGNED = "_unassigned"
+PRUNE_BATCH_SIZE = 5000
+EXPORT_CHUNK_SIZE = 20000
+
+# Columns in file order; sensor_id is the Sensor.sensor_id string, not the FK
+DICTIONARY_COLUMNS = ("sensor_id",)
+COLUMNS = (
+    "id", "sensor_id", "slave_id", "timestamp", "temperature", "humidity",
+    "air_quality", "pm25", "category_id", "co_level", "no_level",
+    "smoke", "latitude", "longitude",
+)
+DB_FIELDS = tuple("sensor__sensor_id" if c == "sensor_id" else c for c in COLUMNS)
+
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class ArchiveError(Exception):
+    """Raised when the archive cannot be used (e.g. pyarrow is missing)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def available():
+    return pa is not None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ArchiveError(
+            "pyarrow is not installed; run `pip install pyarrow` to use the reading archive",
+            status=501,
+        )
+
+
+def schema():
+    require_pyarrow()
+    text = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        "id": pa.int64(),
+        "sensor_id": text,
+        "slave_id": pa.int32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "category_id": pa.int8(),
+    }
+    return pa.schema([(name, types.get(name, pa.float64())) for name in COLUMNS])
+
+
+def archive_root():
+    return str(getattr(settings, "READING_ARCHIVE_DIR", os.path.join(settings.BASE_DIR, "archive", "readings")))
+
+
+def day_floor(value):
+    """Start of the UTC day containing ``value``."""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime.combine(value.date(), dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def partition_path(sensor_id, day, root=None):
+    directory = f"sensor={quote(sensor_id or UNASSIGNED, safe='')}"
+    return os.path.join(root or archive_root(), directory, f"{day:%Y-%m-%d}.parquet")
+
+
+def partitions(sensor_ids=None, start=None, end=None, root=None):
+    """``[(sensor_id, day, path)]`` of existing partitions overlapping [start, end)."""
+    root = root or archive_root()
+    if not os.path.isdir(root):
+        return []
+    wanted = {s or UNASSIGNED for s in sensor_ids} if sensor_ids is not None else None
+    first = f"{day_floor(start):%Y-%m-%d}" if start else None
+    last = f"{end.astimezone(dt_timezone.utc):%Y-%m-%d}" if end else None
+
+    found = []
+    for entry in os.scandir(root):
+        if not entry.is_dir() or not entry.name.startswith("sensor="):
+            continue
+        sensor_id = unquote(entry.name[len("sensor="):])
+        if wanted is not None and sensor_id not in wanted:
+            continue
+        for item in os.scandir(entry.path):
+            name = item.name
+            if not name.endswith(".parquet"):
+                continue
+            stamp = name[:-len(".parquet")]
+            if (first and stamp < first) or (last and stamp > last):
+                continue
+            day = datetime.strptime(stamp, "%Y-%m-%d").replace(tzinfo=dt_timezone.utc)
+            found.append((None if sensor_id == UNASSIGNED else sensor_id, day, item.path))
+    found.sort(key=lambda p: (p[1], p[0] or ""))
+    return found
+
+
+# ----------------------------------------------------------------------
+# manifest
+# ----------------------------------------------------------------------
+
+_manifest_cache = {"mtime": None, "value": {}}
+_manifest_lock = threading.Lock()
+
+
+def read_manifest(root=None):
+    path = os.path.join(root or archive_root(), MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _manifest_lock:
+        if _manifest_cache["mtime"] != (path, mtime):
+            with open(path) as f:
+                _manifest_cache["value"] = json.load(f)
+            _manifest_cache["mtime"] = (path, mtime)
+        return dict(_manifest_cache["value"])
+
+
+def write_manifest(values, root=None):
+    root = root or archive_root()
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    manifest.update(values)
+    path = os.path.join(root, MANIFEST_NAME)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def pruned_before(root=None):
+    """Readings before this instant may only exist in the archive (None if never pruned)."""
+    value = read_manifest(root).get("pruned_before")
+    return datetime.fromisoformat(value) if value else None
+
+
+# ----------------------------------------------------------------------
+# rows <-> Arrow
+# ----------------------------------------------------------------------
+
+def rows_to_table(rows):
+    """Arrow table (archive schema) from ``.values(*DB_FIELDS)`` dicts."""
+    target = schema()
+    arrays = []
+    for name, field in zip(COLUMNS, DB_FIELDS):
+        values = [row.get(field, row.get(name)) for row in rows]
+        if name in DICTIONARY_COLUMNS:
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, target.field(name).type))
+    return pa.Table.from_arrays(arrays, schema=target)
+
+
+def table_to_rows(table):
+    """Plain dicts keyed like ``Reading.values()`` (``sensor_id`` is the sensor string)."""
+    return table.to_pylist()
+
+
+def read_partition(path):
+    """One partition file as an archive-schema table, upgrading older layouts."""
+    table = pq.read_table(path)
+    target = schema()
+    if "category_id" not in table.column_names and "aqi_category" in table.column_names:
+        names = table["aqi_category"].cast(pa.string()).to_pylist()
+        table = table.append_column(
+            "category_id", pa.array([aqi.category_for(n) for n in names], pa.int8())
+        )
+    columns = [
+        table[name] if name in table.column_names else pa.nulls(table.num_rows, field.type)
+        for name, field in zip(COLUMNS, target)
+    ]
+    return pa.Table.from_arrays(columns, names=list(COLUMNS)).cast(target)
+
+
+def write_partition(path, table):
+    """Write ``table`` into ``path``, merging with what is already archived there."""
+    if os.path.exists(path):
+        existing = read_partition(path)
+        fresh = table.filter(pc.invert(pc.is_in(table["id"], value_set=existing["id"])))
+        if not fresh.num_rows:
+            return 0
+        table = pa.concat_tables([existing, fresh]).unify_dictionaries()
+    else:
+        fresh = table
+
+    table = table.sort_by([("timestamp", "ascending"), ("id", "ascending")])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, compression="zstd", use_dictionary=list(DICTIONARY_COLUMNS))
+    os.replace(tmp, path)
+    return fresh.num_rows
+
+
+class _ChunkSink:
+    """Write-only file object collecting what a writer produced since the last ``take``."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def encode_stream(tables, fmt="parquet"):
+    """
+    Serialize archive-schema tables as they come, yielding bytes: a Parquet
+    file with a row group per table, or an Arrow IPC stream.
+    """
+    require_pyarrow()
+    if fmt not in CONTENT_TYPES:
+        raise ArchiveError(f"Unknown format '{fmt}', expected one of {sorted(CONTENT_TYPES)}")
+    sink = _ChunkSink()
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, schema())
+    else:
+        writer = pq.ParquetWriter(sink, schema(), compression="zstd", use_dictionary=list(DICTIONARY_COLUMNS))
+    with writer:
+        for table in tables:
+            if table.num_rows:
+                writer.write_table(table)
+                yield sink.take()
+    yield sink.take()
+
+
+# ----------------------------------------------------------------------
+# export / prune
+# ----------------------------------------------------------------------
+
+def _readings(before, sensor_ids=None, start=None):
+    qs = Reading.objects.filter(timestamp__lt=before)
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if sensor_ids:
+        qs = qs.filter(sensor__sensor_id__in=sensor_ids)
+    return qs
+
+
+def _grouped(qs, chunk_size=5000):
+    """Yield ``(sensor_id, day, rows)`` per partition, one partition in memory at a time."""
+    rows = (
+        qs.order_by("sensor_id", "timestamp", "id")
+        .values(*DB_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    key, batch = None, []
+    for row in rows:
+        row_key = (row["sensor__sensor_id"], day_floor(row["timestamp"]))
+        if row_key != key and batch:
+            yield key[0], key[1], batch
+            batch = []
+        key = row_key
+        batch.append(row)
+    if batch:
+        yield key[0], key[1], batch
+
+
+def export_partitions(before, sensor_ids=None, start=None, root=None):
+    """
+    Archive readings older than ``before`` (floored to a UTC day, so only
+    complete days are written). Returns ``{'partitions', 'rows'}`` counting
+    rows that were not archived yet.
+    """
+    require_pyarrow()
+    before = day_floor(before)
+    written_partitions = written_rows = 0
+    for sensor_id, day, rows in _grouped(_readings(before, sensor_ids, start)):
+        added = write_partition(partition_path(sensor_id, day, root), rows_to_table(rows))
+        if added:
+            written_partitions += 1
+            written_rows += added
+    return {"partitions": written_partitions, "rows": written_rows, "before": before}
+
+
+def prune_archived(before, sensor_ids=None, batch_size=PRUNE_BATCH_SIZE, root=None, dry_run=False):
+    """
+    Delete readings older than ``before`` (floored to a UTC day) whose ids
+    are present in their partition file. Rows missing from the archive (late
+    arrivals) are kept for the next export. Returns ``{'deleted', 'kept'}``.
+    """
+    require_pyarrow()
+    before = day_floor(before)
+    # Only the partitions that still have rows in the database - the ones
+    # export_partitions has just written - are opened, not the whole archive
+    hot = {}
+    rows = _readings(before, sensor_ids).values_list("id", "sensor__sensor_id", "timestamp")
+    for row_id, sensor_id, timestamp in rows.iterator(chunk_size=batch_size):
+        hot.setdefault((sensor_id, day_floor(timestamp)), []).append(row_id)
+
+    deletable, kept = [], 0
+    touched = set()
+    for (sensor_id, day), ids in hot.items():
+        path = partition_path(sensor_id, day, root)
+        archived = set(pq.read_table(path, columns=["id"])["id"].to_pylist()) if os.path.exists(path) else set()
+        for row_id in ids:
+            if row_id in archived:
+                deletable.append(row_id)
+                touched.add(sensor_id)
+            else:
+                kept += 1
+
+    if dry_run:
+        return {"deleted": len(deletable), "kept": kept, "before": before}
+
+    deleted = 0
+    for offset in range(0, len(deletable), batch_size):
+        chunk = deletable[offset:offset + batch_size]
+        deleted += Reading.objects.filter(id__in=chunk).delete()[0]
+
+    current = pruned_before(root)
+    if sensor_ids is None and (current is None or before > current):
+        write_manifest({"pruned_before": before.isoformat(), "pruned_at": timezone.now().isoformat()}, root)
+    invalidate_sensors(touched)
+    return {"deleted": deleted, "kept": kept, "before": before}
+
+
+# ----------------------------------------------------------------------
+# transparent reads
+# ----------------------------------------------------------------------
+
+def read_archive(start=None, end=None, sensor_ids=None, root=None):
+    """Archived readings with ``start <= timestamp < end`` as one Arrow table."""
+    require_pyarrow()
+    paths = [path for _, _, path in partitions(sensor_ids, start, end, root)]
+    return _read_paths(paths, start, end)
+
+
+def _between(table, start, end):
+    """Rows of ``table`` with ``start <= timestamp < end``."""
+    kind = table.schema.field("timestamp").type
+    mask = None
+    if start is not None:
+        mask = pc.greater_equal(table["timestamp"], pa.scalar(start, kind))
+    if end is not None:
+        upper = pc.less(table["timestamp"], pa.scalar(end, kind))
+        mask = upper if mask is None else pc.and_(mask, upper)
+    return table.filter(mask) if mask is not None else table
+
+
+def _read_paths(paths, start, end):
+    tables = [_between(read_partition(path), start, end) for path in paths]
+    if not tables:
+        return schema().empty_table()
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+def archived_range(start, end):
+    """The part of [start, end) that may only be in the archive, or None."""
+    cutoff = pruned_before()
+    if cutoff is None or (start is not None and start >= cutoff):
+        return None
+    return start, min(end, cutoff) if end else cutoff
+
+
+def merge_rows(hot_rows, start, end, sensor_ids=None, newest_first=True):
+    """
+    ``hot_rows`` (``.values()`` dicts including ``id``) plus archived rows in
+    the pruned part of [start, end), de-duplicated by id and sorted by time.
+    Returns ``hot_rows`` unchanged when nothing was pruned in that range or
+    the archive is unavailable.
+    """
+    span = archived_range(start, end)
+    if span is None or not available():
+        return hot_rows
+    try:
+        table = read_archive(span[0], span[1], sensor_ids)
+    except Exception as e:
+        logger.error(f"Error reading archived readings: {e}")
+        return hot_rows
+    if not table.num_rows:
+        return hot_rows
+
+    seen = {row["id"] for row in hot_rows}
+    rows = list(hot_rows) + [r for r in table_to_rows(table) if r["id"] not in seen]
+    rows.sort(key=lambda r: (r["timestamp"], r["id"]), reverse=newest_first)
+    return rows
+
+
+def export_tables(start, end, sensor_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Hot and archived readings in [start, end), oldest first, as a sequence of
+    Arrow tables for ``encode_stream``: the pruned part one archived day at
+    a time (merged with the few rows of it still in the database), then the
+    database rows in ``chunk_size`` batches straight from a server-side
+    iterator, so memory does not grow with the size of the range.
+    """
+    require_pyarrow()
+    qs = Reading.objects.all()
+    if start is not None:
+        qs = qs.filter(timestamp__gte=start)
+    if end is not None:
+        qs = qs.filter(timestamp__lt=end)
+    if sensor_ids:
+        qs = qs.filter(sensor__sensor_id__in=sensor_ids)
+    order = [("timestamp", "ascending"), ("id", "ascending")]
+
+    span = archived_range(start, end)
+    if span is not None:
+        # Rows of the pruned range that are still in the database: late
+        # arrivals and days not pruned yet. They win over their archived copy.
+        hot = rows_to_table(list(qs.filter(timestamp__lt=span[1]).values(*DB_FIELDS)))
+        qs = qs.filter(timestamp__gte=span[1])
+
+        by_day = {}
+        for _, day, path in partitions(sensor_ids, span[0], span[1]):
+            by_day.setdefault(day, []).append(path)
+        for stamp in hot["timestamp"].to_pylist():
+            by_day.setdefault(day_floor(stamp), [])
+
+        for day in sorted(by_day):
+            low = max(day, span[0]) if span[0] else day
+            high = min(day + timedelta(days=1), span[1])
+            archived = _read_paths(by_day[day], low, high)
+            archived = archived.filter(pc.invert(pc.is_in(archived["id"], value_set=hot["id"])))
+            table = pa.concat_tables([archived, _between(hot, low, high)]).unify_dictionaries()
+            yield table.sort_by(order)
+
+    rows = qs.order_by("timestamp", "id").values(*DB_FIELDS).iterator(chunk_size=chunk_size)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield rows_to_table(batch)
+            batch = []
+    if batch:
+        yield rows_to_table(batch)
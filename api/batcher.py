@@ -0,0 +1,155 @@
+"""
+Micro-batching of ingest writes for the async ingest views.
+
+Under ASGI one worker has many uploads in flight on its event loop. Rather
+than a transaction per request, ``submit`` parks each request's readings on
+the loop's ``MicroBatcher``. The batch is written when it holds
+``INGEST_BATCH_MAX_ROWS`` readings or ``INGEST_BATCH_MAX_WAIT_MS`` after its
+first one arrived: a single ``insert_readings`` call (one transaction, one
+``bulk_create``), or a single ``enqueue_readings`` when the ingest queue is
+enabled, run in Django's sync thread through ``sync_to_async``. Every request
+is answered only after the write it was part of committed.
+
+Writes go through one thread, so while a batch is being written the next
+one keeps filling: the busier the endpoint, the larger the batches.
+Duplicate readings are per-row errors of the request that sent them
+(``insert_readings`` looks the keys up first); a batch that still fails as
+a whole is retried request by request, so one bad upload does not fail the
+others it was batched with.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .ingest import insert_readings
+from .ingest_queue import enqueue_readings
+from . import metrics as app_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ROWS = 500
+DEFAULT_MAX_WAIT_MS = 10
+
+
+def split_results(results, errors, sizes):
+    """
+    Cut a batch's ``(results, errors)`` back into one pair per submission.
+
+    ``results`` has one entry per accepted row, in batch order; ``errors``
+    carry batch indexes, rebased here to the submission's own rows.
+    """
+    failed = {e['index'] for e in errors}
+    by_index = dict(zip((i for i in range(sum(sizes)) if i not in failed), results))
+    parts, start = [], 0
+    for size in sizes:
+        end = start + size
+        parts.append((
+            [by_index[i] for i in range(start, end) if i in by_index],
+            [dict(e, index=e['index'] - start) for e in errors if start <= e['index'] < end],
+        ))
+        start = end
+    return parts
+
+
+class MicroBatcher:
+    """
+    Collects submissions on one event loop and writes them together with
+    ``write(rows) -> (results, errors)``, a synchronous function run through
+    ``sync_to_async``.
+    """
+
+    def __init__(self, write, max_rows=DEFAULT_MAX_ROWS, max_wait=DEFAULT_MAX_WAIT_MS / 1000, name="write"):
+        self.write = write
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.name = name
+        self._pending = []
+        self._rows = 0
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, rows):
+        """Add ``rows`` to the next batch; ``(results, errors)`` for them once it is written."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(rows), future))
+        self._rows += len(rows)
+        if self._rows >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """Start writing everything pending."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._rows = self._pending, [], 0
+        if not batch:
+            return
+        # A fresh context: the write belongs to no single request, so its
+        # queries must not count towards the one that happened to trigger it
+        task = asyncio.get_running_loop().create_task(self._write(batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch):
+        rows = [row for submitted, _ in batch for row in submitted]
+        started = time.perf_counter()
+        try:
+            results, errors = await sync_to_async(self.write)(rows)
+        except Exception as e:
+            app_metrics.ingest_batches.inc(mode=self.name, result="error")
+            if len(batch) == 1:
+                _resolve(batch[0][1], error=e)
+                return
+            logger.warning(f"Ingest batch of {len(rows)} readings failed ({e}); retrying per request")
+            for submitted, future in batch:
+                try:
+                    outcome = await sync_to_async(self.write)(submitted)
+                except Exception as row_error:
+                    _resolve(future, error=row_error)
+                else:
+                    _resolve(future, outcome)
+            return
+
+        app_metrics.ingest_batches.inc(mode=self.name, result="ok")
+        app_metrics.ingest_batch_rows.observe(len(rows), mode=self.name)
+        app_metrics.ingest_batch_requests.observe(len(batch), mode=self.name)
+        app_metrics.ingest_batch_duration.observe(time.perf_counter() - started, mode=self.name)
+        parts = split_results(results, errors, [len(submitted) for submitted, _ in batch])
+        for (_, future), outcome in zip(batch, parts):
+            _resolve(future, outcome)
+
+
+def _resolve(future, result=None, error=None):
+    # The request may have been cancelled (client went away) meanwhile
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def get_batcher(queued=False):
+    """The running loop's batcher for direct writes, or for the ingest queue with ``queued``."""
+    loop = asyncio.get_running_loop()
+    batchers = _batchers.setdefault(loop, {})
+    if queued not in batchers:
+        batchers[queued] = MicroBatcher(
+            enqueue_readings if queued else insert_readings,
+            max_rows=getattr(settings, 'INGEST_BATCH_MAX_ROWS', DEFAULT_MAX_ROWS),
+            max_wait=getattr(settings, 'INGEST_BATCH_MAX_WAIT_MS', DEFAULT_MAX_WAIT_MS) / 1000,
+            name="queue" if queued else "write",
+        )
+    return batchers[queued]
@@ -0,0 +1,198 @@
+"""
+Response cache for the read endpoints, invalidated by version counters.
+
+Every cached response is keyed on the endpoint path, its query string and
+the current version of the scopes it depends on (``sensor:<sensor_id>``,
+``sensors`` for anything spanning all sensors, ``simulation`` for the
+simulator history). Ingest paths bump the versions of the sensors they wrote
+to, so stale entries are simply never looked up again and age out.
+
+Versions live in the same cache backend as the responses: the default
+local-memory backend works for a single process, and pointing
+``RESPONSE_CACHE_ALIAS`` at a shared backend (Redis, Memcached) makes
+invalidation work across processes too.
+
+The version tuple also gives a cheap ETag and the time of the last bump a
+Last-Modified, so polling clients get a 304 without the view running.
+
+Endpoints whose window is relative to now (``?hours=``, forecasts) change
+even when nothing is ingested. With ``relative_time=True`` their key, ETag
+and Last-Modified also carry the current ``RESPONSE_CACHE_WINDOW``-second
+bucket, and the response says ``max-age`` until the bucket ends, so a
+cached answer is never older than one window.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "aqi"
+ALL_SENSORS = "sensors"
+SIMULATION = "simulation"
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def sensor_scope(sensor_id):
+    return f"sensor:{sensor_id}"
+
+
+def _version_key(scope):
+    return f"{KEY_PREFIX}:v:{scope}"
+
+
+def _modified_key(scope):
+    return f"{KEY_PREFIX}:m:{scope}"
+
+
+def scope_state(scopes):
+    """``(versions, last_modified)`` for ``scopes``; unseen scopes are version 0."""
+    cache = get_cache()
+    keys = [_version_key(s) for s in scopes] + [_modified_key(s) for s in scopes]
+    found = cache.get_many(keys)
+    versions = tuple(found.get(_version_key(s), 0) for s in scopes)
+    stamps = [found[_modified_key(s)] for s in scopes if _modified_key(s) in found]
+    return versions, max(stamps) if stamps else None
+
+
+def bump(*scopes):
+    """Invalidate every cached response depending on ``scopes``."""
+    cache = get_cache()
+    now = time.time()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # First bump since the backend started: start above the implicit 0
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+    cache.set_many({_modified_key(s): now for s in scopes}, timeout=None)
+
+
+def invalidate_sensors(sensor_ids):
+    """Bump the given sensors (and the all-sensors scope) once the transaction commits."""
+    scopes = [sensor_scope(s) for s in sorted({str(s) for s in sensor_ids if s})]
+    if not scopes:
+        return
+
+    def _bump():
+        try:
+            bump(ALL_SENSORS, *scopes)
+        except Exception as e:
+            logger.error(f"Error invalidating response cache: {e}")
+
+    transaction.on_commit(_bump)
+
+
+def invalidate_readings(readings):
+    """``invalidate_sensors`` for a batch of saved Reading instances."""
+    invalidate_sensors(r.sensor.sensor_id for r in readings if r.sensor_id)
+
+
+def time_bucket(now=None):
+    """``(start, seconds left)`` of the ``RESPONSE_CACHE_WINDOW`` bucket containing ``now``."""
+    window = getattr(settings, 'RESPONSE_CACHE_WINDOW', 60)
+    now = time.time() if now is None else now
+    start = int(now - now % window)
+    return start, max(1, int(start + window - now))
+
+
+def cached_response(scopes, timeout=None, relative_time=False):
+    """
+    Cache successful GET responses of a view.
+
+    ``scopes(request, *args, **kwargs)`` returns the version scopes the
+    response depends on. ``relative_time`` marks views whose result moves
+    with the clock. Works on plain Django views and, through
+    ``method_decorator``, on DRF viewset ``dispatch``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            try:
+                scope_names = list(scopes(request, *args, **kwargs))
+                versions, last_modified = scope_state(scope_names)
+            except Exception as e:
+                logger.error(f"Response cache unavailable: {e}")
+                return view(request, *args, **kwargs)
+
+            accept = request.META.get('HTTP_ACCEPT', '')
+            raw = f"{request.path}?{request.GET.urlencode()}|{accept}|{scope_names}|{versions}"
+            max_age = timeout if timeout is not None else getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+            if relative_time:
+                bucket, remaining = time_bucket()
+                raw += f"|{bucket}"
+                last_modified = max(last_modified or 0, bucket)
+                max_age = min(max_age, remaining)
+            digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+            etag = quote_etag(digest)
+
+            not_modified = get_conditional_response(
+                request, etag=etag,
+                last_modified=int(last_modified) if last_modified else None,
+            )
+            if not_modified is not None:
+                return not_modified
+
+            cache = get_cache()
+            key = f"{KEY_PREFIX}:r:{digest}"
+            entry = cache.get(key)
+            if entry is not None:
+                response = HttpResponse(entry['content'], status=entry['status'],
+                                        content_type=entry['content_type'])
+                response['X-Cache'] = 'HIT'
+            else:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+                    response.render()
+                if response.status_code != 200 or response.streaming:
+                    return response
+                cache.set(key, {
+                    'content': response.content,
+                    'status': response.status_code,
+                    'content_type': response['Content-Type'],
+                }, max_age)
+                response['X-Cache'] = 'MISS'
+
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            if relative_time:
+                patch_cache_control(response, max_age=max_age)
+            return response
+        return wrapper
+    return decorator
+
+
+# Scope functions for the endpoints in views.py
+
+def scope_all_sensors(request, *args, **kwargs):
+    return [ALL_SENSORS]
+
+
+def scope_sensor(request, sensor_id, *args, **kwargs):
+    return [sensor_scope(sensor_id)]
+
+
+def scope_sensor_ids(request, *args, **kwargs):
+    ids = sorted({i.strip() for i in request.GET.get('ids', '').split(',') if i.strip()})
+    return [sensor_scope(i) for i in ids] if ids else [ALL_SENSORS]
+
+
+def scope_simulation(request, *args, **kwargs):
+    return [SIMULATION]
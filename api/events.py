@@ -0,0 +1,88 @@
+"""
+In-process event bus feeding the Server-Sent Events stream.
+
+The simulator thread publishes readings, log lines and status changes here.
+Events are kept in a bounded deque with increasing ids so a reconnecting
+client can resume from its ``Last-Event-ID``. Async subscribers (the SSE
+view running under ASGI) park on an ``asyncio.Event`` that ``publish`` sets
+from the producer thread with ``call_soon_threadsafe``, so an idle dashboard
+costs no worker and no polling.
+"""
+import asyncio
+import threading
+import uuid
+from collections import deque
+
+
+class EventBus:
+    def __init__(self, maxlen=1000):
+        # Ids are prefixed with a per-process epoch so that a client resuming
+        # against a restarted server gets a full replay instead of a gap.
+        self.epoch = uuid.uuid4().hex[:8]
+        self._events = deque(maxlen=maxlen)
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def format_id(self, seq):
+        return f"{self.epoch}:{seq}"
+
+    def parse_id(self, value):
+        """Turn a Last-Event-ID into a cursor; None means replay everything."""
+        if not value:
+            return None
+        epoch, _, seq = str(value).partition(":")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    @property
+    def last_id(self):
+        with self._lock:
+            return self._last_id
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            waiters = list(self._waiters)
+            seq = self._last_id
+
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                pass
+        return seq
+
+    def since(self, cursor=None):
+        """Events after ``cursor`` as (seq, type, data) tuples."""
+        with self._lock:
+            if cursor is None or cursor > self._last_id:
+                return list(self._events)
+            return [e for e in self._events if e[0] > cursor]
+
+    async def wait(self, cursor, timeout=15.0):
+        """Wait until there are events after ``cursor`` or ``timeout`` elapses."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            events = self.since(cursor)
+            if events:
+                return events
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            return self.since(cursor)
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+event_bus = EventBus()
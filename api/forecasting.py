@@ -0,0 +1,254 @@
+"""
+Vectorized AQI forecasting.
+
+A sensor's last 48 hours of ``air_quality`` are loaded from its 1-minute
+rollups (one row per minute instead of every raw reading) into NumPy arrays
+and fitted by weighted least squares, each minute weighted by its reading
+count, to a linear trend plus hour-of-day harmonics (24 h and 12 h periods,
+which capture the morning/evening rush-hour peaks). Sensors without rollups
+yet (e.g. before ``manage.py backfill_rollups``) fall back to raw readings. Fitted parameters are cached per sensor
+keyed on the id of its latest reading, so a page view only refits after new
+readings arrive; otherwise the forecast is just the model evaluated at the
+next 24 hours.
+"""
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.db import models
+from django.utils import timezone
+
+from core.models import Sensor, Reading, ReadingRollup
+
+HISTORY_HOURS = 48
+FORECAST_HOURS = 24
+MIN_POINTS = 5
+
+# Harmonics are only fitted once the history spans most of a day.
+SEASONAL_MIN_SPAN_HOURS = 12
+HARMONICS = (1, 2)
+
+AQI_FLOOR, AQI_CEILING = 10, 200
+# Slopes smaller than this (AQI per hour) are reported as "stable".
+TREND_EPSILON = 0.05
+
+_model_cache = {}
+_cache_lock = threading.Lock()
+
+
+class ForecastError(Exception):
+    """Raised when a sensor has too little history to forecast."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def design_matrix(hours, origin, seasonal):
+    """
+    Columns [1, t - origin, sin/cos(2πk·t/24) ...] for ``hours`` since the
+    epoch. The trend is centred on ``origin`` to keep the system well
+    conditioned; the harmonics stay on absolute time so they follow the clock.
+    """
+    columns = [np.ones_like(hours), hours - origin]
+    if seasonal:
+        for k in HARMONICS:
+            angle = hours * (2 * np.pi * k / 24.0)
+            columns.extend((np.sin(angle), np.cos(angle)))
+    return np.column_stack(columns)
+
+
+def fit(hours, values, weights=None, current=None):
+    """
+    Least-squares fit of the trend + hour-of-day model to one series, each
+    point weighted by ``weights`` (the number of readings it stands for).
+    """
+    if weights is None:
+        weights = np.ones_like(values)
+    origin = hours[-1]
+    seasonal = (
+        hours[-1] - hours[0] >= SEASONAL_MIN_SPAN_HOURS
+        and len(values) > 2 + 2 * len(HARMONICS)
+    )
+    X = design_matrix(hours, origin, seasonal)
+    scale = np.sqrt(weights)
+    coef, *_ = np.linalg.lstsq(X * scale[:, None], values * scale, rcond=None)
+    residual = values - X @ coef
+    return {
+        'origin': origin,
+        'coef': coef,
+        'seasonal': seasonal,
+        'residual_std': float(np.sqrt(np.average((residual - np.average(residual, weights=weights)) ** 2, weights=weights))),
+        'level': float(np.average(values, weights=weights)),
+        'current': float(values[-1] if current is None else current),
+    }
+
+
+def predict(model, hours):
+    return design_matrix(hours, model['origin'], model['seasonal']) @ model['coef']
+
+
+def split_series(sensor_col, hours, values, weights, current):
+    """Cut columns ordered by sensor into {sensor pk: (hours, values, weights, current)}."""
+    # Rows are ordered by sensor, so each sensor is one contiguous run.
+    boundaries = np.flatnonzero(np.diff(sensor_col)) + 1
+    series = {}
+    for idx in np.split(np.arange(len(values)), boundaries):
+        series[int(sensor_col[idx[0]])] = (hours[idx], values[idx], weights[idx], float(current[idx[-1]]))
+    return series
+
+
+def load_rollup_series(sensor_ids, start, end):
+    """
+    Minute means of ``air_quality`` for ``sensor_ids`` in a single query,
+    placed at the middle of their minute and weighted by reading count.
+    """
+    rows = ReadingRollup.objects.filter(
+        sensor_id__in=sensor_ids,
+        resolution=ReadingRollup.MINUTE,
+        bucket_start__gte=start,
+        bucket_start__lte=end,
+        air_quality_count__gt=0,
+    ).order_by('sensor_id', 'bucket_start').values_list(
+        'sensor_id', 'bucket_start', 'air_quality_count', 'air_quality_sum', 'air_quality_last'
+    )
+
+    columns = list(zip(*rows))
+    if not columns:
+        return {}
+    sensor_col, starts, counts, sums, last = columns
+    counts = np.asarray(counts, dtype=float)
+    hours = (np.asarray([b.timestamp() for b in starts]) + ReadingRollup.MINUTE / 2) / 3600.0
+    return split_series(
+        np.asarray(sensor_col), hours, np.asarray(sums, dtype=float) / counts, counts,
+        np.asarray(last, dtype=float),
+    )
+
+
+def load_series(sensor_ids, start, end):
+    """{sensor pk: (hours, values, weights, current)} from raw readings, in a single query."""
+    rows = Reading.objects.filter(
+        sensor_id__in=sensor_ids,
+        timestamp__gte=start,
+        timestamp__lte=end,
+        air_quality__isnull=False,
+    ).order_by('sensor_id', 'timestamp', 'id').values_list('sensor_id', 'timestamp', 'air_quality')
+
+    sensor_col, stamps, values = [], [], []
+    for sensor_id, timestamp, value in rows:
+        sensor_col.append(sensor_id)
+        stamps.append(timestamp.timestamp())
+        values.append(value)
+    if not values:
+        return {}
+
+    values = np.asarray(values, dtype=float)
+    return split_series(np.asarray(sensor_col), np.asarray(stamps) / 3600.0, values, np.ones_like(values), values)
+
+
+def latest_markers(sensors):
+    """{sensor pk: latest reading id} for ``sensors`` in one query."""
+    latest = Reading.objects.filter(
+        sensor=models.OuterRef('pk')
+    ).order_by('-timestamp', '-id').values('pk')[:1]
+    return dict(
+        Sensor.objects.filter(pk__in=[s.pk for s in sensors])
+        .annotate(latest_reading_id=models.Subquery(latest))
+        .values_list('pk', 'latest_reading_id')
+    )
+
+
+def get_models(sensors, now=None):
+    """
+    Fitted models for ``sensors``, refitting only those whose latest reading
+    changed since they were cached. Sensors without enough data map to a
+    ``ForecastError``.
+    """
+    now = now or timezone.now()
+    markers = latest_markers(sensors)
+
+    result, stale = {}, []
+    with _cache_lock:
+        for sensor in sensors:
+            cached = _model_cache.get(sensor.pk)
+            if cached is not None and cached[0] == markers.get(sensor.pk):
+                result[sensor.pk] = cached[1]
+            else:
+                stale.append(sensor.pk)
+
+    if stale:
+        start = now - timedelta(hours=HISTORY_HOURS)
+        series = load_rollup_series(stale, start, now)
+        missing = [pk for pk in stale if pk not in series]
+        if missing:
+            series.update(load_series(missing, start, now))
+        fitted = {}
+        for pk in stale:
+            hours, values, weights, current = series.get(pk, (None, None, None, None))
+            if values is None:
+                model = ForecastError('No historical data available for forecasting', status=404)
+            elif weights.sum() < MIN_POINTS:
+                model = ForecastError('Insufficient historical data for forecasting')
+            else:
+                model = fit(hours, values, weights, current)
+            fitted[pk] = model
+        with _cache_lock:
+            for pk, model in fitted.items():
+                _model_cache[pk] = (markers.get(pk), model)
+        result.update(fitted)
+    return result
+
+
+def build_forecast(model, now=None, horizon=FORECAST_HOURS):
+    """Evaluate a fitted model over the next ``horizon`` hours."""
+    now = now or timezone.now()
+    steps = np.arange(1, horizon + 1)
+    predicted = np.clip(predict(model, now.timestamp() / 3600.0 + steps), AQI_FLOOR, AQI_CEILING)
+
+    # Confidence decays with the horizon and with how noisy the fit was.
+    noise = min(0.3, model['residual_std'] / max(model['level'], 1.0))
+    confidence = np.maximum(0.5, 1.0 - steps * 0.02 - noise)
+
+    slope = model['coef'][1]
+    if slope > TREND_EPSILON:
+        trend = 'increasing'
+    elif slope < -TREND_EPSILON:
+        trend = 'decreasing'
+    else:
+        trend = 'stable'
+
+    forecast = []
+    for step, value, conf in zip(steps, predicted, confidence):
+        forecast_time = now + timedelta(hours=int(step))
+        forecast.append({
+            'timestamp': forecast_time,
+            'hour': forecast_time.strftime('%H:%M'),
+            'predicted_aqi': round(float(value), 1),
+            'confidence': round(float(conf), 2),
+        })
+    return {
+        'current_aqi': model['current'],
+        'forecast': forecast,
+        'trend': trend,
+    }
+
+
+def forecast_sensors(sensors, now=None):
+    """{sensor pk: forecast dict or ForecastError} for every sensor in one pass."""
+    now = now or timezone.now()
+    result = {}
+    for pk, model in get_models(sensors, now).items():
+        result[pk] = model if isinstance(model, ForecastError) else build_forecast(model, now)
+    return result
+
+
+def forecast_sensor(sensor, now=None):
+    outcome = forecast_sensors([sensor], now)[sensor.pk]
+    if isinstance(outcome, ForecastError):
+        raise outcome
+    return outcome
+
+
+def clear_cache():
+    with _cache_lock:
+        _model_cache.clear()
@@ -0,0 +1,208 @@
+"""
+Inverse-distance-weighted AQI heatmap served as 256 px PNG map tiles.
+
+For a Web Mercator tile (z, x, y) the AQI is interpolated on a coarse grid
+(``GRID`` x ``GRID`` points) from the latest reading of every sensor within
+``HEATMAP_RADIUS_KM`` of the tile, weighting each by ``1 / d**2``. The
+grid is colored with the AQI category palette, faded out with the distance
+to the nearest sensor and upscaled to the tile with Pillow.
+
+Tiles are cached by (z, x, y, version), where the version digests the
+response-cache versions (``api.cache``) of exactly the sensors that
+contribute to the tile. Ingest bumps those per sensor, so a new reading only
+invalidates the tiles around its sensor; every other tile keeps being served
+from the cache (and as a 304 to clients holding its ETag). Payload and
+client work per tile do not depend on the number of sensors.
+"""
+import hashlib
+import io
+import math
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .cache import get_cache, scope_state, sensor_scope, KEY_PREFIX
+from . import spatial
+
+TILE_SIZE = 256
+GRID = 64
+# Distances below this (km) weigh as this, so a pixel on a sensor is not infinite
+MIN_DISTANCE_KM = 0.05
+MAX_ALPHA = 170
+# Bump when the rendering changes so cached tiles are not reused
+RENDER_VERSION = 1
+
+# AQI -> RGB at the band edges, blended linearly in between
+PALETTE_STOPS = (
+    (0, (0, 176, 80)),
+    (50, (0, 176, 80)),
+    (100, (146, 208, 80)),
+    (200, (255, 217, 0)),
+    (300, (255, 140, 0)),
+    (400, (230, 0, 0)),
+    (500, (128, 0, 0)),
+)
+
+
+def _palette():
+    aqi = np.arange(501)
+    stops = np.array([s[0] for s in PALETTE_STOPS], dtype=float)
+    colors = np.array([s[1] for s in PALETTE_STOPS], dtype=float)
+    return np.stack([np.interp(aqi, stops, colors[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+
+
+PALETTE = _palette()
+
+
+def radius_km():
+    return float(getattr(settings, 'HEATMAP_RADIUS_KM', 1.5))
+
+
+def min_zoom():
+    return int(getattr(settings, 'HEATMAP_MIN_ZOOM', 10))
+
+
+def tile_bounds(z, x, y):
+    """``(south, west, north, east)`` of a Web Mercator tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def grid_coordinates(z, x, y, size=GRID):
+    """Latitudes (one per row, north first) and longitudes of the grid point centres."""
+    n = 2 ** z
+    steps = (np.arange(size) + 0.5) / size
+    lons = (x + steps) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + steps) / n))))
+    return lats, lons
+
+
+def contributing(index, z, x, y):
+    """Index positions of the sensors within the heatmap radius of the tile."""
+    south, west, north, east = tile_bounds(z, x, y)
+    reach = radius_km() / spatial.KM_PER_DEGREE
+    widen = reach / max(math.cos(math.radians(max(abs(south), abs(north)))), 0.01)
+    return index.within(
+        max(south - reach, -90), max(west - widen, -180),
+        min(north + reach, 90), min(east + widen, 180),
+    )
+
+
+def tile_version(z, x, y, sensor_ids):
+    """Digest of everything a tile depends on: its sensors and their data versions."""
+    versions, _ = scope_state([sensor_scope(s) for s in sensor_ids])
+    raw = f"{RENDER_VERSION}|{radius_km()}|{z}/{x}/{y}|{list(zip(sensor_ids, versions))}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def interpolate(lats, lons, sensor_lats, sensor_lons, values, radius, chunk=2048):
+    """
+    IDW over the grid ``lats`` x ``lons``. Returns ``(aqi, nearest_km)``
+    arrays of shape (len(lats), len(lons)); NaN where no sensor is in range.
+    Sensors are processed in chunks so memory stays bounded.
+    """
+    grid_lat, grid_lon = np.meshgrid(lats, lons, indexing='ij')
+    grid_lat, grid_lon = grid_lat.ravel(), grid_lon.ravel()
+    # Equirectangular km offsets from the grid centre (accurate to well under
+    # 1% at city scale), float32 and in place: this loop is the whole cost
+    lat0, lon0 = grid_lat.mean(), grid_lon.mean()
+    kx = spatial.KM_PER_DEGREE * math.cos(math.radians(lat0))
+    y = ((grid_lat - lat0) * spatial.KM_PER_DEGREE).astype(np.float32)
+    x = ((grid_lon - lon0) * kx).astype(np.float32)
+    sy = ((sensor_lats - lat0) * spatial.KM_PER_DEGREE).astype(np.float32)
+    sx = ((sensor_lons - lon0) * kx).astype(np.float32)
+    values = values.astype(np.float32)
+
+    numerator = np.zeros(len(y))
+    denominator = np.zeros(len(y))
+    nearest = np.full(len(y), np.inf, dtype=np.float32)
+    for start in range(0, len(values), chunk):
+        end = start + chunk
+        w = np.subtract.outer(y, sy[start:end])
+        w *= w
+        dx = np.subtract.outer(x, sx[start:end])
+        dx *= dx
+        w += dx
+        np.minimum(nearest, w.min(axis=1), out=nearest)
+        # w = 1 / d**2, zero beyond the radius
+        np.maximum(w, MIN_DISTANCE_KM ** 2, out=w)
+        np.reciprocal(w, out=w)
+        np.putmask(w, w < 1.0 / (radius * radius), 0.0)
+        numerator += w @ values[start:end]
+        denominator += w.sum(axis=1)
+    nearest = np.sqrt(nearest.astype(float))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        aqi = numerator / denominator
+    shape = (len(lats), len(lons))
+    return aqi.reshape(shape), nearest.reshape(shape)
+
+
+def render(aqi, nearest, radius):
+    """RGBA tile PNG bytes from the interpolated grid."""
+    known = ~np.isnan(aqi)
+    index = np.clip(np.nan_to_num(aqi), 0, 500).astype(np.int16)
+    rgba = np.zeros(aqi.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = PALETTE[index]
+    fade = np.clip(1.0 - nearest / radius, 0.0, 1.0) ** 0.5
+    rgba[..., 3] = np.where(known, MAX_ALPHA * fade, 0).astype(np.uint8)
+
+    image = Image.fromarray(rgba, 'RGBA').resize((TILE_SIZE, TILE_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _empty_tile():
+    buffer = io.BytesIO()
+    Image.new('RGBA', (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0)).save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+EMPTY_TILE = _empty_tile()
+EMPTY_VERSION = hashlib.md5(EMPTY_TILE).hexdigest()
+
+
+def get_tile(z, x, y):
+    """
+    ``(png_bytes, version, state)`` for a tile; state is ``"empty"`` (no
+    sensor in range), ``"hit"`` or ``"render"``.
+    """
+    if z < min_zoom():
+        return EMPTY_TILE, EMPTY_VERSION, "empty"
+
+    index = spatial.get_index()
+    positions = contributing(index, z, x, y)
+    if not len(positions):
+        return EMPTY_TILE, EMPTY_VERSION, "empty"
+
+    rows = index.sensors(positions)
+    version = tile_version(z, x, y, [row['sensor_id'] for row in rows])
+    cache = get_cache()
+    key = f"{KEY_PREFIX}:tile:{z}:{x}:{y}:{version}"
+    content = cache.get(key)
+    if content is not None:
+        return content, version, "hit"
+
+    latest = spatial.latest_readings(index.pk[positions])
+    values = np.array(
+        [latest.get(row['pk'], {}).get('air_quality') for row in rows], dtype=float
+    )
+    known = ~np.isnan(values)
+    if not known.any():
+        content = EMPTY_TILE
+    else:
+        radius = radius_km()
+        lats, lons = grid_coordinates(z, x, y)
+        aqi, nearest = interpolate(
+            lats, lons, index.lat[positions][known], index.lon[positions][known], values[known], radius
+        )
+        content = render(aqi, nearest, radius)
+    cache.set(key, content, getattr(settings, 'HEATMAP_TILE_TIMEOUT', 3600))
+    return content, version, "render"
+
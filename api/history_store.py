@@ -0,0 +1,302 @@
+"""
+Append-only segment store for the simulator's reading history.
+
+Readings are written as newline-delimited JSON into numbered segment files
+(``seg-000001.ndjson`` ...). Every appended batch adds one line to
+``index.ndjson`` holding (segment, byte offset, first timestamp, count), so:
+
+* a tick costs O(new readings): one append to a segment and one index line,
+* "last N" walks the index backwards and seeks straight to the batches it
+  needs,
+* "since T" bisects the index on timestamp and reads forward from there.
+
+Old segments are dropped whole once the newer ones hold ``max_records``,
+which replaces the old trim-and-rewrite of the JSON array file. Record and
+batch counts per segment are kept in memory alongside the index and updated
+by every append, so neither appending nor rotating re-counts the history.
+
+``history_store`` is the simulator's store, shared by the views and the
+ingest worker.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.ndjson"
+SEGMENT_TEMPLATE = "seg-{:06d}.ndjson"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def format_timestamp(value):
+    """Normalise a datetime or string to the store's timestamp format."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.make_naive(value)
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)
+
+
+class HistoryStore:
+    def __init__(self, root, segment_records=500, max_records=1000):
+        self.root = root
+        self.segment_records = segment_records
+        self.max_records = max_records
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._entries = []
+        self._stamps = []
+        self._index_stat = None
+        # segment -> [records, batches], oldest segment first
+        self._segments = {}
+        self._total = 0
+
+    # ------------------------------------------------------------------
+    # index handling
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.root, SEGMENT_TEMPLATE.format(segment))
+
+    def _refresh(self):
+        """Reload the index if another process (or a rotation) changed it."""
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            self._entries, self._stamps, self._index_stat = [], [], None
+            self._segments, self._total = {}, 0
+            return
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key == self._index_stat:
+            return
+
+        entries = []
+        with open(self.index_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+        self._entries = entries
+        self._stamps = [e["timestamp"] for e in entries]
+        self._index_stat = stat_key
+        self._segments, self._total = {}, 0
+        for entry in entries:
+            self._count(entry)
+
+    def _count(self, entry):
+        tally = self._segments.setdefault(entry["segment"], [0, 0])
+        tally[0] += entry["count"]
+        tally[1] += 1
+        self._total += entry["count"]
+
+    def _write_index(self, entries):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.index_path)
+
+    def entries(self):
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    # ------------------------------------------------------------------
+    # writing
+    # ------------------------------------------------------------------
+
+    def append(self, records):
+        """Append one batch of readings. Returns the number of records dropped by rotation."""
+        if not records:
+            return 0
+
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            self._refresh()
+
+            if self._segments:
+                segment = next(reversed(self._segments))
+                if self._segments[segment][0] >= self.segment_records:
+                    segment += 1
+            else:
+                segment = 1
+
+            path = self._segment_path(segment)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write("".join(json.dumps(r) + "\n" for r in records).encode("utf-8"))
+
+            entry = {
+                "segment": segment,
+                "offset": offset,
+                "timestamp": format_timestamp(records[0].get("timestamp", "")),
+                "count": len(records),
+            }
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._entries.append(entry)
+            self._stamps.append(entry["timestamp"])
+            self._count(entry)
+            self._index_stat = self._stat_key()
+
+            return self._rotate()
+
+    def _stat_key(self):
+        st = os.stat(self.index_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _rotate(self):
+        """Drop whole old segments while the newer ones still hold max_records."""
+        dropped = dropped_batches = 0
+        while len(self._segments) > 1:
+            oldest = next(iter(self._segments))
+            records, batches = self._segments[oldest]
+            if self._total - records < self.max_records:
+                break
+            del self._segments[oldest]
+            self._total -= records
+            dropped += records
+            dropped_batches += batches
+            try:
+                os.remove(self._segment_path(oldest))
+            except FileNotFoundError:
+                pass
+
+        if dropped:
+            # Entries are in segment order, so the dropped ones are a prefix
+            del self._entries[:dropped_batches]
+            del self._stamps[:dropped_batches]
+            self._write_index(self._entries)
+            self._index_stat = self._stat_key()
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._refresh()
+            for segment in {e["segment"] for e in self._entries}:
+                try:
+                    os.remove(self._segment_path(segment))
+                except FileNotFoundError:
+                    pass
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            self._entries, self._stamps, self._index_stat = [], [], None
+            self._segments, self._total = {}, 0
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+
+    def _read_batch(self, entry):
+        try:
+            with open(self._segment_path(entry["segment"]), "rb") as f:
+                f.seek(entry["offset"])
+                return [json.loads(f.readline()) for _ in range(entry["count"])]
+        except FileNotFoundError:
+            # Segment rotated away between reading the index and the data
+            return []
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return self._total
+
+    def tail(self, n=None, predicate=None):
+        """Return the last ``n`` records (all when ``n`` is None), oldest first."""
+        batches = []
+        found = 0
+        for entry in reversed(self.entries()):
+            records = self._read_batch(entry)
+            if predicate is not None:
+                records = [r for r in records if predicate(r)]
+            batches.append(records)
+            found += len(records)
+            if n is not None and found >= n:
+                break
+
+        result = [r for batch in reversed(batches) for r in batch]
+        if n is not None:
+            result = result[-n:] if n > 0 else []
+        return result
+
+    def latest_batch(self):
+        entries = self.entries()
+        return self._read_batch(entries[-1]) if entries else []
+
+    def since(self, timestamp, inclusive=False):
+        """Return records with a timestamp after ``timestamp`` (or at it when inclusive)."""
+        stamp = format_timestamp(timestamp)
+        with self._lock:
+            self._refresh()
+            entries = list(self._entries)
+            # Batches are indexed by their first timestamp; start at the last
+            # batch that began at or before the mark.
+            start = max(bisect.bisect_left(self._stamps, stamp) - 1, 0)
+
+        result = []
+        for entry in entries[start:]:
+            for record in self._read_batch(entry):
+                ts = str(record.get("timestamp", ""))
+                if ts > stamp or (inclusive and ts == stamp):
+                    result.append(record)
+        return result
+
+    def stats(self):
+        entries = self.entries()
+        segments = sorted({e["segment"] for e in entries})
+        size = 0
+        for segment in segments:
+            try:
+                size += os.path.getsize(self._segment_path(segment))
+            except OSError:
+                pass
+        return {
+            "record_count": sum(e["count"] for e in entries),
+            "batch_count": len(entries),
+            "segments": segments,
+            "size_bytes": size,
+            "first_timestamp": entries[0]["timestamp"] if entries else None,
+            "last_timestamp": entries[-1]["timestamp"] if entries else None,
+        }
+
+    # ------------------------------------------------------------------
+    # compatibility with the old JSON array file
+    # ------------------------------------------------------------------
+
+    def import_legacy_json(self, path):
+        """
+        Load an old ``sensor_data.json`` array into an empty store, one batch
+        per timestamp. Returns the number of records imported.
+        """
+        if self.count() or not os.path.exists(path):
+            return 0
+
+        with open(path, "r") as f:
+            content = f.read()
+        records = json.loads(content) if content.strip() else []
+        records = records[-self.max_records:]
+
+        batch = []
+        for record in records:
+            if batch and record.get("timestamp") != batch[0].get("timestamp"):
+                self.append(batch)
+                batch = []
+            batch.append(record)
+        if batch:
+            self.append(batch)
+
+        logger.info(f"Imported {len(records)} readings from legacy history file {path}")
+        return len(records)
+
+
+HISTORY_DIR = os.path.join(settings.BASE_DIR, "static", "sensor_history")
+MAX_HISTORY = 1000
+
+history_store = HistoryStore(HISTORY_DIR, segment_records=MAX_HISTORY // 2, max_records=MAX_HISTORY)
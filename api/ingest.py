@@ -0,0 +1,270 @@
+"""
+Set-based ingest pipeline for sensor readings.
+
+The ingest endpoints used to resolve the sensor, validate through
+``ReadingSerializer`` and save one row at a time. This module does the same
+work for a whole batch: one query resolves every sensor_id, missing sensors
+are created with ``bulk_create``, rows go through a lightweight validator and
+the readings are inserted with ``bulk_create`` inside a single transaction.
+
+Readings are unique on (sensor, slave_id, timestamp) (``unique_reading_key``).
+Keys already stored or repeated within the batch are looked up before the
+insert and reported as per-row errors, so one duplicate never costs the
+rest of the batch.
+
+AQI categories are derived here, for the whole batch at once (``api.aqi``);
+``aqi_category`` / ``aqi_color`` sent by clients are ignored.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import Sensor, Reading
+from .aqi import classify
+from .rollups import apply_readings
+from .cache import invalidate_readings
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = 500
+
+FLOAT_FIELDS = (
+    'temperature',
+    'humidity',
+    'air_quality',
+    'pm25',
+    'co_level',
+    'no_level',
+    'smoke',
+    'latitude',
+    'longitude',
+)
+
+# Same limits and messages as ReadingSerializer.validate
+RANGE_LIMITS = {
+    'temperature': (-50, 60, 'Temperature must be between -50 and 60 degrees Celsius'),
+    'humidity': (0, 100, 'Humidity must be between 0 and 100%'),
+    'air_quality': (0, 500, 'Air quality must be between 0 and 500'),
+}
+
+
+def clean_reading(payload):
+    """
+    Validate one raw reading dict.
+
+    Returns ``(sensor_id, sensor_name, fields, errors)`` where ``fields`` holds
+    the values ready for ``Reading(**fields)`` and ``errors`` follows the
+    ``serializer.errors`` shape ({field: [messages]}).
+    """
+    if not isinstance(payload, dict):
+        return None, None, {}, {'non_field_errors': ['Expected a JSON object.']}
+
+    errors = {}
+    fields = {}
+
+    sensor_id = payload.get('sensor_id') or payload.get('sensor')
+    sensor_id = str(sensor_id) if sensor_id else None
+    sensor_name = payload.get('sensor_name') or sensor_id
+
+    for name in FLOAT_FIELDS:
+        value = payload.get(name)
+        if value is None or value == '':
+            continue
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            fields[name] = float(value)
+        except (TypeError, ValueError):
+            errors[name] = ['A valid number is required.']
+
+    slave_id = payload.get('slave_id')
+    if slave_id is not None and slave_id != '':
+        try:
+            if isinstance(slave_id, float) and not slave_id.is_integer():
+                raise ValueError
+            fields['slave_id'] = int(slave_id)
+        except (TypeError, ValueError):
+            errors['slave_id'] = ['A valid integer is required.']
+
+    timestamp = payload.get('timestamp')
+    if timestamp:
+        parsed = parse_datetime(str(timestamp))
+        if parsed is None:
+            errors['timestamp'] = ['Datetime has wrong format.']
+        else:
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            fields['timestamp'] = parsed
+
+    if not errors:
+        for name, (low, high, message) in RANGE_LIMITS.items():
+            if name in fields and not low <= fields[name] <= high:
+                errors[name] = [message]
+                break
+
+    return sensor_id, sensor_name, fields, errors
+
+
+def resolve_sensors(sensor_defaults):
+    """
+    Map sensor_id -> Sensor for every id in ``sensor_defaults``
+    ({sensor_id: {field: value}}), creating the missing ones in bulk.
+    """
+    if not sensor_defaults:
+        return {}
+
+    sensors = Sensor.objects.in_bulk(list(sensor_defaults), field_name='sensor_id')
+    missing = [
+        Sensor(sensor_id=sensor_id, is_active=True, **defaults)
+        for sensor_id, defaults in sensor_defaults.items()
+        if sensor_id not in sensors
+    ]
+
+    if missing:
+        Sensor.objects.bulk_create(missing, ignore_conflicts=True)
+        sensors.update(Sensor.objects.in_bulk(
+            [s.sensor_id for s in missing], field_name='sensor_id'
+        ))
+        logger.info(f"Created {len(missing)} new sensors: {', '.join(s.sensor_id for s in missing[:10])}")
+
+    return sensors
+
+
+# Same message ReadingSerializer's unique-together validator gives
+DUPLICATE_ERRORS = {'non_field_errors': ['The fields sensor, slave_id, timestamp must make a unique set.']}
+KEY_LOOKUP_CHUNK_SIZE = 500
+
+
+def reading_key(sensor_pk, slave_id, timestamp):
+    """A row's ``unique_reading_key``; like the constraint, NULL sensor/slave_id count as 0."""
+    return (sensor_pk or 0, slave_id or 0, timestamp)
+
+
+def existing_keys(keys):
+    """The subset of ``keys`` (``reading_key`` tuples) already stored."""
+    keys = set(keys)
+    timestamps = sorted({key[2] for key in keys})
+    found = set()
+    for offset in range(0, len(timestamps), KEY_LOOKUP_CHUNK_SIZE):
+        rows = Reading.objects.filter(
+            timestamp__in=timestamps[offset:offset + KEY_LOOKUP_CHUNK_SIZE]
+        ).values_list('sensor_id', 'slave_id', 'timestamp')
+        found.update(key for key in (reading_key(*row) for row in rows) if key in keys)
+    return found
+
+
+def split_duplicates(readings):
+    """
+    ``(fresh, duplicates)`` positions in ``readings``: a reading is a
+    duplicate if its key is stored already or taken by an earlier one.
+    """
+    keys = [reading_key(r.sensor_id, r.slave_id, r.timestamp) for r in readings]
+    seen = existing_keys(keys)
+    fresh, duplicates = [], []
+    for position, key in enumerate(keys):
+        if key in seen:
+            duplicates.append(position)
+        else:
+            seen.add(key)
+            fresh.append(position)
+    return fresh, duplicates
+
+
+def store_readings(readings, batch_size=INGEST_BATCH_SIZE):
+    """
+    Insert already validated ``Reading`` instances (sensor attached,
+    ``category_id`` set) and fold them into the rollups, in one transaction.
+
+    Returns ``(stored, duplicates)``: the inserted readings and the
+    positions in ``readings`` rejected as duplicates.
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                fresh, duplicates = split_duplicates(readings)
+                stored = [readings[i] for i in fresh]
+                Reading.objects.bulk_create(stored, batch_size=batch_size)
+                apply_readings(stored)
+                invalidate_readings(stored)
+            return stored, duplicates
+        except IntegrityError:
+            # A concurrent writer stored one of the keys after the lookup;
+            # the second lookup sees it
+            if attempt:
+                raise
+
+
+def insert_readings(readings_data, batch_size=INGEST_BATCH_SIZE):
+    """
+    Validate and insert a batch of raw reading dicts.
+
+    Returns ``(readings, errors)``: the saved ``Reading`` instances (sensor
+    attached) in input order and the errors of the rejected elements, each
+    carrying its index so callers can report it back per row. Readings whose
+    (sensor, slave_id, timestamp) is already stored, or repeated within the
+    batch, are rejected as duplicates; the rest are still inserted.
+    """
+    errors = []
+    valid = []
+    sensor_defaults = {}
+
+    for idx, reading_data in enumerate(readings_data):
+        sensor_id, sensor_name, fields, row_errors = clean_reading(reading_data)
+        if row_errors:
+            errors.append({
+                'index': idx,
+                'data': reading_data,
+                'errors': row_errors
+            })
+            continue
+
+        if sensor_id:
+            sensor_defaults.setdefault(sensor_id, {'name': sensor_name})
+        valid.append((idx, sensor_id, fields))
+
+    if not valid:
+        return [], errors
+
+    classify([fields for _, _, fields in valid])
+
+    with transaction.atomic():
+        sensors = resolve_sensors(sensor_defaults)
+        readings, duplicates = store_readings([
+            Reading(sensor=sensors.get(sensor_id), **fields)
+            for _, sensor_id, fields in valid
+        ], batch_size=batch_size)
+
+    for position in duplicates:
+        idx = valid[position][0]
+        errors.append({
+            'index': idx,
+            'data': readings_data[idx],
+            'errors': DUPLICATE_ERRORS
+        })
+    errors.sort(key=lambda e: e['index'])
+    return readings, errors
+
+
+def insert_readings_each(readings_data, batch_size=INGEST_BATCH_SIZE):
+    """
+    ``insert_readings`` one reading at a time, for a batch that kept losing
+    the race on ``unique_reading_key``: the conflicting rows come back as
+    duplicate errors and every other row is still written.
+    """
+    created, errors = [], []
+    for idx, reading_data in enumerate(readings_data):
+        try:
+            readings, row_errors = insert_readings([reading_data], batch_size=batch_size)
+        except IntegrityError:
+            readings, row_errors = [], [{'index': 0, 'data': reading_data, 'errors': DUPLICATE_ERRORS}]
+        created.extend(readings)
+        errors.extend(dict(e, index=idx) for e in row_errors)
+    return created, errors
+
+
+def ingest_readings(readings_data, batch_size=INGEST_BATCH_SIZE):
+    """``insert_readings`` returning ``(created_ids, errors)``."""
+    readings, errors = insert_readings(readings_data, batch_size=batch_size)
+    return [r.pk for r in readings], errors
@@ -0,0 +1,216 @@
+"""
+Durable local queue between the HTTP ingest endpoints and the ingest worker.
+
+With ``INGEST_QUEUE_ENABLED`` the ingest endpoints only validate the payload,
+append it to a small SQLite database (WAL mode, one row per reading) and
+answer 202. ``manage.py run_ingest_worker`` claims readings in large batches,
+writes them through the set-based ingest pipeline in one transaction per
+batch and deletes them from the queue once committed, so a crash or restart
+of either side loses nothing: claimed-but-unacknowledged rows become visible
+again after ``visibility_timeout`` seconds.
+
+Rows that fail validation in the worker are moved to a dead-letter table
+instead of being retried forever.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ingest import DUPLICATE_ERRORS, clean_reading, ingest_readings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_claimed_idx ON queue (claimed_at, id);
+CREATE TABLE IF NOT EXISTS dead_letter (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    errors TEXT NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class IngestQueue:
+    def __init__(self, path, visibility_timeout=60.0):
+        self.path = str(path)
+        self.visibility_timeout = visibility_timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, readings):
+        """Append readings durably. Returns their queue ids."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [
+                conn.execute(
+                    "INSERT INTO queue (payload, enqueued_at) VALUES (?, ?)",
+                    (json.dumps(r, default=str), now),
+                ).lastrowid
+                for r in readings
+            ]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def claim(self, limit):
+        """Lease up to ``limit`` of the oldest visible readings as (id, payload) pairs."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, payload FROM queue "
+                "WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                (now - self.visibility_timeout, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE queue SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def ack(self, ids):
+        if ids:
+            self._connect().executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+
+    def release(self, ids):
+        """Make claimed readings visible again straight away (e.g. after a DB error)."""
+        if ids:
+            self._connect().executemany(
+                "UPDATE queue SET claimed_at = NULL WHERE id = ?", [(i,) for i in ids]
+            )
+
+    def dead_letter(self, failures):
+        """Move ``[(id, payload, errors)]`` out of the queue."""
+        if not failures:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO dead_letter (id, payload, errors, failed_at) VALUES (?, ?, ?, ?)",
+                [(i, json.dumps(p, default=str), json.dumps(e, default=str), now) for i, p, e in failures],
+            )
+            conn.executemany("DELETE FROM queue WHERE id = ?", [(i,) for i, _, _ in failures])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        conn = self._connect()
+        depth, oldest = conn.execute("SELECT COUNT(*), MIN(enqueued_at) FROM queue").fetchone()
+        claimed = conn.execute("SELECT COUNT(*) FROM queue WHERE claimed_at IS NOT NULL").fetchone()[0]
+        dead = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {
+            "depth": depth,
+            "claimed": claimed,
+            "dead_letter": dead,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+        }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def queue_enabled():
+    return getattr(settings, 'INGEST_QUEUE_ENABLED', False)
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestQueue(
+                    getattr(settings, 'INGEST_QUEUE_PATH', os.path.join(settings.BASE_DIR, 'ingest_queue.sqlite3')),
+                    visibility_timeout=getattr(settings, 'INGEST_QUEUE_VISIBILITY_TIMEOUT', 60.0),
+                )
+    return _queue
+
+
+def enqueue_readings(readings_data):
+    """
+    Validate (without touching the database) and enqueue raw readings.
+
+    Returns ``(queue_ids, errors)`` with errors in the ``ingest_readings``
+    shape. Readings without a timestamp are stamped with the time they were
+    received, not the time the worker gets to them.
+    """
+    received = timezone.now().isoformat()
+    valid, errors = [], []
+    for idx, reading_data in enumerate(readings_data):
+        _, _, _, row_errors = clean_reading(reading_data)
+        if row_errors:
+            errors.append({'index': idx, 'data': reading_data, 'errors': row_errors})
+            continue
+        payload = dict(reading_data)
+        if not payload.get('timestamp'):
+            payload['timestamp'] = received
+        valid.append(payload)
+
+    return (get_queue().enqueue(valid) if valid else []), errors
+
+
+def process_batch(queue, batch_size):
+    """
+    Claim one batch, write it in a single transaction and acknowledge it.
+    Returns ``(written, dead_lettered)``; raises if the database write failed
+    (the batch is released for retry first).
+    """
+    claimed = queue.claim(batch_size)
+    if not claimed:
+        return 0, 0
+
+    ids = [item_id for item_id, _ in claimed]
+    payloads = [payload for _, payload in claimed]
+    try:
+        created, errors = ingest_readings(payloads, batch_size=batch_size)
+    except Exception:
+        queue.release(ids)
+        raise
+
+    # A duplicate means a previous run committed the reading but died before
+    # the ack: it is done, not failed.
+    duplicates = [e for e in errors if e['errors'] == DUPLICATE_ERRORS]
+    if duplicates:
+        logger.info(f"Skipping {len(duplicates)} already ingested queued readings")
+    failures = [(ids[e['index']], e['data'], e['errors']) for e in errors if e['errors'] != DUPLICATE_ERRORS]
+    failed_ids = {f[0] for f in failures}
+    queue.dead_letter(failures)
+    queue.ack([i for i in ids if i not in failed_ids])
+    return len(created), len(failures)
@@ -0,0 +1,220 @@
+"""
+Bounded in-memory log buffer with a write-coalescing background flusher.
+
+``write_log`` used to rewrite the whole log list to disk on every call. Here
+entries go into a ``deque(maxlen=...)`` behind a lock and a daemon thread
+appends them to an NDJSON file in batches, either every ``flush_interval``
+seconds or as soon as ``flush_size`` entries are pending.
+
+Each process picks up the others' entries from the shared file with
+``mirror_file()``. Entries carry the ``source`` process and an ``id`` that
+only increases within it; ids of different processes say nothing about
+their order, so they are not used as cursors. Instead every entry taking a
+place in the buffer, written here or mirrored, gets the next local sequence
+number, and pollers ask for ``since=<cursor>`` against that: a line mirrored
+late is still newer than any cursor handed out before it arrived. The
+highest id taken from each source is remembered, so lines that were
+evicted or cleared never come back when the file is re-read.
+
+Sequence numbers are local to a process, so cursors are ``<epoch>:<seq>``
+with a per-process epoch, like the event stream's ids. A cursor from
+another worker (or from before a restart) is not trusted: ``parse_cursor``
+returns None and the poller gets the whole buffer to redraw from. Buffered
+entries carry their own ``cursor`` so a live subscriber can resume polling
+from the last line it was pushed.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class LogBuffer:
+    def __init__(self, path, maxlen=200, flush_interval=2.0, flush_size=50, max_bytes=1024 * 1024):
+        self.path = path
+        self.maxlen = maxlen
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_bytes = max_bytes
+        self.source = os.getpid()
+        self.epoch = uuid.uuid4().hex[:8]
+        # (sequence, entry) in arrival order
+        self._entries = deque(maxlen=maxlen)
+        self._pending = []
+        # Ids start from the process start time in milliseconds so they keep
+        # increasing for a source across restarts
+        self._last_id = int(time.time() * 1000)
+        self._sequence = 0
+        # source -> highest id buffered from it
+        self._seen = {}
+        self._file_offset = None
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def cursor(self):
+        with self._lock:
+            return self._sequence
+
+    def format_cursor(self, seq):
+        return f"{self.epoch}:{seq}"
+
+    def parse_cursor(self, value):
+        """Turn a ``since`` value into a sequence; None means send everything."""
+        if not value:
+            return None
+        epoch, _, seq = str(value).partition(":")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    def _add(self, entry):
+        """Buffer ``entry`` under the next sequence; returns the buffered copy."""
+        self._sequence += 1
+        buffered = dict(entry, cursor=self.format_cursor(self._sequence))
+        self._entries.append((self._sequence, buffered))
+        self._seen[entry.get("source")] = entry["id"]
+        return buffered
+
+    def append(self, message, level="INFO"):
+        with self._lock:
+            self._last_id += 1
+            entry = {
+                "id": self._last_id,
+                "source": self.source,
+                "timestamp": datetime.now().strftime("%H:%M:%S"),
+                "level": level,
+                "message": message
+            }
+            buffered = self._add(entry)
+            self._pending.append(entry)
+            pending = len(self._pending)
+
+        self._ensure_flusher()
+        if pending >= self.flush_size:
+            self._wake.set()
+        return buffered
+
+    def since(self, cursor=None):
+        """
+        Return ``(entries, cursor)`` for entries newer than ``cursor``.
+
+        A cursor ahead of the buffer (e.g. after a server restart) yields the
+        whole buffer so the client can resynchronise.
+        """
+        with self._lock:
+            last = self._sequence
+            if cursor is None or cursor > last:
+                return [e for _, e in self._entries], last
+            return [e for seq, e in self._entries if seq > cursor], last
+
+    def snapshot(self):
+        with self._lock:
+            return [e for _, e in self._entries]
+
+    def clear(self, truncate=False):
+        """Drop buffered entries. The sequence keeps increasing so cursors stay valid."""
+        with self._lock:
+            self._entries.clear()
+            self._pending = []
+        if truncate:
+            with self._io_lock:
+                try:
+                    open(self.path, "w").close()
+                except OSError as e:
+                    logger.error(f"Error truncating log file: {e}")
+
+    def flush(self):
+        # Batches are taken under the I/O lock so they reach the file in id
+        # order, which mirror_file relies on
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a") as f:
+                    f.write("".join(json.dumps(e) + "\n" for e in batch))
+            except Exception as e:
+                logger.error(f"Error writing logs: {e}")
+        return len(batch)
+
+    def mirror_file(self):
+        """
+        Add entries other processes flushed to the shared file since the last
+        call (the last ``maxlen`` on the first call). Returns the new entries.
+        """
+        with self._io_lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                self._file_offset = 0
+                return []
+            offset = self._file_offset
+            if offset is None or size < offset:
+                # First look, or the file was truncated/rotated: re-read the tail
+                offset = max(size - self.maxlen * 512, 0)
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # Only consume whole lines; a partial last line is re-read next time
+            end = data.rfind(b"\n") + 1
+            self._file_offset = offset + end
+
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+
+        new = []
+        with self._lock:
+            for entry in entries:
+                entry_id = entry.get("id")
+                if not isinstance(entry_id, int) or entry_id <= self._seen.get(entry.get("source"), -1):
+                    continue
+                new.append(self._add(entry))
+        return new
+
+    def file_record_count(self):
+        with self._io_lock:
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, "rb") as f:
+                return f.read().count(b"\n")
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run, name="log-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
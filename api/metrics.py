@@ -0,0 +1,320 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+``MetricsMiddleware`` records per-view latency, DB query count, DB time and
+response size into histograms; the simulator loop and the JSON-to-database
+sync record their own counters next to the work they do. ``/api/metrics/``
+renders the registry.
+
+Query counting does not depend on ``DEBUG``: an execute wrapper is installed
+on every database connection and adds to the stats of the request running in
+the current context (a ContextVar, so ``sync_to_async`` calls made by async
+views are counted too). Outside a request it does nothing.
+
+The registry is per process; with several server workers scrape each one or
+aggregate on the Prometheus side.
+"""
+import bisect
+import math
+from abc import ABC, abstractmethod
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self):
+        """``[(suffix, label_values, extra_labels, value)]`` for rendering."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.label_names, values, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("_total", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                out.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            out.append(("_sum", key, (), round(total, 6)))
+            out.append(("_count", key, (), count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._add(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram, name, documentation, labels, buckets=buckets)
+
+    def add_collector(self, collect):
+        """Call ``collect()`` before every render, e.g. to set gauges read on demand."""
+        with self._lock:
+            if collect not in self._collectors:
+                self._collectors.append(collect)
+
+    def render(self):
+        for collect in list(self._collectors):
+            collect()
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ----------------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------------
+
+http_requests = registry.counter(
+    "aqi_http_requests", "HTTP requests by view, method and status", ("view", "method", "status"))
+http_duration = registry.histogram(
+    "aqi_http_request_duration_seconds", "Time spent in the view and inner middleware",
+    ("view", "method"))
+http_db_queries = registry.histogram(
+    "aqi_http_db_queries", "Database queries per request", ("view", "method"),
+    buckets=QUERY_COUNT_BUCKETS)
+http_db_duration = registry.histogram(
+    "aqi_http_db_duration_seconds", "Time spent executing database queries per request",
+    ("view", "method"))
+http_response_size = registry.histogram(
+    "aqi_http_response_size_bytes", "Response body size (streaming responses excluded)",
+    ("view", "method"), buckets=SIZE_BUCKETS)
+
+# ----------------------------------------------------------------------
+# simulator, database sync and heatmap
+# ----------------------------------------------------------------------
+
+simulator_ticks = registry.counter("aqi_simulator_ticks", "Simulator ticks completed")
+simulator_readings = registry.counter("aqi_simulator_readings", "Readings generated by the simulator")
+simulator_tick_duration = registry.histogram(
+    "aqi_simulator_tick_duration_seconds", "Time to generate, record and append one tick")
+simulator_sensors = registry.gauge("aqi_simulator_sensors", "Sensors simulated in the last tick")
+simulator_rows_per_second = registry.gauge(
+    "aqi_simulator_rows_per_second", "Readings per second over the last tick, sleep included")
+
+sync_runs = registry.counter("aqi_sync_runs", "JSON-to-database sync runs", ("result",))
+sync_rows = registry.counter("aqi_sync_rows", "Readings inserted by the sync")
+sync_batch_rows = registry.histogram(
+    "aqi_sync_batch_rows", "Readings inserted per sync run", buckets=ROW_BUCKETS)
+sync_duration = registry.histogram("aqi_sync_duration_seconds", "Duration of one sync run")
+sync_rows_per_second = registry.gauge(
+    "aqi_sync_rows_per_second", "Insert rate of the last sync run that wrote rows")
+sync_lag = registry.gauge(
+    "aqi_sync_lag_seconds",
+    "Newest simulator history record minus the sync high-water mark")
+
+heatmap_tiles = registry.counter(
+    "aqi_heatmap_tiles", "Heatmap tiles served by cache result (hit, render, empty)", ("result",))
+heatmap_render_duration = registry.histogram(
+    "aqi_heatmap_render_duration_seconds", "Time to interpolate and encode one heatmap tile")
+
+# ----------------------------------------------------------------------
+# ingest micro-batching
+# ----------------------------------------------------------------------
+
+BATCH_REQUEST_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+ingest_batches = registry.counter(
+    "aqi_ingest_batches", "Micro-batches written by the async ingest views", ("mode", "result"))
+ingest_batch_rows = registry.histogram(
+    "aqi_ingest_batch_rows", "Readings per ingest micro-batch", ("mode",), buckets=ROW_BUCKETS)
+ingest_batch_requests = registry.histogram(
+    "aqi_ingest_batch_requests", "Requests sharing one ingest micro-batch", ("mode",),
+    buckets=BATCH_REQUEST_BUCKETS)
+ingest_batch_duration = registry.histogram(
+    "aqi_ingest_batch_duration_seconds", "Time to write one ingest micro-batch", ("mode",))
+
+# ----------------------------------------------------------------------
+# query instrumentation
+# ----------------------------------------------------------------------
+
+_request_stats = ContextVar("aqi_request_stats", default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats["db_time"] += time.perf_counter() - started
+        stats["queries"] += 1
+
+
+def _instrument(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_query_wrapper():
+    connection_created.connect(_instrument, dispatch_uid="aqi-metrics-queries")
+    for connection in connections.all(initialized_only=True):
+        _instrument(connection)
+
+
+class MetricsMiddleware:
+    """Record latency, DB queries/time and response size per resolved view."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_query_wrapper()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = self._finish(token)
+        self._record(request, response, started, stats)
+        return response
+
+    async def __acall__(self, request):
+        token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stats = self._finish(token)
+        self._record(request, response, started, stats)
+        return response
+
+    def _start(self):
+        stats = {"queries": 0, "db_time": 0.0}
+        return _request_stats.set(stats), time.perf_counter()
+
+    def _finish(self, token):
+        stats = _request_stats.get()
+        _request_stats.reset(token)
+        return stats
+
+    def _record(self, request, response, started, stats):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        method = request.method
+
+        http_requests.inc(view=view, method=method, status=response.status_code)
+        http_duration.observe(elapsed, view=view, method=method)
+        http_db_queries.observe(stats["queries"], view=view, method=method)
+        http_db_duration.observe(stats["db_time"], view=view, method=method)
+        if not response.streaming:
+            http_response_size.observe(len(response.content), view=view, method=method)
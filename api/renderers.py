@@ -0,0 +1,107 @@
+"""
+JSON rendering for the read endpoints.
+
+``dumps`` encodes with orjson when it is installed and falls back to the
+standard library otherwise, with the same output either way: datetimes are
+written natively as ISO 8601 with UTC as ``Z``, the format of DRF's
+DateTimeField and Django's ``DjangoJSONEncoder``. Views and serializers can
+hand over the values they read from the database without converting every
+row first, and a reading's timestamp is the same string on every endpoint.
+
+``FastJsonResponse`` replaces ``JsonResponse`` in the hand-built views and
+``ORJSONRenderer`` DRF's ``JSONRenderer`` (see ``REST_FRAMEWORK`` in
+settings).
+"""
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def _default(obj):
+    """Types neither encoder handles natively: NumPy scalars/arrays, then Django's extras."""
+    if np is not None:
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+    return _django_encoder.default(obj)
+
+
+class FastJSONEncoder(json.JSONEncoder):
+    """The stdlib fallback, matching orjson's datetime and NumPy output."""
+
+    def default(self, obj):
+        if isinstance(obj, (datetime.datetime, datetime.time)):
+            text = obj.isoformat()
+            if text.endswith('+00:00'):
+                text = text[:-6] + 'Z'
+            return text
+        if isinstance(obj, datetime.date):
+            return obj.isoformat()
+        return _default(obj)
+
+
+def dumps(data, indent=False):
+    """``data`` as UTF-8 JSON bytes."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
+    return json.dumps(
+        data,
+        cls=FastJSONEncoder,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (',', ':'),
+    ).encode('utf-8')
+
+
+class FastJsonResponse(HttpResponse):
+    """``JsonResponse`` encoded with ``dumps``."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """DRF JSON renderer on ``dumps``."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return dumps(data, indent=bool(indent))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON. Large exports bypass this and stream straight
+    from the queryset; the renderer covers ordinary (e.g. error) responses.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(dumps(row) + b'\n' for row in rows)
@@ -0,0 +1,264 @@
+"""
+Retention policy for raw readings and their rollups.
+
+``READING_RETENTION`` maps each tier to the number of days it is kept
+(``None`` keeps it forever)::
+
+    READING_RETENTION = {'raw': 7, 'minute': 90, 'hour': None, 'day': None}
+
+``enforce`` deletes everything older than each tier's cut-off in batches of
+``batch_size`` rows, each batch its own short transaction with an optional
+pause in between, so SQLite never holds the write lock for long and ingest
+keeps flowing while a large backlog is compacted.
+
+Raw readings are downsampled before they go: rows whose bucket in the
+finest retained rollup tier does not exist (e.g. rows bulk-loaded around the
+ingest pipeline) are folded into the rollups first. With ``archive=True``
+raw days are exported to the Parquet archive and stay queryable there.
+
+Every run, dry runs included, is recorded as a ``core.CompactionRun`` with
+the rows and (estimated) bytes reclaimed per tier.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import CompactionRun, Reading, ReadingRollup, Sensor
+from .rollups import METRICS, apply_readings, bucket_floor
+from .cache import invalidate_sensors
+
+logger = logging.getLogger(__name__)
+
+RAW = "raw"
+TIERS = (
+    (RAW, None),
+    ("minute", ReadingRollup.MINUTE),
+    ("hour", ReadingRollup.HOUR),
+    ("day", ReadingRollup.DAY),
+)
+DEFAULT_POLICY = {RAW: 7, "minute": 90, "hour": None, "day": None}
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_PAUSE = 0.05
+
+
+def get_policy(overrides=None):
+    """The configured policy merged over the defaults, validated."""
+    policy = dict(DEFAULT_POLICY)
+    policy.update(getattr(settings, 'READING_RETENTION', {}))
+    policy.update(overrides or {})
+
+    known = {name for name, _ in TIERS}
+    unknown = set(policy) - known
+    if unknown:
+        raise ImproperlyConfigured(f"READING_RETENTION has unknown tiers {sorted(unknown)}")
+    for name, days in policy.items():
+        if days is not None and (not isinstance(days, (int, float)) or days <= 0):
+            raise ImproperlyConfigured(f"READING_RETENTION['{name}'] must be a positive number of days or None")
+    return policy
+
+
+def cutoffs(policy, now=None):
+    """tier -> datetime before which the tier's rows are deleted (None: keep)."""
+    now = now or timezone.now()
+    return {
+        name: (now - timedelta(days=days)) if days is not None else None
+        for name, days in policy.items()
+    }
+
+
+def table_size(model):
+    """``(bytes, rows)`` of a model's table including its indexes, or None if unknown."""
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            else:
+                return None
+            size = cursor.fetchone()[0]
+    except Exception as e:
+        logger.info(f"Table size of {table} unavailable: {e}")
+        return None
+    rows = model.objects.count()
+    return (size or 0), rows
+
+
+def estimate_bytes(sizes, model, rows):
+    size = sizes.get(model)
+    if not size or not size[1]:
+        return None
+    return int(size[0] / size[1] * rows)
+
+
+# ----------------------------------------------------------------------
+# downsampling
+# ----------------------------------------------------------------------
+
+def fold_unrolled(rows, resolutions):
+    """
+    Apply the rows whose bucket at the finest of ``resolutions`` has no
+    rollup yet. All tiers are written together by ``apply_readings``, so a
+    present bucket means these readings were rolled up on ingest.
+    """
+    if not resolutions:
+        return 0
+    marker = min(resolutions)
+    rows = [r for r in rows if r['sensor_id'] is not None]
+    keys = {(r['sensor_id'], bucket_floor(r['timestamp'], marker)) for r in rows}
+    if not keys:
+        return 0
+    existing = set(
+        ReadingRollup.objects.filter(
+            resolution=marker,
+            sensor_id__in={k[0] for k in keys},
+            bucket_start__in={k[1] for k in keys},
+        ).values_list('sensor_id', 'bucket_start')
+    )
+    missing = [r for r in rows if (r['sensor_id'], bucket_floor(r['timestamp'], marker)) not in existing]
+    if missing:
+        apply_readings(missing, resolutions)
+    return len(missing)
+
+
+# ----------------------------------------------------------------------
+# batched deletes
+# ----------------------------------------------------------------------
+
+def _delete_batches(queryset, batch_size, pause, before_delete=None, on_batch=None):
+    """Delete ``queryset`` ``batch_size`` ids at a time. Returns (rows, batches)."""
+    total = batches = 0
+    while True:
+        with transaction.atomic():
+            if before_delete is None:
+                ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            else:
+                rows = list(queryset.order_by('id').values(
+                    'id', 'sensor_id', 'timestamp', *METRICS
+                )[:batch_size])
+                before_delete(rows)
+                ids = [r['id'] for r in rows]
+            if not ids:
+                break
+            deleted, _ = queryset.model.objects.filter(id__in=ids).delete()
+        total += deleted
+        batches += 1
+        if on_batch:
+            on_batch(total)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total, batches
+
+
+def _affected_sensors(queryset):
+    return list(
+        Sensor.objects.filter(pk__in=queryset.values('sensor_id').distinct())
+        .values_list('sensor_id', flat=True)
+    )
+
+
+def enforce(policy=None, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE,
+            archive=False, now=None, log=None):
+    """
+    Apply the retention policy once and return the ``CompactionRun``.
+
+    ``log(message)`` receives progress lines (the management command passes
+    its stdout writer).
+    """
+    log = log or logger.info
+    policy = get_policy(policy)
+    limits = cutoffs(policy, now)
+    run = CompactionRun.objects.create(dry_run=dry_run, policy=policy)
+
+    sizes = {model: table_size(model) for model in (Reading, ReadingRollup)}
+    results = {}
+    try:
+        for name, resolution in TIERS:
+            cutoff = limits.get(name)
+            if cutoff is None:
+                continue
+            if archive and resolution is None:
+                # The archive holds whole days; never delete part of a day it lacks
+                cutoff = bucket_floor(cutoff, ReadingRollup.DAY)
+
+            if resolution is None:
+                model = Reading
+                queryset = Reading.objects.filter(timestamp__lt=cutoff)
+            else:
+                model = ReadingRollup
+                queryset = ReadingRollup.objects.filter(resolution=resolution, bucket_start__lt=cutoff)
+
+            tier = {'cutoff': cutoff.isoformat(), 'rows': 0, 'batches': 0, 'bytes': None}
+            results[name] = tier
+
+            if dry_run:
+                tier['rows'] = queryset.count()
+                tier['bytes'] = estimate_bytes(sizes, model, tier['rows'])
+                log(f"{name}: {tier['rows']:,} rows older than {cutoff:%Y-%m-%d %H:%M} would be deleted")
+                continue
+
+            sensors = _affected_sensors(queryset)
+            if resolution is None:
+                tier['rows'] += _archive_raw(cutoff, batch_size, log) if archive else 0
+                retained = [
+                    res for tier_name, res in TIERS
+                    if res is not None and (limits.get(tier_name) is None or limits[tier_name] < cutoff)
+                ]
+                folded = []
+                rows, batches = _delete_batches(
+                    queryset, batch_size, pause,
+                    before_delete=lambda rows: folded.append(fold_unrolled(rows, retained)),
+                    on_batch=lambda total: log(f"  {name}: {total:,} rows deleted"),
+                )
+                tier['downsampled'] = sum(folded)
+            else:
+                rows, batches = _delete_batches(
+                    queryset, batch_size, pause,
+                    on_batch=lambda total: log(f"  {name}: {total:,} rows deleted"),
+                )
+            tier['rows'] += rows
+            tier['batches'] = batches
+            tier['bytes'] = estimate_bytes(sizes, model, tier['rows'])
+            invalidate_sensors(sensors)
+            log(f"{name}: deleted {tier['rows']:,} rows older than {cutoff:%Y-%m-%d %H:%M}")
+
+        run.status = CompactionRun.COMPLETED
+    except Exception as e:
+        run.status = CompactionRun.FAILED
+        run.error = str(e)
+        logger.error(f"Retention run failed: {e}")
+        raise
+    finally:
+        run.tiers = results
+        run.rows_deleted = sum(t['rows'] for t in results.values())
+        estimates = [t['bytes'] for t in results.values() if t['rows']]
+        run.bytes_reclaimed = None if None in estimates else sum(estimates)
+        run.finished_at = timezone.now()
+        run.save()
+    return run
+
+
+def _archive_raw(cutoff, batch_size, log):
+    """Export raw days before ``cutoff`` to Parquet and prune the archived rows."""
+    from . import archive
+
+    if not archive.available():
+        log("⚠️ pyarrow is not installed; deleting raw readings without archiving them")
+        return 0
+    before = archive.day_floor(cutoff)
+    exported = archive.export_partitions(before)
+    pruned = archive.prune_archived(before, batch_size=batch_size)
+    log(f"raw: archived {exported['rows']:,} readings, pruned {pruned['deleted']:,} archived rows")
+    return pruned['deleted']
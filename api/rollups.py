@@ -0,0 +1,213 @@
+"""
+Incrementally maintained 1-minute / 1-hour / 1-day rollups of readings.
+
+Every ingest path folds its new readings into ``ReadingRollup`` rows
+(count/sum/min/max/last of every metric per sensor and bucket), so window
+queries read a few hundred pre-aggregated rows instead of scanning raw
+readings. A batch is aggregated in memory to one row per (sensor,
+resolution, bucket) and merged with a single ``INSERT ... ON CONFLICT DO
+UPDATE`` per chunk that adds counts and sums in the database, so nothing
+is read or locked first and concurrent writers cannot collide on a new
+bucket. ``manage.py backfill_rollups`` rebuilds them from the Reading table.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.db.models import Sum, Min, Max
+
+from core.models import ReadingRollup
+
+logger = logging.getLogger(__name__)
+
+METRICS = tuple(name for name, _ in ReadingRollup.METRIC_CHOICES)
+RESOLUTIONS = (ReadingRollup.MINUTE, ReadingRollup.HOUR, ReadingRollup.DAY)
+
+# A window is served from the coarsest resolution that still yields at
+# least this many buckets, e.g. 30 days -> daily, 24 hours -> hourly.
+MIN_BUCKETS = 24
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+KEY_COLUMNS = ('sensor_id', 'resolution', 'bucket_start')
+VALUE_COLUMNS = ('last_timestamp',) + tuple(
+    f"{metric}_{stat}" for metric in METRICS for stat in ReadingRollup.STATS
+)
+
+
+def bucket_floor(timestamp, resolution):
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+def pick_resolution(window):
+    """Coarsest resolution giving at least MIN_BUCKETS buckets over ``window``."""
+    window_seconds = window.total_seconds()
+    for resolution in reversed(RESOLUTIONS):
+        if window_seconds / resolution >= MIN_BUCKETS:
+            return resolution
+    return RESOLUTIONS[0]
+
+
+def _value(reading, name):
+    if isinstance(reading, dict):
+        return reading.get(name)
+    return getattr(reading, name)
+
+
+def accumulate(readings, resolutions=RESOLUTIONS):
+    """
+    Fold readings (model instances or ``.values()`` dicts with ``sensor_id``)
+    into {(sensor_id, resolution, bucket_start): {metric: [count, sum, min, max, last, last_ts]}}.
+    """
+    deltas = {}
+    for reading in readings:
+        sensor_id = _value(reading, 'sensor_id')
+        timestamp = _value(reading, 'timestamp')
+        if sensor_id is None or timestamp is None:
+            continue
+        values = [(metric, _value(reading, metric)) for metric in METRICS]
+        for resolution in resolutions:
+            bucket = deltas.setdefault((sensor_id, resolution, bucket_floor(timestamp, resolution)), {})
+            for metric, value in values:
+                if value is None:
+                    continue
+                acc = bucket.get(metric)
+                if acc is None:
+                    bucket[metric] = [1, value, value, value, value, timestamp]
+                    continue
+                acc[0] += 1
+                acc[1] += value
+                acc[2] = min(acc[2], value)
+                acc[3] = max(acc[3], value)
+                if timestamp >= acc[5]:
+                    acc[4], acc[5] = value, timestamp
+    return deltas
+
+
+def _row(key, bucket, adapt):
+    """Parameters for one rollup row in KEY_COLUMNS + VALUE_COLUMNS order."""
+    sensor_id, resolution, bucket_start = key
+    last_timestamp = max((acc[5] for acc in bucket.values()), default=None)
+    row = [sensor_id, resolution, adapt(bucket_start), adapt(last_timestamp)]
+    for metric in METRICS:
+        acc = bucket.get(metric)
+        row.extend(acc[:5] if acc else (0, 0.0, None, None, None))
+    return row
+
+
+def _merge_sql(table):
+    """``ON CONFLICT DO UPDATE`` assignments folding ``excluded`` into the stored row."""
+    quote = connection.ops.quote_name
+
+    def col(name):
+        return f"{table}.{quote(name)}"
+
+    def new(name):
+        return f"excluded.{quote(name)}"
+
+    newer = f"({col('last_timestamp')} IS NULL OR {new('last_timestamp')} >= {col('last_timestamp')})"
+    assignments = []
+    for metric in METRICS:
+        count, total, low, high, last = (f"{metric}_{stat}" for stat in ReadingRollup.STATS)
+        assignments += [
+            f"{quote(count)} = {col(count)} + {new(count)}",
+            f"{quote(total)} = {col(total)} + {new(total)}",
+            f"{quote(low)} = CASE WHEN {col(low)} IS NULL OR {new(low)} < {col(low)} "
+            f"THEN {new(low)} ELSE {col(low)} END",
+            f"{quote(high)} = CASE WHEN {col(high)} IS NULL OR {new(high)} > {col(high)} "
+            f"THEN {new(high)} ELSE {col(high)} END",
+            # The newer side's value wins unless it has none for this metric
+            f"{quote(last)} = CASE WHEN {new(last)} IS NOT NULL AND ({col(last)} IS NULL OR {newer}) "
+            f"THEN {new(last)} ELSE {col(last)} END",
+        ]
+    assignments.append(
+        f"{quote('last_timestamp')} = CASE WHEN {newer} "
+        f"THEN {new('last_timestamp')} ELSE {col('last_timestamp')} END"
+    )
+    return ", ".join(assignments)
+
+
+def _apply(deltas):
+    quote = connection.ops.quote_name
+    table = quote(ReadingRollup._meta.db_table)
+    columns = KEY_COLUMNS + VALUE_COLUMNS
+    fields = [ReadingRollup._meta.get_field(name) for name in columns]
+    insert = f"INSERT INTO {table} ({', '.join(quote(f.column) for f in fields)}) VALUES "
+    conflict = (
+        f" ON CONFLICT ({', '.join(quote(c) for c in KEY_COLUMNS)}) "
+        f"DO UPDATE SET {_merge_sql(table)}"
+    )
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+
+    # Only the datetimes need adapting; sorted so concurrent writers take
+    # their row locks in the same order
+    adapt = lru_cache(maxsize=None)(connection.ops.adapt_datetimefield_value)
+    rows = [_row(key, deltas[key], adapt) for key in sorted(deltas)]
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            chunk = rows[i:i + batch_size]
+            cursor.execute(
+                insert + ", ".join([placeholders] * len(chunk)) + conflict,
+                [param for row in chunk for param in row],
+            )
+
+
+def apply_readings(readings, resolutions=RESOLUTIONS):
+    """Fold new readings into their rollup buckets. Returns the number of buckets touched."""
+    deltas = accumulate(readings, resolutions)
+    if not deltas:
+        return 0
+    with transaction.atomic():
+        _apply(deltas)
+    return len(deltas)
+
+
+def window_series(sensor, start, end, metrics=METRICS, resolution=None):
+    """Rollup rows for ``sensor`` between ``start`` and ``end``, grouped by bucket."""
+    resolution = resolution or pick_resolution(end - start)
+    rows = ReadingRollup.objects.filter(
+        sensor=sensor,
+        resolution=resolution,
+        bucket_start__gte=bucket_floor(start, resolution),
+        bucket_start__lte=end,
+    ).order_by('bucket_start').only(
+        'bucket_start', *(f"{metric}_{stat}" for metric in metrics for stat in ReadingRollup.STATS)
+    )
+
+    buckets = []
+    for row in rows:
+        bucket = {'bucket_start': row.bucket_start}
+        for metric in metrics:
+            summary = row.summary(metric)
+            if summary is not None:
+                bucket[metric] = summary
+        if len(bucket) > 1:
+            buckets.append(bucket)
+    return resolution, buckets
+
+
+def window_summary(sensor, start, end, metric='air_quality', resolution=None):
+    """avg/min/max of ``metric`` over a window, computed from rollup rows."""
+    resolution = resolution or pick_resolution(end - start)
+    totals = ReadingRollup.objects.filter(
+        sensor=sensor,
+        resolution=resolution,
+        bucket_start__gte=bucket_floor(start, resolution),
+        bucket_start__lte=end,
+    ).aggregate(
+        count=Sum(f"{metric}_count"),
+        total=Sum(f"{metric}_sum"),
+        low=Min(f"{metric}_min"),
+        high=Max(f"{metric}_max"),
+    )
+
+    count = totals['count'] or 0
+    return {
+        'avg': totals['total'] / count if count else None,
+        'min': totals['low'],
+        'max': totals['high'],
+        'count': count,
+    }
@@ -0,0 +1,256 @@
+"""
+Simulator and sync state shared by every server process.
+
+The desired state (running, sensor count) and the latest simulator tick live
+in one ``core.SimulationState`` row instead of module globals, so every
+worker answers status/sensor-data requests the same way and a start request
+is a single conditional UPDATE that only one worker can win.
+
+Which process actually runs the simulator thread and the DB sync thread is
+decided by ``core.LeaderLease`` rows: a per-process supervisor thread
+acquires or renews a lease every ``SUPERVISOR_INTERVAL`` seconds while the
+role is wanted and lets it expire otherwise. A crashed leader's lease runs
+out after ``LEASE_TTL`` and another worker takes over.
+
+A leader that is merely slow (a stalled supervisor, a database that stops
+answering) must not keep working once someone else may have taken over:
+
+* ``holds_lease`` is only true until ``LEASE_TTL - LEASE_MARGIN`` seconds
+  after the last successful renewal, measured on this process's monotonic
+  clock, so role threads stop before the lease can expire;
+* every takeover bumps the lease's ``generation``, and writes to shared
+  state (``record_tick``) only apply while the lease still names this
+  process with the generation it acquired - a fenced-off leader's late
+  write changes nothing.
+
+Reads go through ``snapshot()``, cached per process for
+``SNAPSHOT_TTL`` seconds, so status polling costs at most a couple of
+queries per second per process regardless of the poll rate.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections, models
+from django.utils import timezone
+
+from core.models import LeaderLease, SimulationState, SyncCheckpoint
+from .sync import CHECKPOINT_NAME
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = "simulation"
+SIMULATOR = "simulator"
+SYNCER = "db_sync"
+
+LEASE_TTL = 15
+# Role threads stop this long before an unrenewed lease would expire
+LEASE_MARGIN = 5
+SUPERVISOR_INTERVAL = 2
+SNAPSHOT_TTL = 1.0
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_snapshot = {"value": None, "at": 0.0}
+_snapshot_lock = threading.Lock()
+
+# role -> (generation, monotonic deadline) for the leases this process holds
+_held = {}
+_held_lock = threading.Lock()
+
+
+# ----------------------------------------------------------------------
+# shared state
+# ----------------------------------------------------------------------
+
+_state_ready = False
+
+
+def _state_qs():
+    global _state_ready
+    if not _state_ready:
+        SimulationState.objects.get_or_create(name=STATE_NAME)
+        _state_ready = True
+    return SimulationState.objects.filter(name=STATE_NAME)
+
+
+def snapshot(max_age=SNAPSHOT_TTL):
+    """
+    ``{'state', 'leases', 'checkpoint'}`` as plain dicts, at most ``max_age``
+    seconds old. ``leases`` maps role -> holder for unexpired leases.
+    """
+    now = time.monotonic()
+    with _snapshot_lock:
+        cached = _snapshot["value"]
+        if cached is not None and now - _snapshot["at"] < max_age:
+            return cached
+
+    state = _state_qs().values(
+        "running", "sensor_count", "sensor_data", "tick", "reset_count", "updated_at"
+    ).first()
+    leases = dict(
+        LeaderLease.objects.filter(expires_at__gt=timezone.now()).values_list("name", "holder")
+    )
+    checkpoint = SyncCheckpoint.objects.filter(name=CHECKPOINT_NAME).values(
+        "total_synced", "last_timestamp"
+    ).first() or {"total_synced": 0, "last_timestamp": None}
+
+    value = {"state": state, "leases": leases, "checkpoint": checkpoint}
+    with _snapshot_lock:
+        _snapshot["value"], _snapshot["at"] = value, time.monotonic()
+    return value
+
+
+def invalidate_snapshot():
+    with _snapshot_lock:
+        _snapshot["value"] = None
+
+
+def update_state(only_if=None, guard=None, **fields):
+    """
+    UPDATE the shared state row. ``only_if`` adds filter conditions, making
+    e.g. start a compare-and-set; ``guard`` is an extra condition expression
+    (see ``lease_guard``). Returns True when the row was updated.
+    """
+    qs = _state_qs()
+    if only_if:
+        qs = qs.filter(**only_if)
+    if guard is not None:
+        qs = qs.filter(guard)
+    updated = qs.update(**fields)
+    invalidate_snapshot()
+    return bool(updated)
+
+
+def record_tick(sensor_data, role=None):
+    """
+    Publish a simulator tick. With ``role`` the write is fenced: it only
+    applies while this process still holds that lease. Returns True if applied.
+    """
+    guard = lease_guard(role) if role is not None else None
+    return update_state(guard=guard, sensor_data=sensor_data, tick=models.F("tick") + 1)
+
+
+# ----------------------------------------------------------------------
+# leader leases
+# ----------------------------------------------------------------------
+
+def _hold(name, generation, started, ttl):
+    # The deadline counts from before the query: the lease may have been
+    # written at any point while it ran
+    with _held_lock:
+        _held[name] = (generation, started + ttl - LEASE_MARGIN)
+
+
+def _drop(name):
+    with _held_lock:
+        _held.pop(name, None)
+
+
+def acquire_lease(name, ttl=LEASE_TTL):
+    """Take or renew the ``name`` lease for this process. Returns True if held."""
+    started = time.monotonic()
+    now = timezone.now()
+    expires = now + timedelta(seconds=ttl)
+    with _held_lock:
+        held = _held.get(name)
+    if held is not None:
+        renewed = LeaderLease.objects.filter(
+            name=name, holder=PROCESS_ID, generation=held[0]
+        ).update(expires_at=expires)
+        if renewed:
+            _hold(name, held[0], started, ttl)
+            return True
+        _drop(name)
+
+    taken = LeaderLease.objects.filter(name=name).filter(
+        models.Q(expires_at__isnull=True) | models.Q(expires_at__lte=now)
+    ).update(holder=PROCESS_ID, acquired_at=now, expires_at=expires, generation=models.F("generation") + 1)
+    if taken:
+        generation = LeaderLease.objects.filter(name=name, holder=PROCESS_ID).values_list("generation", flat=True).first()
+        if generation is None:
+            return False
+        _hold(name, generation, started, ttl)
+        logger.info(f"Acquired {name} lease as {PROCESS_ID} (generation {generation})")
+        return True
+
+    try:
+        lease = LeaderLease.objects.create(
+            name=name, holder=PROCESS_ID, acquired_at=now, expires_at=expires, generation=1
+        )
+    except IntegrityError:
+        return False
+    _hold(name, lease.generation, started, ttl)
+    logger.info(f"Acquired {name} lease as {PROCESS_ID} (generation {lease.generation})")
+    return True
+
+
+def holds_lease(name):
+    """True while this process holds ``name`` with time to spare before it could expire."""
+    with _held_lock:
+        held = _held.get(name)
+    return held is not None and time.monotonic() < held[1]
+
+
+def lease_guard(name):
+    """
+    Condition for a fenced UPDATE: the ``name`` lease is unexpired and still
+    names this process with the generation it acquired.
+    """
+    with _held_lock:
+        held = _held.get(name)
+    if held is None:
+        # Matches nothing
+        return models.Q(pk__in=[])
+    return models.Exists(LeaderLease.objects.filter(
+        name=name, holder=PROCESS_ID, generation=held[0], expires_at__gt=timezone.now()
+    ))
+
+
+def release_lease(name):
+    _drop(name)
+    LeaderLease.objects.filter(name=name, holder=PROCESS_ID).update(expires_at=timezone.now())
+
+
+# ----------------------------------------------------------------------
+# supervisor
+# ----------------------------------------------------------------------
+
+class Supervisor:
+    """
+    Daemon thread calling ``step()`` every ``interval`` seconds (or sooner
+    after ``wake()``). One per process, started lazily by the views.
+    """
+
+    def __init__(self, step, interval=SUPERVISOR_INTERVAL):
+        self.step = step
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="simulation-supervisor", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                close_old_connections()
+                self.step()
+            except Exception as e:
+                logger.error(f"Supervisor step failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
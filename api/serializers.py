@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from core.models import Sensor, Reading, BlogPost
+from core.models import AqiCategory, Sensor, Reading, BlogPost
+from .aqi import classify, describe
 
 
 class SensorNestedSerializer(serializers.ModelSerializer):
@@ -12,12 +13,14 @@ class SensorNestedSerializer(serializers.ModelSerializer):
 
 class ReadingSerializer(serializers.ModelSerializer):
     aqi = serializers.SerializerMethodField(read_only=True)
+    aqi_category = serializers.ReadOnlyField()
+    aqi_color = serializers.ReadOnlyField()
     sensor_detail = SensorNestedSerializer(source='sensor', read_only=True)
 
     class Meta:
         model = Reading
         fields = '__all__'
-        read_only_fields = ('aqi', 'sensor_detail', 'timestamp')
+        read_only_fields = ('aqi', 'sensor_detail', 'timestamp', 'category')
 
     def get_aqi(self, obj):
         return obj.air_quality
@@ -48,9 +51,115 @@ class ReadingSerializer(serializers.ModelSerializer):
                     'air_quality': 'Air quality must be between 0 and 500'
                 })
         
+        # Category is derived from the AQI, never taken from the client
+        if self.instance is None or 'air_quality' in data:
+            classify([data])
+        
         return data
 
 
+class ReadingRows:
+    """
+    ``ReadingSerializer``'s read representation built straight from
+    ``.values()`` rows, for list responses.
+
+    The field plan is worked out once from the serializer's own fields, so
+    the output keeps the same keys and order, but rows skip model instances
+    and per-field ``to_representation`` calls. Values stay native (datetimes
+    included) for the JSON renderer to encode.
+    """
+    # Declared fields computed from other columns, and where they come from
+    DERIVED = {
+        'aqi': 'air_quality',
+        'aqi_category': None,
+        'aqi_color': None,
+        'sensor_detail': None,
+    }
+
+    def __init__(self):
+        self.fields = tuple(ReadingSerializer().fields)
+        self.sensor_fields = tuple(SensorNestedSerializer.Meta.fields)
+        plan = []
+        for name in self.fields:
+            if name in self.DERIVED:
+                # Computed fields hold their slot with category_id until filled in
+                plan.append((name, self.DERIVED[name] or 'category_id'))
+            else:
+                # FKs come out of .values() under their attname (sensor_id)
+                plan.append((name, Reading._meta.get_field(name).attname))
+        self.plan = tuple(plan)
+        self.columns = tuple(dict.fromkeys(
+            [column for _, column in self.plan]
+            + ['sensor_id', 'category_id']
+            + [f'sensor__{f}' for f in self.sensor_fields]
+        ))
+        self.categories = {code: describe(code) for code in AqiCategory.BY_CODE}
+
+    def row(self, values, sensors=None):
+        """
+        One output dict. ``sensors`` (sensor pk -> nested dict) lets a batch
+        share each sensor's ``sensor_detail`` instead of rebuilding it.
+        """
+        item = {field: values[column] for field, column in self.plan}
+        item['aqi_category'], item['aqi_color'] = self.categories.get(values['category_id'], ("", ""))
+        sensor_pk = values['sensor_id']
+        if sensor_pk is None:
+            item['sensor_detail'] = None
+        elif sensors is not None and sensor_pk in sensors:
+            item['sensor_detail'] = sensors[sensor_pk]
+        else:
+            detail = {f: values[f'sensor__{f}'] for f in self.sensor_fields}
+            if sensors is not None:
+                sensors[sensor_pk] = detail
+            item['sensor_detail'] = detail
+        return item
+
+    def rows(self, values):
+        sensors = {}
+        return [self.row(v, sensors) for v in values]
+
+
+# Fields of the hand-built sensor readings responses (?fields= selects from these)
+SENSOR_READING_FIELDS = (
+    'timestamp', 'temperature', 'humidity', 'air_quality', 'pm25', 'aqi_category',
+    'aqi_color', 'co_level', 'no_level', 'smoke', 'latitude', 'longitude',
+)
+
+# Response fields looked up from the stored category code
+CATEGORY_FIELDS = ('aqi_category', 'aqi_color')
+
+
+def reading_columns(fields):
+    """Database columns behind the requested response fields"""
+    columns = [f for f in fields if f not in CATEGORY_FIELDS]
+    if len(columns) < len(fields):
+        columns.append('category_id')
+    return columns
+
+
+def reading_item(row, fields):
+    """Response dict for one ``.values()`` row (datetimes are left to the encoder)"""
+    item = {}
+    for f in fields:
+        if f in CATEGORY_FIELDS:
+            name, color = describe(row['category_id'])
+            item[f] = name if f == 'aqi_category' else color
+        else:
+            item[f] = row[f]
+    return item
+
+
+_reading_rows = None
+
+
+def reading_rows():
+    """The shared ``ReadingRows`` plan, built on first use."""
+    global _reading_rows
+    if _reading_rows is None:
+        _reading_rows = ReadingRows()
+    return _reading_rows
+
+
 class SensorSerializer(serializers.ModelSerializer):
     """
     Serializer for Sensor model.
@@ -72,6 +181,9 @@ class SensorSerializer(serializers.ModelSerializer):
         )
 
     def get_latest(self, obj):
+        # SensorViewSet attaches latest_reading, already rendered, for all sensors in one query
+        if hasattr(obj, 'latest_reading'):
+            return obj.latest_reading
         reading = obj.readings.first()
         return ReadingSerializer(reading).data if reading else None
 
@@ -109,10 +221,8 @@ class ReadingIngestSerializer(serializers.Serializer):
 
     temperature = serializers.FloatField()
     humidity = serializers.FloatField()
-    air_quality = serializers.FloatField()
-
-    aqi_category = serializers.CharField(max_length=50)
-    aqi_color = serializers.CharField(max_length=20)
+    air_quality = serializers.FloatField(required=False)
+    pm25 = serializers.FloatField(required=False)
 
     co_level = serializers.FloatField()
     no_level = serializers.FloatField()
@@ -0,0 +1,189 @@
+"""
+Vectorized grid simulator for load testing.
+
+``GridSimulator`` lays N virtual sensors out on a lat/long grid and produces
+every tick as NumPy arrays instead of one ``random.uniform`` dict per sensor.
+Readings are realistic enough to exercise charts, rollups and forecasts:
+
+* a fixed spatial pollution field (a few Gaussian hotspots over a city-wide
+  base level) so neighbouring sensors read alike,
+* a diurnal cycle with morning and evening rush-hour peaks, and temperature /
+  humidity following the sun in opposite directions,
+* AR(1) noise per sensor plus a shared city-wide component, so consecutive
+  ticks and nearby sensors are correlated rather than independent draws.
+
+Everything is driven by one seeded ``numpy.random.Generator``, so the same
+seed reproduces the same sensors and the same sequence of ticks.
+"""
+import math
+
+import numpy as np
+from django.utils import timezone
+
+from core.models import Sensor, Reading
+from . import aqi
+
+# Roughly greater Chennai
+DEFAULT_BBOX = (12.90, 13.20, 80.10, 80.30)
+
+
+def diurnal_factor(hours):
+    """Multiplier peaking at the 08:00 and 18:00 rush hours, lowest before dawn."""
+    morning = np.exp(-0.5 * ((hours - 8.5) / 1.5) ** 2)
+    evening = np.exp(-0.5 * ((hours - 18.5) / 2.0) ** 2)
+    night = -0.25 * np.exp(-0.5 * ((hours - 4.0) / 2.0) ** 2)
+    return 1.0 + 0.45 * morning + 0.55 * evening + night
+
+
+class GridSimulator:
+    def __init__(self, count, bbox=DEFAULT_BBOX, seed=42, prefix="GRID", hotspots=6):
+        self.count = count
+        self.prefix = prefix
+        self.rng = np.random.default_rng(seed)
+
+        lat_min, lat_max, lon_min, lon_max = bbox
+        cols = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / cols)
+        grid_lat, grid_lon = np.meshgrid(
+            np.linspace(lat_min, lat_max, rows),
+            np.linspace(lon_min, lon_max, cols),
+            indexing="ij",
+        )
+        self.latitude = np.round(grid_lat.ravel()[:count], 6)
+        self.longitude = np.round(grid_lon.ravel()[:count], 6)
+        self.sensor_ids = [f"{prefix}-{i:06d}" for i in range(count)]
+
+        # Spatial pollution field: base level plus Gaussian hotspots
+        centres_lat = self.rng.uniform(lat_min, lat_max, hotspots)
+        centres_lon = self.rng.uniform(lon_min, lon_max, hotspots)
+        strength = self.rng.uniform(20, 70, hotspots)
+        radius = self.rng.uniform(0.01, 0.04, hotspots)
+        d2 = (
+            (self.latitude[:, None] - centres_lat[None, :]) ** 2
+            + (self.longitude[:, None] - centres_lon[None, :]) ** 2
+        )
+        self.base_pm25 = 30 + (strength * np.exp(-d2 / (2 * radius ** 2))).sum(axis=1)
+        self.base_pm25 += self.rng.normal(0, 4, count)
+
+        self._noise = np.zeros(count)
+        self._city = 0.0
+
+    # ------------------------------------------------------------------
+
+    def register_sensors(self, batch_size=2000):
+        """Create the grid's Sensor rows (with coordinates) that do not exist yet."""
+        Sensor.objects.bulk_create([
+            Sensor(
+                sensor_id=sensor_id,
+                name=sensor_id,
+                area="Simulated grid",
+                latitude=float(lat),
+                longitude=float(lon),
+                is_active=True,
+            )
+            for sensor_id, lat, lon in zip(self.sensor_ids, self.latitude, self.longitude)
+        ], batch_size=batch_size, ignore_conflicts=True)
+
+    def sensors(self):
+        """{sensor_id: Sensor} for the grid, looked up once for ``to_readings``."""
+        return Sensor.objects.in_bulk(list(self.sensor_ids), field_name='sensor_id')
+
+    def tick(self, timestamp, rho=0.9):
+        """One reading per sensor at ``timestamp`` as a dict of arrays."""
+        n = self.count
+        local_time = timezone.localtime(timestamp) if timezone.is_aware(timestamp) else timestamp
+        hour = local_time.hour + local_time.minute / 60.0
+
+        # AR(1) noise per sensor plus a slowly drifting city-wide component
+        self._noise = rho * self._noise + self.rng.normal(0, 6, n) * math.sqrt(1 - rho ** 2)
+        self._city = rho * self._city + self.rng.normal(0, 8) * math.sqrt(1 - rho ** 2)
+
+        pm25 = np.clip(self.base_pm25 * diurnal_factor(hour) + self._noise + self._city, 5, 400)
+        sun = math.sin(2 * math.pi * (hour - 8) / 24)  # peaks mid-afternoon
+        temperature = np.clip(28 + 5 * sun + self.rng.normal(0, 0.6, n), -50, 60)
+        humidity = np.clip(65 - 15 * sun + self.rng.normal(0, 3, n), 0, 100)
+        no2 = np.clip(pm25 * 0.3 + self.rng.normal(0, 3, n), 1, 200)
+        co = np.clip(pm25 * 0.012 + self.rng.normal(0, 0.1, n), 0.05, 20)
+        pm25, no2, co = np.round(pm25, 1), np.round(no2, 1), np.round(co, 2)
+        index, category = aqi.compute(pm25, no2, co)
+
+        return {
+            "temperature": np.round(temperature, 1),
+            "humidity": np.round(humidity, 1),
+            "pm25": pm25,
+            "no2": no2,
+            "co": co,
+            "aqi": index.astype(int),
+            "category": category,
+        }
+
+    def to_readings(self, arrays, timestamp, sensors):
+        """
+        Turn a tick into ``Reading`` instances for ``store_readings``. The
+        arrays are in range by construction and carry their AQI category, so
+        nothing goes through ``clean_reading`` / ``classify``.
+        """
+        columns = zip(
+            self.sensor_ids,
+            self.latitude.tolist(),
+            self.longitude.tolist(),
+            arrays["temperature"].tolist(),
+            arrays["humidity"].tolist(),
+            arrays["aqi"].tolist(),
+            arrays["category"].tolist(),
+            arrays["pm25"].tolist(),
+            arrays["co"].tolist(),
+            arrays["no2"].tolist(),
+        )
+        return [
+            Reading(
+                sensor=sensors[sensor_id],
+                slave_id=idx + 1,
+                timestamp=timestamp,
+                temperature=temperature,
+                humidity=humidity,
+                air_quality=float(index),
+                category_id=code or None,
+                pm25=pm25,
+                co_level=co,
+                no_level=no2,
+                smoke=0.0,
+                latitude=lat,
+                longitude=lon,
+            )
+            for idx, (sensor_id, lat, lon, temperature, humidity, index, code, pm25, co, no2)
+            in enumerate(columns)
+        ]
+
+    def to_payloads(self, arrays, timestamp):
+        """Turn a tick into raw reading dicts for the ingest queue."""
+        stamp = timestamp.isoformat()
+        columns = zip(
+            self.sensor_ids,
+            self.latitude.tolist(),
+            self.longitude.tolist(),
+            arrays["temperature"].tolist(),
+            arrays["humidity"].tolist(),
+            arrays["aqi"].tolist(),
+            arrays["pm25"].tolist(),
+            arrays["co"].tolist(),
+            arrays["no2"].tolist(),
+        )
+        return [
+            {
+                "sensor_id": sensor_id,
+                "slave_id": idx + 1,
+                "timestamp": stamp,
+                "temperature": temperature,
+                "humidity": humidity,
+                "air_quality": float(index),
+                "pm25": pm25,
+                "co_level": co,
+                "no_level": no2,
+                "smoke": 0.0,
+                "latitude": lat,
+                "longitude": lon,
+            }
+            for idx, (sensor_id, lat, lon, temperature, humidity, index, pm25, co, no2)
+            in enumerate(columns)
+        ]
@@ -0,0 +1,208 @@
+"""
+In-memory spatial index of active sensors for the map endpoints.
+
+Sensor coordinates are loaded once into NumPy arrays sorted by latitude, so
+a bounding box is two ``searchsorted`` calls plus a longitude mask over the
+latitude band, and the k nearest sensors come from a band that widens until
+it provably contains them (a point outside a band of half-width ``r`` degrees
+of latitude is at least ``r`` degrees of arc away).
+
+The index is rebuilt when the sensor set changes. Changes are detected with
+a fingerprint (count, max id and coordinate sums of the active located
+sensors) that is re-checked at most every ``SPATIAL_INDEX_CHECK_SECONDS``, so
+sensors created by any path - bulk ingest, the sync, the admin - show up
+without explicit invalidation.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+
+from core.models import Sensor, Reading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+# First latitude band searched by nearest(), in degrees (~1 km)
+INITIAL_BAND = 0.01
+
+FIELDS = ('pk', 'sensor_id', 'name', 'area', 'latitude', 'longitude')
+LATEST_FIELDS = ('sensor_id', 'timestamp', 'air_quality', 'category_id', 'temperature', 'humidity')
+LATEST_CHUNK_SIZE = 2000
+
+
+def located_sensors():
+    return Sensor.objects.filter(is_active=True, latitude__isnull=False, longitude__isnull=False)
+
+
+def fingerprint():
+    return tuple(located_sensors().aggregate(
+        count=models.Count('id'),
+        last=models.Max('id'),
+        lat=models.Sum('latitude'),
+        lon=models.Sum('longitude'),
+    ).values())
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from (lat, lon) to each of ``lats``/``lons``."""
+    phi1, phi2 = np.radians(lat), np.radians(lats)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class SensorIndex:
+    def __init__(self, rows, version=None):
+        rows = sorted(rows, key=lambda r: r['latitude'])
+        self.version = version
+        self.rows = rows
+        self.lat = np.array([r['latitude'] for r in rows], dtype=float)
+        self.lon = np.array([r['longitude'] for r in rows], dtype=float)
+        self.pk = np.array([r['pk'] for r in rows], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _band(self, south, north):
+        return (
+            int(np.searchsorted(self.lat, south, side='left')),
+            int(np.searchsorted(self.lat, north, side='right')),
+        )
+
+    def within(self, south, west, north, east):
+        """Positions of sensors inside the box; ``west > east`` crosses the antimeridian."""
+        lo, hi = self._band(south, north)
+        lon = self.lon[lo:hi]
+        if west <= east:
+            mask = (lon >= west) & (lon <= east)
+        else:
+            mask = (lon >= west) | (lon <= east)
+        return lo + np.flatnonzero(mask)
+
+    def nearest(self, lat, lon, k=5, max_km=None):
+        """``(positions, distances_km)`` of the ``k`` nearest sensors, closest first."""
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        limit = max_km / KM_PER_DEGREE if max_km is not None else 180.0
+        band = min(INITIAL_BAND, limit)
+        while True:
+            lo, hi = self._band(lat - band, lat + band)
+            distances = haversine_km(lat, lon, self.lat[lo:hi], self.lon[lo:hi])
+            covers_all = lo == 0 and hi == len(self)
+            if len(distances) >= k:
+                kth = np.partition(distances, k - 1)[k - 1]
+                # Everything outside the band is further than band degrees of arc
+                if kth <= band * KM_PER_DEGREE or band >= limit:
+                    break
+                band = min(kth / KM_PER_DEGREE * 1.0001, limit)
+            elif covers_all or band >= limit:
+                break
+            else:
+                band = min(band * 4, limit)
+
+        if max_km is not None:
+            keep = distances <= max_km
+        else:
+            keep = np.ones(len(distances), dtype=bool)
+        candidates = np.flatnonzero(keep)
+        order = candidates[np.argsort(distances[candidates], kind='stable')][:k]
+        return lo + order, distances[order]
+
+    def sensors(self, positions):
+        return [self.rows[i] for i in positions]
+
+
+_index = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_index():
+    """The current index, rebuilt if the sensor fingerprint changed."""
+    global _index, _checked_at
+    interval = getattr(settings, 'SPATIAL_INDEX_CHECK_SECONDS', 5)
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at < interval:
+            return _index
+        version = fingerprint()
+        if _index is None or _index.version != version:
+            _index = SensorIndex(list(located_sensors().values(*FIELDS)), version)
+        _checked_at = now
+        return _index
+
+
+def clear_index():
+    global _index
+    with _lock:
+        _index = None
+
+
+def latest_readings(pks):
+    """sensor pk -> newest reading (``LATEST_FIELDS``), two queries per chunk of sensors."""
+    latest = Reading.objects.filter(
+        sensor=models.OuterRef('pk')
+    ).order_by('-timestamp', '-id').values('pk')[:1]
+    found = {}
+    pks = [int(pk) for pk in pks]
+    for offset in range(0, len(pks), LATEST_CHUNK_SIZE):
+        ids = Sensor.objects.filter(pk__in=pks[offset:offset + LATEST_CHUNK_SIZE]).annotate(
+            latest_reading_id=models.Subquery(latest)
+        ).exclude(latest_reading_id=None).values_list('latest_reading_id', flat=True)
+        for row in Reading.objects.filter(pk__in=list(ids)).values(*LATEST_FIELDS):
+            found[row['sensor_id']] = row
+    return found
+
+
+def parse_bbox(value):
+    """``south,west,north,east`` -> floats, or raise ValueError."""
+    try:
+        parts = [float(p) for p in value.split(',')]
+    except ValueError:
+        parts = []
+    if len(parts) != 4 or not all(math.isfinite(p) for p in parts):
+        raise ValueError("bbox must be south,west,north,east")
+    south, west, north, east = parts
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox must be south,west,north,east with south <= north")
+    return south, west, north, east
+
+
+def cluster(lats, lons, zoom, values=None, cells_per_tile=4):
+    """
+    Group points into square grid cells of ``1 / cells_per_tile`` of a map
+    tile at ``zoom``. Returns dicts with the cell centroid, the point count
+    and, for ``values`` (None/NaN = unknown), their mean and max.
+    """
+    size = 360.0 / (2 ** zoom) / cells_per_tile
+    keys = np.stack([np.floor(lats / size), np.floor(lons / size)], axis=1)
+    cells, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    lat_mean = np.bincount(inverse, lats) / counts
+    lon_mean = np.bincount(inverse, lons) / counts
+
+    if values is not None:
+        values = np.asarray(values, dtype=float)
+        known = ~np.isnan(values)
+        known_counts = np.bincount(inverse[known], minlength=len(cells))
+        sums = np.bincount(inverse[known], values[known], minlength=len(cells))
+        maxima = np.full(len(cells), -np.inf)
+        np.maximum.at(maxima, inverse[known], values[known])
+
+    out = []
+    for i in range(len(cells)):
+        item = {
+            'latitude': round(float(lat_mean[i]), 6),
+            'longitude': round(float(lon_mean[i]), 6),
+            'count': int(counts[i]),
+        }
+        if values is not None:
+            item['avg_aqi'] = round(float(sums[i] / known_counts[i]), 1) if known_counts[i] else None
+            item['max_aqi'] = float(maxima[i]) if known_counts[i] else None
+        out.append(item)
+    return out
@@ -14,11 +14,21 @@ from .views import (
     get_logs,
     get_sensor_data_simulation,
     debug_simulation_files,
+    metrics_endpoint,
     get_sensor_history,
     set_sensor_count,
     manual_db_sync,
+    event_stream,
     get_sensor_readings,      # NEW
     get_sensor_forecast,      # NEW
+    get_sensors_forecast,
+    get_sensors_batch_readings,
+    get_sensor_rollups,
+    export_readings,
+    get_sensors_within,
+    get_nearest_sensors,
+    get_viewport_readings,
+    heatmap_tile,
 )
 
 
@@ -28,10 +38,12 @@ router.register('sensors', SensorViewSet, basename='sensor')
 router.register('readings', ReadingViewSet, basename='reading')
 router.register('posts', BlogPostViewSet, basename='post')
 
-# Combine router URLs with custom endpoints
-urlpatterns = router.urls + [
+# Combine custom endpoints with router URLs. Custom paths go first so that
+# e.g. readings/bulk-ingest/ is not swallowed by the readings/<pk>/ route.
+urlpatterns = [
     path('readings/ingest/', ingest_reading, name='ingest-reading'),
     path('readings/bulk-ingest/', bulk_ingest_readings, name='bulk-ingest-reading'),
+    path('readings/export/', export_readings, name='export-readings'),
     path("sensor-logs/", sensor_logs, name='sensor_logs'),
     
     # Simulation control endpoints
@@ -44,14 +56,42 @@ urlpatterns = router.urls + [
     path('logs/', get_logs, name='get_logs'),
     path('sensor-data/', get_sensor_data_simulation, name='get_sensor_data_simulation'),
     path('simulation/debug/', debug_simulation_files, name='debug-simulation'),
+    path('metrics/', metrics_endpoint, name='metrics'),
     path('simulation/history/', get_sensor_history, name='sensor-history'),
     path('set_sensor_count/', set_sensor_count), 
     path('manual-db-sync/', manual_db_sync, name='manual_db_sync'),
+    path('stream/', event_stream, name='event_stream'),
     
     # ============================================================================
     # NEW SENSOR-SPECIFIC ENDPOINTS
     # ============================================================================
     
+    # Forecast all active sensors (or ?ids=...) in one call
+    path('sensors/forecast/', 
+         get_sensors_forecast, 
+         name='sensors_forecast'),
+    
+    # Readings (+ optional forecasts) for many sensors in one round trip
+    path('sensors/batch/readings/', 
+         get_sensors_batch_readings, 
+         name='sensors_batch_readings'),
+    
+    # Map: sensors in a bounding box, k nearest to a point, latest readings on screen
+    path('sensors/within/', 
+         get_sensors_within, 
+         name='sensors_within'),
+    path('sensors/nearest/', 
+         get_nearest_sensors, 
+         name='sensors_nearest'),
+    path('sensors/viewport/', 
+         get_viewport_readings, 
+         name='sensors_viewport'),
+    
+    # IDW-interpolated AQI overlay as map tiles
+    path('heatmap/<int:z>/<int:x>/<int:y>.png', 
+         heatmap_tile, 
+         name='heatmap_tile'),
+    
     # Get readings for a specific sensor with time range filtering
     path('sensors/<str:sensor_id>/readings/', 
          get_sensor_readings, 
@@ -61,7 +101,12 @@ urlpatterns = router.urls + [
     path('sensors/<str:sensor_id>/forecast/', 
          get_sensor_forecast, 
          name='sensor_forecast'),
-]
+    
+    # Bucketed history (1 min / 1 h / 1 day rollups picked from the window)
+    path('sensors/<str:sensor_id>/history/', 
+         get_sensor_rollups, 
+         name='sensor_rollups'),
+] + router.urls
 
 
 # ============================================================================
@@ -74,6 +119,24 @@ urlpatterns = router.urls + [
 # Get forecast for sensor KP-002:
 # GET /api/sensors/KP-002/forecast/
 #
+# Get forecasts for several sensors at once:
+# GET /api/sensors/forecast/?ids=KP-001,KP-002
+#
+# Get readings and forecasts for every active sensor in one call:
+# GET /api/sensors/batch/readings/?hours=24&limit=100&forecast=1
+#
+# Sensors inside a bounding box (south,west,north,east):
+# GET /api/sensors/within/?bbox=13.07,80.235,13.095,80.265
+#
+# Three sensors nearest to a point:
+# GET /api/sensors/nearest/?lat=13.08&lng=80.25&k=3
+#
+# Latest readings on screen (clustered above 500 sensors):
+# GET /api/sensors/viewport/?bbox=13.07,80.235,13.095,80.265&zoom=15
+#
+# AQI heatmap tile (Leaflet: L.tileLayer('/api/heatmap/{z}/{x}/{y}.png')):
+# GET /api/heatmap/15/23688/15182.png
+#
 # Get last 100 readings for sensor EG-001:
 # GET /api/sensors/EG-001/readings/?limit=100
 #
@@ -1,19 +1,50 @@
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from rest_framework import viewsets, status
+from rest_framework import viewsets
 from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.db import IntegrityError, models
+from django.db.models.functions import RowNumber
 from core.models import Sensor, Reading, BlogPost
-from .serializers import SensorSerializer, ReadingSerializer, BlogPostSerializer
+from .serializers import (
+    SensorSerializer, ReadingSerializer, BlogPostSerializer, reading_rows,
+    SENSOR_READING_FIELDS, reading_columns, reading_item,
+)
+from .ingest import insert_readings, insert_readings_each
+from .batcher import get_batcher
+from .ingest_queue import queue_enabled, enqueue_readings, get_queue
+from .rollups import window_series, window_summary, METRICS
+from .forecasting import forecast_sensor, forecast_sensors, ForecastError
+from .sync import sync_store, get_checkpoint, reset_checkpoint_total, sync_lag_seconds
+from .history_store import HISTORY_DIR, history_store
+from .logbuffer import LogBuffer
+from .events import event_bus
+from . import runtime
+from . import archive
+from . import spatial
+from . import heatmap
+from .aqi import reading_aqi, describe, category_for
+from . import metrics as app_metrics
+from .cache import (
+    cached_response, bump, SIMULATION,
+    scope_all_sensors, scope_sensor, scope_sensor_ids, scope_simulation,
+)
+from .pagination import ReadingCursorPagination
+from .renderers import NDJSONRenderer, FastJsonResponse, dumps
+from rest_framework.settings import api_settings
 from rest_framework import permissions
 from django.utils import timezone
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import logging
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 import json, os
 from django.conf import settings
 import random
@@ -21,7 +52,6 @@ import threading
 import time
 from datetime import datetime
 
-FILE_PATH = "static/sensor_data.json"
 DELAY = 10
 
 logger = logging.getLogger(__name__)
@@ -29,24 +59,30 @@ logger = logging.getLogger(__name__)
 # ============================================================================
 # SIMULATION STATE
 # ============================================================================
+# The shared state (running, sensor count, latest readings) lives in the
+# database, see api/runtime.py. These dicts only track the threads *this*
+# process runs while it holds the simulator / db_sync leader lease.
 simulation_state = {
     'running': False,
     'thread': None,
-    'logs': [],
-    'sensor_data': [],
-    'sensor_count': 1 
 }
 
 db_sync_state = {
     "running": False,
     "thread": None,
-    "last_synced_count": 0,
-    "total_synced": 0,
 }
 
-LOG_PATH = os.path.join(settings.BASE_DIR, "static", "sensor_logs.json")
+LOG_PATH = os.path.join(settings.BASE_DIR, "static", "sensor_logs.ndjson")
+MAX_LOGS = 200
 DATA_PATH = os.path.join(settings.BASE_DIR, "static", "sensor_data.json")
 
+log_buffer = LogBuffer(
+    LOG_PATH,
+    maxlen=MAX_LOGS,
+    flush_interval=getattr(settings, 'SIMULATION_LOG_FLUSH_INTERVAL', 2.0),
+    flush_size=getattr(settings, 'SIMULATION_LOG_FLUSH_SIZE', 50),
+)
+
 SENSORS = [
     {"slave_id": 1, "name": "KP-002", "location": "Ormes Road", "latitude": 13.0818, "longitude": 80.2460},
     {"slave_id": 2, "name": "KP-003", "location": "Flowers Road", "latitude": 13.0782, "longitude": 80.2468},
@@ -61,80 +97,26 @@ SENSORS = [
 ]
 
 def sync_json_to_database():
-    """Read the JSON array and sync only NEW records to database"""
-    print("🚀 Database sync thread started (1 min interval)")
+    """Periodically sync records past the durable high-water mark to the database"""
+    print(f"🚀 Database sync thread started ({DELAY}s interval)")
     
     while db_sync_state['running']:
         try:
             time.sleep(DELAY)
             
-            with open(FILE_PATH, "r") as f:
-                all_readings = json.load(f)
+            if not runtime.holds_lease(runtime.SYNCER):
+                # Renewal failed for too long; another worker may take over
+                print("⚠️  Sync lease not renewed in time, stopping")
+                db_sync_state['running'] = False
+                break
             
-            already_synced = db_sync_state['last_synced_count']
-            new_readings = all_readings[already_synced:]
+            result = sync_store(history_store)
             
-            if not new_readings:
+            if not result['synced_count']:
                 print("ℹ️  No new readings to sync")
                 continue
             
-            print(f"🔄 Syncing {len(new_readings)} new readings to database...")
-            
-            synced_count = 0
-            error_count = 0
-            
-            for reading_data in new_readings:
-                try:
-                    sensor, created = Sensor.objects.get_or_create(
-                        sensor_id=reading_data["name"],
-                        defaults={
-                            "name": reading_data["name"],
-                            "area": reading_data.get("location", ""),  
-                            "latitude": reading_data.get("latitude"),
-                            "longitude": reading_data.get("longitude"),
-                            "is_active": True,
-                        }
-                    )
-                    
-                    if created:
-                        print(f"   ➕ Created new sensor: {reading_data['name']}")
-                    
-                    timestamp = datetime.strptime(
-                        reading_data["timestamp"],
-                        "%Y-%m-%d %H:%M:%S"
-                    )
-
-                    if timezone.is_naive(timestamp):
-                        timestamp = timezone.make_aware(timestamp)
-                    
-                    reading, created = Reading.objects.get_or_create(
-                        sensor=sensor,
-                        timestamp=timestamp,
-                        slave_id=reading_data["slave_id"],
-                        defaults={
-                            "temperature": reading_data.get("temperature"),
-                            "humidity": reading_data.get("humidity"),
-                            "air_quality": reading_data.get("pm25"),
-                            "no_level": reading_data.get("no2"),
-                            "co_level": reading_data.get("co"),
-                            "aqi_category": reading_data.get("aqi_category", ""),
-                            "aqi_color": reading_data.get("aqi_color", ""),
-                            "latitude": reading_data.get("latitude"),
-                            "longitude": reading_data.get("longitude"),
-                        }
-                    )
-                    
-                    if created:
-                        synced_count += 1
-                
-                except Exception as e:
-                    error_count += 1
-                    print(f"   ❌ Error syncing reading: {e}")
-            
-            db_sync_state['last_synced_count'] = len(all_readings)
-            db_sync_state['total_synced'] += synced_count
-            
-            print(f"✅ Sync complete: {synced_count} added, {error_count} errors (Total synced: {db_sync_state['total_synced']})")
+            print(f"✅ Sync complete: {result['synced_count']} added, {result['error_count']} errors (Total synced: {result['total_synced']})")
             print(f"   At {timezone.now()}")
             
         except Exception as e:
@@ -152,95 +134,35 @@ def manual_db_sync(request):
     try:
         logger.info("MANUAL SYNC: Starting...")
         
-        if not os.path.exists(DATA_PATH):
+        history_store.import_legacy_json(DATA_PATH)
+        
+        if not history_store.count():
             return JsonResponse({
                 'success': False,
-                'error': f'Data file not found at {DATA_PATH}'
+                'error': f'No history found in {HISTORY_DIR}'
             })
         
-        with open(DATA_PATH, 'r') as f:
-            all_readings = json.load(f)
-        
-        logger.info(f"MANUAL SYNC: Found {len(all_readings)} records in JSON")
+        result = sync_store(history_store)
         
-        already_synced = db_sync_state['last_synced_count']
-        new_readings = all_readings[already_synced:]
+        logger.info(f"MANUAL SYNC: {result['synced_count']} new of {result['total_in_file']} records in JSON")
         
-        if not new_readings:
+        if not result['synced_count']:
             return JsonResponse({
                 'success': True,
                 'message': 'No new readings to sync',
-                'total_in_json': len(all_readings),
-                'already_synced': already_synced
+                'total_in_json': result['total_in_file'],
+                'high_water_mark': result['high_water_mark'],
+                'error_count': result['error_count'],
             })
         
-        logger.info(f"MANUAL SYNC: Syncing {len(new_readings)} new records")
-        
-        synced_count = 0
-        error_count = 0
-        errors = []
-        
-        for idx, reading_data in enumerate(new_readings):
-            try:
-                sensor_name = reading_data.get('name')
-                slave_id = reading_data.get('slave_id')
-                
-                sensor, created = Sensor.objects.get_or_create(
-                    sensor_id=sensor_name,
-                    defaults={
-                        'name': sensor_name,
-                        'area': reading_data.get('location', ''),
-                        'latitude': reading_data.get('latitude'),
-                        'longitude': reading_data.get('longitude'),
-                        'is_active': True
-                    }
-                )
-                
-                timestamp_str = reading_data.get('timestamp')
-                timestamp = parse_datetime(timestamp_str)
-                if not timestamp:
-                    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                
-                reading, created = Reading.objects.get_or_create(
-                    sensor=sensor,
-                    timestamp=timestamp,
-                    slave_id=slave_id,
-                    defaults={
-                        'temperature': reading_data.get('temperature'),
-                        'humidity': reading_data.get('humidity'),
-                        'air_quality': reading_data.get('pm25'),
-                        'aqi_category': reading_data.get('aqi_category', ''),
-                        'aqi_color': reading_data.get('aqi_color', ''),
-                        'co_level': reading_data.get('co'),
-                        'no_level': reading_data.get('no2'),
-                        'smoke': 0.0,
-                        'latitude': reading_data.get('latitude'),
-                        'longitude': reading_data.get('longitude')
-                    }
-                )
-                
-                if created:
-                    synced_count += 1
-                    
-            except Exception as e:
-                error_count += 1
-                errors.append({
-                    'index': idx,
-                    'error': str(e),
-                    'data': reading_data
-                })
-                logger.error(f"MANUAL SYNC ERROR on record {idx}: {e}")
-        
-        db_sync_state['last_synced_count'] = len(all_readings)
-        db_sync_state['total_synced'] += synced_count
-        
         return JsonResponse({
             'success': True,
             'message': 'Manual sync complete',
-            'synced_count': synced_count,
-            'error_count': error_count,
-            'total_synced': db_sync_state['total_synced'],
-            'errors': errors[:5]
+            'synced_count': result['synced_count'],
+            'error_count': result['error_count'],
+            'total_synced': result['total_synced'],
+            'high_water_mark': result['high_water_mark'],
+            'errors': result['errors'][:5]
         })
         
     except Exception as e:
@@ -254,29 +176,120 @@ def manual_db_sync(request):
         }, status=500)
 
 
+def stop_local_role(local_state, role):
+    """Stop this process's thread for ``role`` and give up its lease"""
+    if local_state['running']:
+        local_state['running'] = False
+        if local_state['thread']:
+            local_state['thread'].join(timeout=2)
+    runtime.release_lease(role)
+
+
+def run_role(local_state, role, target, wanted):
+    """Keep ``target`` running here while ``role`` is wanted and we hold its lease"""
+    if wanted and runtime.acquire_lease(role):
+        if not local_state['running']:
+            local_state['running'] = True
+            local_state['thread'] = threading.Thread(target=target, daemon=True)
+            local_state['thread'].start()
+            return True
+        return False
+    
+    if local_state['running']:
+        stop_local_role(local_state, role)
+        return True
+    return False
+
+
+relay_state = {
+    'tick': None,
+    'status': None,
+    'reset_count': None,
+}
+
+
+def supervise():
+    """
+    One supervisor pass: elect/run the simulator and DB sync, and relay
+    other processes' ticks, status changes and log lines to this process's
+    event stream subscribers.
+    """
+    state = runtime.snapshot(max_age=0)['state']
+    
+    if state['reset_count'] != relay_state['reset_count']:
+        if relay_state['reset_count'] is not None:
+            log_buffer.clear()
+        relay_state['reset_count'] = state['reset_count']
+    
+    run_role(simulation_state, runtime.SIMULATOR, simulation_loop, state['running'])
+    sync_changed = run_role(
+        db_sync_state, runtime.SYNCER, sync_json_to_database,
+        state['running'] and not queue_enabled()
+    )
+    if sync_changed and db_sync_state['running']:
+        write_log(f"Database sync started ({DELAY}s interval)", "SYSTEM")
+    
+    for entry in log_buffer.mirror_file():
+        event_bus.publish('log', entry)
+    
+    if state['tick'] != relay_state['tick']:
+        # The simulator thread publishes its own ticks
+        if relay_state['tick'] is not None and not simulation_state['running']:
+            event_bus.publish('readings', {
+                'data': state['sensor_data'],
+                'running': state['running'],
+                'history_count': history_store.count()
+            })
+        relay_state['tick'] = state['tick']
+    
+    status = (state['running'], state['sensor_count'], state['reset_count'])
+    if status != relay_state['status']:
+        if relay_state['status'] is not None:
+            publish_status()
+        relay_state['status'] = status
+
+
+supervisor = runtime.Supervisor(supervise)
+
+
+def shared_state():
+    """Snapshot of the cross-process simulation state (starts the supervisor)"""
+    supervisor.ensure_started()
+    return runtime.snapshot()
+
+
+def wait_for_roles_released(timeout=runtime.SUPERVISOR_INTERVAL + 6):
+    """Wait until no process runs the simulator or DB sync any more"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        leases = runtime.snapshot(max_age=0)['leases']
+        if runtime.SIMULATOR not in leases and runtime.SYNCER not in leases:
+            return True
+        time.sleep(0.2)
+    return False
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def start_simulation(request):
     """Start the sensor simulation AND database sync automatically"""
-    if simulation_state['running']:
+    shared_state()
+    
+    # Compare-and-set so only one of several workers wins a concurrent start
+    if not runtime.update_state(only_if={'running': False}, running=True):
         return JsonResponse({
             'success': False,
             'message': 'Simulation already running'
         })
     
-    simulation_state['logs'] = []
-    simulation_state['running'] = True
-    simulation_state['thread'] = threading.Thread(target=simulation_loop, daemon=True)
-    simulation_state['thread'].start()
+    log_buffer.clear()
+    if queue_enabled():
+        write_log("Database sync handled by the ingest worker (run_ingest_worker --sync)", "SYSTEM")
+    print("🚀 Simulation and database sync requested")
     
-    if not db_sync_state['running']:
-        db_sync_state['running'] = True
-        db_sync_state['last_synced_count'] = 0
-        db_sync_state['total_synced'] = 0
-        db_sync_state['thread'] = threading.Thread(target=sync_json_to_database, daemon=True)
-        db_sync_state['thread'].start()
-        write_log("Database sync auto-started (1-minute interval)", "SYSTEM")
-        print("🚀 Database sync auto-started")
+    # The supervisor of whichever process gets the leases starts the threads
+    supervisor.wake()
+    publish_status()
     
     return JsonResponse({
         'success': True,
@@ -288,27 +301,28 @@ def start_simulation(request):
 @require_http_methods(["POST"])
 def stop_simulation(request):
     """Stop the sensor simulation AND database sync"""
-    if not simulation_state['running']:
+    shared_state()
+    
+    if not runtime.update_state(only_if={'running': True}, running=False):
         return JsonResponse({
             'success': False,
             'message': 'Simulation not running'
         })
     
-    simulation_state['running'] = False
-    if simulation_state['thread']:
-        simulation_state['thread'].join(timeout=2)
+    stop_local_role(simulation_state, runtime.SIMULATOR)
+    stop_local_role(db_sync_state, runtime.SYNCER)
+    supervisor.wake()
     
-    if db_sync_state['running']:
-        db_sync_state['running'] = False
-        if db_sync_state['thread']:
-            db_sync_state['thread'].join(timeout=2)
-        write_log(f"Database sync stopped (Total synced: {db_sync_state['total_synced']})", "SYSTEM")
-        print(f"🛑 Database sync stopped (Total synced: {db_sync_state['total_synced']})")
+    total_synced = get_checkpoint().total_synced
+    write_log(f"Database sync stopped (Total synced: {total_synced})", "SYSTEM")
+    print(f"🛑 Database sync stopped (Total synced: {total_synced})")
+    
+    publish_status()
     
     return JsonResponse({
         'success': True,
         'message': 'Simulation and database sync stopped',
-        'total_synced_to_db': db_sync_state['total_synced']
+        'total_synced_to_db': total_synced
     })
 
 
@@ -316,71 +330,69 @@ def stop_simulation(request):
 @require_http_methods(["POST"])
 def reset_simulation(request):
     """Reset the simulation, clear logs, AND reset DB sync state"""
-    if simulation_state['running']:
-        simulation_state['running'] = False
-        if simulation_state['thread']:
-            simulation_state['thread'].join(timeout=2)
+    shared_state()
+    
+    runtime.update_state(running=False, sensor_data=[], reset_count=models.F('reset_count') + 1)
+    stop_local_role(simulation_state, runtime.SIMULATOR)
+    stop_local_role(db_sync_state, runtime.SYNCER)
     
-    if db_sync_state['running']:
-        db_sync_state['running'] = False
-        if db_sync_state['thread']:
-            db_sync_state['thread'].join(timeout=2)
+    # Threads in other workers notice on their next supervisor pass
+    if not wait_for_roles_released():
+        logger.warning("Reset: simulator or sync still held by another process")
     
-    simulation_state['logs'] = []
-    simulation_state['sensor_data'] = []
+    log_buffer.clear(truncate=True)
     
-    db_sync_state['last_synced_count'] = 0
-    db_sync_state['total_synced'] = 0
+    reset_checkpoint_total()
     
     try:
-        with open(LOG_PATH, "w") as f:
-            json.dump([], f)
+        history_store.clear()
+        bump(SIMULATION)
         with open(DATA_PATH, "w") as f:
             json.dump([], f)
     except:
         pass
     
+    publish_status()
+    
     return JsonResponse({
         'success': True,
         'message': 'Simulation and database sync reset'
     })
 
 
+def simulation_status_payload():
+    """Status snapshot shared by the status endpoint and the event stream"""
+    snapshot = shared_state()
+    state = snapshot['state']
+    checkpoint = snapshot['checkpoint']
+    
+    return {
+        'running': state['running'],
+        'log_count': len(log_buffer),
+        'log_cursor': log_buffer.format_cursor(log_buffer.cursor),
+        'sensor_count': len(state['sensor_data']),
+        'active_sensor_count': state['sensor_count'],
+        'db_sync_running': runtime.SYNCER in snapshot['leases'],
+        'db_sync_total_synced': checkpoint['total_synced'],
+        'db_sync_high_water_mark': checkpoint['last_timestamp']
+    }
+
+
+def publish_status():
+    event_bus.publish('status', simulation_status_payload())
+
+
 @require_http_methods(["GET"])
 def simulation_status(request):
     """Get simulation status including database sync info"""
-    with simulation_lock:
-        current_count = simulation_state.get('sensor_count', 1)
-    
-    return JsonResponse({
-        'running': simulation_state['running'],
-        'log_count': len(simulation_state['logs']),
-        'sensor_count': len(simulation_state['sensor_data']),
-        'active_sensor_count': current_count,
-        'db_sync_running': db_sync_state['running'],
-        'db_sync_total_synced': db_sync_state['total_synced'],
-        'db_sync_last_count': db_sync_state['last_synced_count']
-    })
+    return JsonResponse(simulation_status_payload())
 
 
 def write_log(message, level="INFO"):
-    """Write log entry to both memory and file"""
-    log_entry = {
-        "timestamp": datetime.now().strftime("%H:%M:%S"),
-        "level": level,
-        "message": message
-    }
-    
-    simulation_state['logs'].append(log_entry)
-    
-    if len(simulation_state['logs']) > 200:
-        simulation_state['logs'] = simulation_state['logs'][-200:]
-    
-    try:
-        with open(LOG_PATH, "w") as f:
-            json.dump(simulation_state['logs'], f, indent=2)
-    except Exception as e:
-        logger.error(f"Error writing logs: {e}")
+    """Buffer a log entry and push it to stream subscribers"""
+    entry = log_buffer.append(message, level)
+    event_bus.publish('log', entry)
+    return entry
 
 
 def generate_sensor_reading(sensor):
@@ -391,20 +403,8 @@ def generate_sensor_reading(sensor):
     no2 = round(random.uniform(5, 50), 1)
     co = round(random.uniform(0.1, 2.0), 2)
     
-    if pm25 <= 50:
-        aqi = pm25
-        aqi_category = "Excellent"
-        aqi_color = "Green"
-    elif pm25 <= 100:
-        aqi = 50 + (pm25 - 50)
-        aqi_category = "Moderate"
-        aqi_color = "Yellow"
-    else:
-        aqi = 100 + (pm25 - 100) * 2
-        aqi_category = "Unhealthy"
-        aqi_color = "Red"
-    
-    aqi = int(min(aqi, 500))
+    aqi, code = reading_aqi(pm25=pm25, no2=no2, co=co)
+    aqi_category, aqi_color = describe(code)
     
     return {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -424,45 +424,39 @@ def generate_sensor_reading(sensor):
     }
 
 
-simulation_lock = threading.Lock()
-
-
 def simulation_loop():
     """Main simulation loop that runs in background thread"""
     write_log("Sensor simulation initialized", "SYSTEM")
     
     iteration = 0
-    write_log(f"Data file path: {DATA_PATH}", "DEBUG")
+    write_log(f"History store path: {HISTORY_DIR}", "DEBUG")
     
-    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-    write_log(f"Directory created/verified: {os.path.dirname(DATA_PATH)}", "DEBUG")
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    write_log(f"Directory created/verified: {HISTORY_DIR}", "DEBUG")
     
-    all_historical_data = []
     try:
-        if os.path.exists(DATA_PATH):
-            with open(DATA_PATH, "r") as f:
-                content = f.read()
-                if content.strip():
-                    all_historical_data = json.loads(content)
-                    write_log(f"Loaded {len(all_historical_data)} existing readings", "INFO")
-                else:
-                    write_log("Data file exists but is empty, starting fresh", "INFO")
-        else:
-            write_log("No existing data file, starting fresh", "INFO")
+        imported = history_store.import_legacy_json(DATA_PATH)
+        if imported:
+            write_log(f"Imported {imported} readings from legacy {os.path.basename(DATA_PATH)}", "INFO")
+        write_log(f"Loaded history store with {history_store.count()} existing readings", "INFO")
     except json.JSONDecodeError as e:
-        write_log(f"Error reading existing data (invalid JSON): {e}. Starting fresh.", "ERROR")
-        all_historical_data = []
+        write_log(f"Error reading legacy data (invalid JSON): {e}. Starting fresh.", "ERROR")
     except Exception as e:
         write_log(f"Error loading existing data: {e}. Starting fresh.", "ERROR")
-        all_historical_data = []
     
     while simulation_state['running']:
+        if not runtime.holds_lease(runtime.SIMULATOR):
+            # Renewal failed for too long; another worker may take over
+            write_log("Simulator lease not renewed in time, stopping", "SYSTEM")
+            simulation_state['running'] = False
+            break
+        
         try:
             iteration += 1
+            tick_started = time.perf_counter()
             simulated_data = []
             
-            with simulation_lock:
-                active_count = simulation_state.get('sensor_count', 1)
+            active_count = runtime.snapshot()['state']['sensor_count']
             
             write_log(f"Monitoring {active_count} sensors", "INFO")
             
@@ -476,30 +470,39 @@ def simulation_loop():
                     "DATA"
                 )
             
-            with simulation_lock:
-                simulation_state['sensor_data'] = simulated_data
-            
-            all_historical_data.extend(simulated_data)
-            
-            MAX_HISTORY = 1000
-            if len(all_historical_data) > MAX_HISTORY:
-                old_count = len(all_historical_data)
-                all_historical_data = all_historical_data[-MAX_HISTORY:]
-                write_log(f"Trimmed history from {old_count} to {len(all_historical_data)} readings", "INFO")
+            if not runtime.record_tick(simulated_data, role=runtime.SIMULATOR):
+                # Fenced off: another worker holds the lease now
+                write_log("Simulator lease taken over by another worker, stopping", "SYSTEM")
+                simulation_state['running'] = False
+                break
             
             try:
-                temp_path = DATA_PATH + ".tmp"
-                with open(temp_path, "w") as f:
-                    json.dump(all_historical_data, f, indent=2)
+                dropped = history_store.append(simulated_data)
+                bump(SIMULATION)
+                history_count = history_store.count()
+                if dropped:
+                    write_log(f"Rotated out {dropped} old readings (history now {history_count})", "INFO")
                 
-                os.replace(temp_path, DATA_PATH)
-                
-                write_log(f"Saved {len(all_historical_data)} total readings to file", "DEBUG")
+                write_log(f"Appended {len(simulated_data)} readings to history store", "DEBUG")
                 
             except Exception as e:
-                write_log(f"Error writing history file: {e}", "ERROR")
+                history_count = history_store.count()
+                write_log(f"Error writing history: {e}", "ERROR")
+            
+            event_bus.publish('readings', {
+                'data': simulated_data,
+                'running': True,
+                'history_count': history_count
+            })
             
-            write_log(f"Network scan #{iteration} complete - {active_count} sensors online (Total history: {len(all_historical_data)})", "SUCCESS")
+            write_log(f"Network scan #{iteration} complete - {active_count} sensors online (Total history: {history_count})", "SUCCESS")
+            
+            tick_time = time.perf_counter() - tick_started
+            app_metrics.simulator_ticks.inc()
+            app_metrics.simulator_readings.inc(len(simulated_data))
+            app_metrics.simulator_tick_duration.observe(tick_time)
+            app_metrics.simulator_sensors.set(active_count)
+            app_metrics.simulator_rows_per_second.set(round(len(simulated_data) / (tick_time + 3), 2))
             
             time.sleep(3)
             
@@ -509,7 +512,7 @@ def simulation_loop():
             write_log(f"Traceback: {traceback.format_exc()}", "ERROR")
             time.sleep(1)
     
-    write_log(f"Simulation stopped - Final history count: {len(all_historical_data)}", "SYSTEM")
+    write_log(f"Simulation stopped - Final history count: {history_store.count()}", "SYSTEM")
 
 
 @require_http_methods(["GET"])
@@ -517,49 +520,52 @@ def get_sensor_data_simulation(request):
     """Get current sensor data from simulation"""
     history_count = 0
     try:
-        if os.path.exists(DATA_PATH):
-            with open(DATA_PATH, "r") as f:
-                history = json.load(f)
-                history_count = len(history)
+        history_count = history_store.count()
     except:
         pass
     
+    state = shared_state()['state']
+    
     return JsonResponse({
-        'data': simulation_state['sensor_data'],
-        'running': simulation_state['running'],
+        'data': state['sensor_data'],
+        'running': state['running'],
         'history_count': history_count
     })
 
 
 @require_http_methods(["GET"])
+@cached_response(scope_simulation)
 def get_sensor_history(request):
-    """Get all historical sensor data with optional filtering"""
+    """Get historical sensor data with optional sensor, limit and since filtering"""
+    sensor_name = request.GET.get('sensor')
+    limit = request.GET.get('limit')
+    since = request.GET.get('since')
+    
     try:
-        with open(DATA_PATH, "r") as f:
-            all_data = json.load(f)
+        limit = int(limit) if limit else None
+    except ValueError:
+        limit = None
+    
+    try:
+        if since:
+            all_data = history_store.since(since)
+            if sensor_name:
+                all_data = [r for r in all_data if r.get('name') == sensor_name]
+            if limit is not None:
+                all_data = all_data[-limit:] if limit > 0 else []
+        else:
+            predicate = (lambda r: r.get('name') == sensor_name) if sensor_name else None
+            all_data = history_store.tail(limit, predicate=predicate)
     except Exception as e:
         return JsonResponse({
             'error': f'Could not read history: {str(e)}',
             'data': []
         }, status=500)
     
-    sensor_name = request.GET.get('sensor')
-    limit = request.GET.get('limit')
-    
-    if sensor_name:
-        all_data = [r for r in all_data if r.get('name') == sensor_name]
-    
-    if limit:
-        try:
-            limit = int(limit)
-            all_data = all_data[-limit:]
-        except ValueError:
-            pass
-    
-    return JsonResponse({
+    return FastJsonResponse({
         'data': all_data,
         'count': len(all_data),
-        'running': simulation_state['running']
+        'running': shared_state()['state']['running']
     })
 
 
@@ -567,9 +573,10 @@ def get_sensor_history(request):
 def debug_simulation_files(request):
     """Debug endpoint to check file status"""
     info = {
-        'data_path': DATA_PATH,
+        'data_path': HISTORY_DIR,
+        'legacy_data_path': DATA_PATH,
         'log_path': LOG_PATH,
-        'data_file_exists': os.path.exists(DATA_PATH),
+        'data_file_exists': os.path.exists(history_store.index_path),
         'log_file_exists': os.path.exists(LOG_PATH),
         'data_file_size': 0,
         'log_file_size': 0,
@@ -580,28 +587,28 @@ def debug_simulation_files(request):
         'directory_writable': False
     }
     
-    if os.path.exists(DATA_PATH):
-        info['data_file_size'] = os.path.getsize(DATA_PATH)
-        try:
-            with open(DATA_PATH, 'r') as f:
-                data = json.load(f)
-                info['data_record_count'] = len(data)
-                info['data_readable'] = True
-        except Exception as e:
-            info['data_read_error'] = str(e)
+    try:
+        store_stats = history_store.stats()
+        info['data_file_size'] = store_stats['size_bytes']
+        info['data_record_count'] = store_stats['record_count']
+        info['data_segments'] = store_stats['segments']
+        info['data_first_timestamp'] = store_stats['first_timestamp']
+        info['data_last_timestamp'] = store_stats['last_timestamp']
+        info['data_readable'] = True
+    except Exception as e:
+        info['data_read_error'] = str(e)
     
     if os.path.exists(LOG_PATH):
         info['log_file_size'] = os.path.getsize(LOG_PATH)
         try:
-            with open(LOG_PATH, 'r') as f:
-                logs = json.load(f)
-                info['log_record_count'] = len(logs)
-                info['log_readable'] = True
+            info['log_record_count'] = log_buffer.file_record_count()
+            info['log_readable'] = True
         except Exception as e:
             info['log_read_error'] = str(e)
     
     try:
-        test_file = os.path.join(os.path.dirname(DATA_PATH), '.write_test')
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        test_file = os.path.join(HISTORY_DIR, '.write_test')
         with open(test_file, 'w') as f:
             f.write('test')
         os.remove(test_file)
@@ -609,13 +616,66 @@ def debug_simulation_files(request):
     except Exception as e:
         info['directory_write_error'] = str(e)
     
-    info['memory_sensor_count'] = len(simulation_state['sensor_data'])
-    info['memory_log_count'] = len(simulation_state['logs'])
-    info['simulation_running'] = simulation_state['running']
+    snapshot = shared_state()
+    info['memory_sensor_count'] = len(snapshot['state']['sensor_data'])
+    info['memory_log_count'] = len(log_buffer)
+    info['simulation_running'] = snapshot['state']['running']
+    info['process_id'] = runtime.PROCESS_ID
+    info['leases'] = snapshot['leases']
+    info['simulator_running_here'] = simulation_state['running']
+    info['db_sync_running_here'] = db_sync_state['running']
+    
+    info['ingest_queue_enabled'] = queue_enabled()
+    if queue_enabled():
+        try:
+            info['ingest_queue'] = get_queue().stats()
+        except Exception as e:
+            info['ingest_queue_error'] = str(e)
     
     return JsonResponse(info)
 
 
+history_records_gauge = app_metrics.registry.gauge(
+    "aqi_simulator_history_records", "Readings currently kept in the simulator history store")
+simulator_role_gauge = app_metrics.registry.gauge(
+    "aqi_role_running", "1 if this process runs the role's thread", ("role",))
+queue_depth_gauge = app_metrics.registry.gauge(
+    "aqi_ingest_queue_depth", "Readings waiting in the durable ingest queue")
+queue_dead_gauge = app_metrics.registry.gauge(
+    "aqi_ingest_queue_dead_letter", "Readings moved to the ingest queue's dead-letter table")
+
+
+def collect_runtime_metrics():
+    """Gauges read at scrape time rather than updated by the threads"""
+    simulator_role_gauge.set(int(simulation_state['running']), role=runtime.SIMULATOR)
+    simulator_role_gauge.set(int(db_sync_state['running']), role=runtime.SYNCER)
+    try:
+        history_records_gauge.set(history_store.count())
+        checkpoint = shared_state()['checkpoint']
+        app_metrics.sync_lag.set(sync_lag_seconds(history_store, checkpoint['last_timestamp']))
+    except Exception as e:
+        logger.error(f"Error collecting sync metrics: {e}")
+    if queue_enabled():
+        try:
+            stats = get_queue().stats()
+            queue_depth_gauge.set(stats['depth'])
+            queue_dead_gauge.set(stats['dead_letter'])
+        except Exception as e:
+            logger.error(f"Error collecting ingest queue metrics: {e}")
+
+
+app_metrics.registry.add_collector(collect_runtime_metrics)
+
+
+@require_http_methods(["GET"])
+def metrics_endpoint(request):
+    """Request, simulator and sync metrics in the Prometheus text format"""
+    return HttpResponse(
+        app_metrics.registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
 @csrf_exempt
 @require_http_methods(["POST"]) 
 def set_sensor_count(request):
@@ -625,8 +685,9 @@ def set_sensor_count(request):
     
     count = max(1, min(10, count))
 
-    with simulation_lock:
-        simulation_state["sensor_count"] = count
+    runtime.update_state(sensor_count=count)
+
+    publish_status()
 
     return JsonResponse({
         "success": True,
@@ -634,22 +695,110 @@ def set_sensor_count(request):
     })
 
 
+def parse_log_cursor(request):
+    return log_buffer.parse_cursor(request.GET.get('since'))
+
+
 @require_http_methods(["GET"])
 def get_logs(request):
-    """Get current logs"""
+    """Get buffered logs, or only those after ?since=<cursor>"""
+    running = shared_state()['state']['running']
+    cursor = parse_log_cursor(request)
+    logs, last_id = log_buffer.since(cursor)
+    
     return JsonResponse({
-        'logs': simulation_state['logs'],
-        'running': simulation_state['running']
+        'logs': logs,
+        'cursor': log_buffer.format_cursor(last_id),
+        'reset': cursor is None or cursor > last_id,
+        'running': running
     })
 
 
+STREAM_HEARTBEAT = 15
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@require_http_methods(["GET"])
+async def event_stream(request):
+    """
+    Server-Sent Events stream of readings, log lines and status changes.
+    Resumes from the Last-Event-ID header (or ?last_event_id=) on reconnect.
+    Needs an ASGI server; under WSGI it answers 503 so clients fall back to polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'error': 'Event stream requires an ASGI server; use polling endpoints instead'
+        }, status=503)
+    
+    cursor = event_bus.parse_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    
+    async def stream():
+        nonlocal cursor
+        yield "retry: 3000\n\n"
+        
+        if cursor is None:
+            # Fresh connection: send a snapshot, then follow from "now"
+            cursor = event_bus.last_id
+            status_data = await sync_to_async(simulation_status_payload)()
+            yield format_sse('status', status_data, event_bus.format_id(cursor))
+            state = (await sync_to_async(shared_state)())['state']
+            yield format_sse('readings', {
+                'data': state['sensor_data'],
+                'running': state['running'],
+                'history_count': await sync_to_async(history_store.count)()
+            })
+        
+        while True:
+            events = await event_bus.wait(cursor, timeout=STREAM_HEARTBEAT)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, event_type, data in events:
+                cursor = seq
+                yield format_sse(event_type, data, event_bus.format_id(seq))
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ============================================================================
 # NEW ENDPOINTS FOR SENSOR-SPECIFIC DATA
 # ============================================================================
 
+# stats key -> column of the newest reading it is taken from
+CURRENT_STAT_FIELDS = {
+    'current_aqi': 'air_quality',
+    'current_temp': 'temperature',
+    'current_humidity': 'humidity',
+    'current_co': 'co_level',
+    'current_no': 'no_level',
+    'current_smoke': 'smoke',
+}
+
+
+def parse_fields_param(request, allowed):
+    """Columns selected by ?fields=a,b,c (unknown names ignored); all when absent"""
+    requested = [f.strip() for f in request.GET.get('fields', '').split(',') if f.strip()]
+    fields = [f for f in requested if f in allowed]
+    return fields or list(allowed)
+
+
 @require_http_methods(["GET"])
+@cached_response(scope_sensor, relative_time=True)
 def get_sensor_readings(request, sensor_id):
-    """Get readings for a specific sensor with optional time range"""
+    """Get readings for a specific sensor with optional time range and ?fields= selection"""
     try:
         sensor = Sensor.objects.filter(sensor_id=sensor_id).first()
         
@@ -669,56 +818,42 @@ def get_sensor_readings(request, sensor_id):
             limit = 100
             hours = 24
         
+        fields = parse_fields_param(request, SENSOR_READING_FIELDS)
+        
         end_time = timezone.now()
         start_time = end_time - timezone.timedelta(hours=hours)
         
-        readings = Reading.objects.filter(
+        window = Reading.objects.filter(
             sensor=sensor,
             timestamp__gte=start_time,
             timestamp__lte=end_time
         ).order_by('-timestamp')[:limit]
         
-        data = [{
-            'timestamp': r.timestamp.isoformat(),
-            'temperature': r.temperature,
-            'humidity': r.humidity,
-            'air_quality': r.air_quality,
-            'aqi_category': r.aqi_category,
-            'aqi_color': r.aqi_color,
-            'co_level': r.co_level,
-            'no_level': r.no_level,
-            'smoke': r.smoke,
-            'latitude': r.latitude,
-            'longitude': r.longitude
-        } for r in readings]
-        
-        if data:
-            aqi_values = [r.air_quality for r in readings if r.air_quality]
-            stats = {
-                'current_aqi': readings[0].air_quality if readings else None,
-                'avg_aqi': sum(aqi_values) / len(aqi_values) if aqi_values else None,
-                'max_aqi': max(aqi_values) if aqi_values else None,
-                'min_aqi': min(aqi_values) if aqi_values else None,
-                'current_temp': readings[0].temperature if readings else None,
-                'current_humidity': readings[0].humidity if readings else None,
-                'current_co': readings[0].co_level if readings else None,
-                'current_no': readings[0].no_level if readings else None,
-                'current_smoke': readings[0].smoke if readings else None
-            }
+        # One evaluation for the rows, one aggregate query for the stats
+        columns = list(dict.fromkeys(['id'] + reading_columns(fields) + list(CURRENT_STAT_FIELDS.values())))
+        rows = list(window.values(*columns))
+        
+        if len(rows) < limit and archive.archived_range(start_time, end_time):
+            # Part of the window has been pruned into the Parquet archive,
+            # which the database cannot aggregate over
+            rows = archive.merge_rows(rows, start_time, end_time, [sensor_id])[:limit]
+            stats = reading_stats(rows)
         else:
-            stats = {
-                'current_aqi': None,
-                'avg_aqi': None,
-                'max_aqi': None,
-                'min_aqi': None,
-                'current_temp': None,
-                'current_humidity': None,
-                'current_co': None,
-                'current_no': None,
-                'current_smoke': None
-            }
+            aggregates = window.aggregate(
+                avg_aqi=models.Avg('air_quality'),
+                max_aqi=models.Max('air_quality'),
+                min_aqi=models.Min('air_quality')
+            ) if rows else {'avg_aqi': None, 'max_aqi': None, 'min_aqi': None}
+            
+            newest = rows[0] if rows else {}
+            stats = {key: newest.get(column) for key, column in CURRENT_STAT_FIELDS.items()}
+            stats.update(aggregates)
         
-        return JsonResponse({
+        data = []
+        for row in rows:
+            data.append(reading_item(row, fields))
+        
+        return FastJsonResponse({
             'sensor_id': sensor_id,
             'sensor_name': sensor.name,
             'readings': data,
@@ -736,6 +871,7 @@ def get_sensor_readings(request, sensor_id):
 
 
 @require_http_methods(["GET"])
+@cached_response(scope_sensor, relative_time=True)
 def get_sensor_forecast(request, sensor_id):
     """Generate AQI forecast for a specific sensor based on historical data"""
     try:
@@ -747,66 +883,162 @@ def get_sensor_forecast(request, sensor_id):
                 'sensor_id': sensor_id
             }, status=404)
         
-        end_time = timezone.now()
-        start_time = end_time - timezone.timedelta(hours=48)
-        
-        readings = Reading.objects.filter(
-            sensor=sensor,
-            timestamp__gte=start_time,
-            timestamp__lte=end_time
-        ).order_by('timestamp')
-        
-        if not readings:
+        try:
+            result = forecast_sensor(sensor)
+        except ForecastError as e:
             return JsonResponse({
-                'error': 'No historical data available for forecasting',
+                'error': str(e),
                 'sensor_id': sensor_id
-            }, status=404)
+            }, status=e.status)
         
-        historical_aqi = [r.air_quality for r in readings if r.air_quality is not None]
+        return JsonResponse({
+            'sensor_id': sensor_id,
+            'sensor_name': sensor.name,
+            **result
+        })
         
-        if len(historical_aqi) < 5:
-            return JsonResponse({
-                'error': 'Insufficient historical data for forecasting',
-                'sensor_id': sensor_id
-            }, status=400)
+    except Exception as e:
+        logger.error(f"Error generating forecast: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+@cached_response(scope_sensor_ids, relative_time=True)
+def get_sensors_forecast(request):
+    """Forecast every active sensor (or ?ids=a,b,c) in one call"""
+    try:
+        sensors = Sensor.objects.filter(is_active=True)
+        ids = [i.strip() for i in request.GET.get('ids', '').split(',') if i.strip()]
+        if ids:
+            sensors = sensors.filter(sensor_id__in=ids)
+        sensors = list(sensors)
         
-        forecast_hours = 24
-        forecast = []
+        forecasts, errors = {}, {}
+        results = forecast_sensors(sensors)
+        for sensor in sensors:
+            result = results[sensor.pk]
+            if isinstance(result, ForecastError):
+                errors[sensor.sensor_id] = str(result)
+            else:
+                forecasts[sensor.sensor_id] = {'sensor_name': sensor.name, **result}
         
-        recent_avg = sum(historical_aqi[-10:]) / len(historical_aqi[-10:])
-        older_avg = sum(historical_aqi[:10]) / min(10, len(historical_aqi[:10]))
-        trend = (recent_avg - older_avg) / len(historical_aqi)
+        return JsonResponse({
+            'forecasts': forecasts,
+            'errors': errors,
+            'count': len(forecasts)
+        })
         
-        last_value = historical_aqi[-1]
+    except Exception as e:
+        logger.error(f"Error generating forecasts: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+def reading_stats(rows):
+    """Same stats block as get_sensor_readings, from rows already in memory (newest first)"""
+    newest = rows[0] if rows else {}
+    stats = {key: newest.get(column) for key, column in CURRENT_STAT_FIELDS.items()}
+    aqi = [row['air_quality'] for row in rows if row['air_quality'] is not None]
+    stats.update({
+        'avg_aqi': sum(aqi) / len(aqi) if aqi else None,
+        'max_aqi': max(aqi) if aqi else None,
+        'min_aqi': min(aqi) if aqi else None,
+    })
+    return stats
+
+
+@require_http_methods(["GET"])
+@cached_response(scope_sensor_ids, relative_time=True)
+def get_sensors_batch_readings(request):
+    """
+    Readings (and optionally forecasts) for many sensors in one call:
+    ?ids=a,b,c&hours=24&limit=100&fields=...&forecast=1. The last ``limit``
+    readings of every sensor come from a single windowed range query.
+    """
+    try:
+        limit = request.GET.get('limit', '100')
+        hours = request.GET.get('hours', '24')
         
-        for i in range(forecast_hours):
-            predicted_value = last_value + (trend * (i + 1))
-            
-            current_hour = (timezone.now().hour + i) % 24
-            if 7 <= current_hour <= 9 or 17 <= current_hour <= 19:
-                predicted_value *= 1.15
-            
-            predicted_value = max(10, min(200, predicted_value))
-            
-            forecast_time = end_time + timezone.timedelta(hours=i+1)
+        try:
+            limit = int(limit)
+            hours = int(hours)
+        except ValueError:
+            limit = 100
+            hours = 24
+        
+        fields = parse_fields_param(request, SENSOR_READING_FIELDS)
+        with_forecast = request.GET.get('forecast', '').lower() in ('1', 'true', 'yes')
+        
+        ids = [i.strip() for i in request.GET.get('ids', '').split(',') if i.strip()]
+        sensors = Sensor.objects.filter(is_active=True)
+        if ids:
+            sensors = sensors.filter(sensor_id__in=ids)
+        sensors = list(sensors)
+        by_pk = {s.pk: s for s in sensors}
+        
+        end_time = timezone.now()
+        start_time = end_time - timezone.timedelta(hours=hours)
+        
+        columns = list(dict.fromkeys(reading_columns(fields) + list(CURRENT_STAT_FIELDS.values())))
+        rows = []
+        if sensors and limit > 0:
+            # ROW_NUMBER() per sensor caps every sensor at ``limit`` rows in one query
+            rows = Reading.objects.filter(
+                sensor__in=sensors,
+                timestamp__gte=start_time,
+                timestamp__lte=end_time
+            ).annotate(
+                row_number=models.Window(
+                    expression=RowNumber(),
+                    partition_by=[models.F('sensor')],
+                    order_by=[models.F('timestamp').desc(), models.F('id').desc()]
+                )
+            ).filter(row_number__lte=limit).order_by('sensor', '-timestamp', '-id').values('sensor', *columns)
+        
+        grouped = {pk: [] for pk in by_pk}
+        for row in rows:
+            grouped[row['sensor']].append(row)
+        
+        forecasts = forecast_sensors(sensors, end_time) if with_forecast and sensors else {}
+        
+        result = {}
+        for pk, sensor_rows in grouped.items():
+            sensor = by_pk[pk]
+            data = []
+            for row in sensor_rows:
+                data.append(reading_item(row, fields))
             
-            forecast.append({
-                'timestamp': forecast_time.isoformat(),
-                'hour': forecast_time.strftime('%H:%M'),
-                'predicted_aqi': round(predicted_value, 1),
-                'confidence': max(0.5, 1.0 - (i * 0.02))
-            })
+            entry = {
+                'sensor_name': sensor.name,
+                'readings': data,
+                'stats': reading_stats(sensor_rows),
+                'count': len(data)
+            }
+            if with_forecast:
+                outcome = forecasts.get(pk)
+                if isinstance(outcome, ForecastError):
+                    entry['forecast'] = {'error': str(outcome)}
+                else:
+                    entry['forecast'] = outcome
+            result[sensor.sensor_id] = entry
         
-        return JsonResponse({
-            'sensor_id': sensor_id,
-            'sensor_name': sensor.name,
-            'current_aqi': historical_aqi[-1],
-            'forecast': forecast,
-            'trend': 'increasing' if trend > 0 else 'decreasing' if trend < 0 else 'stable'
+        found = {s.sensor_id for s in sensors}
+        return FastJsonResponse({
+            'sensors': result,
+            'missing': [i for i in ids if i not in found],
+            'hours': hours,
+            'limit': limit
         })
         
     except Exception as e:
-        logger.error(f"Error generating forecast: {e}")
+        logger.error(f"Error fetching batch sensor readings: {e}")
         import traceback
         logger.error(traceback.format_exc())
         return JsonResponse({
@@ -814,44 +1046,371 @@ def get_sensor_forecast(request, sensor_id):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+@cached_response(scope_sensor, relative_time=True)
+def get_sensor_rollups(request, sensor_id):
+    """Bucketed history for a sensor served from the rollup tables"""
+    sensor = Sensor.objects.filter(sensor_id=sensor_id).first()
+    
+    if not sensor:
+        return JsonResponse({
+            'error': 'Sensor not found',
+            'sensor_id': sensor_id
+        }, status=404)
+    
+    try:
+        hours = int(request.GET.get('hours', '24'))
+    except ValueError:
+        hours = 24
+    
+    metrics = [m for m in request.GET.get('metrics', '').split(',') if m in METRICS] or list(METRICS)
+    
+    end_time = timezone.now()
+    start_time = end_time - timezone.timedelta(hours=hours)
+    
+    resolution, series = window_series(sensor, start_time, end_time, metrics=metrics)
+    
+    return FastJsonResponse({
+        'sensor_id': sensor_id,
+        'sensor_name': sensor.name,
+        'hours': hours,
+        'resolution_seconds': resolution,
+        'series': series,
+        'summary': window_summary(sensor, start_time, end_time, resolution=resolution),
+        'count': len(series)
+    })
+
+
+@require_http_methods(["GET"])
+def export_readings(request):
+    """Readings as a Parquet or Arrow file, from the database and the archive"""
+    fmt = request.GET.get('format', 'parquet')
+    if fmt not in archive.CONTENT_TYPES:
+        return JsonResponse({
+            'error': f"format must be one of {sorted(archive.CONTENT_TYPES)}"
+        }, status=400)
+    
+    end_time = parse_datetime(request.GET['to']) if request.GET.get('to') else timezone.now()
+    start_time = (
+        parse_datetime(request.GET['from']) if request.GET.get('from')
+        else end_time - timezone.timedelta(hours=24)
+    )
+    if start_time is None or end_time is None:
+        return JsonResponse({'error': 'from/to must be ISO 8601 datetimes'}, status=400)
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    if timezone.is_naive(end_time):
+        end_time = timezone.make_aware(end_time)
+    
+    sensor_ids = [i.strip() for i in request.GET.get('sensor', '').split(',') if i.strip()] or None
+    
+    try:
+        archive.require_pyarrow()
+    except archive.ArchiveError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    
+    def content():
+        # Streamed: rows are read, encoded and sent in batches, so a long
+        # range never sits in memory as a whole
+        try:
+            yield from archive.encode_stream(archive.export_tables(start_time, end_time, sensor_ids), fmt)
+        except Exception as e:
+            logger.error(f"Error exporting readings: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise
+    
+    response = StreamingHttpResponse(content(), content_type=archive.CONTENT_TYPES[fmt])
+    filename = f"readings_{start_time:%Y%m%dT%H%M}_{end_time:%Y%m%dT%H%M}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # ============================================================================
-# EXISTING CODE (PRESERVED)
+# MAP: SPATIAL QUERIES
 # ============================================================================
 
-def sensor_logs(request):
-    """Legacy endpoint - now reads from simulation state"""
+MAX_NEAREST = 100
+MAX_VIEWPORT_SENSORS = 500
+
+
+def sensor_location(row):
+    return {
+        'sensor_id': row['sensor_id'],
+        'name': row['name'],
+        'area': row['area'],
+        'latitude': row['latitude'],
+        'longitude': row['longitude'],
+    }
+
+
+def latest_summary(row):
+    if row is None:
+        return None
+    name, color = describe(row['category_id'])
+    return {
+        'timestamp': row['timestamp'],
+        'air_quality': row['air_quality'],
+        'aqi_category': name,
+        'aqi_color': color,
+        'temperature': row['temperature'],
+        'humidity': row['humidity'],
+    }
+
+
+def bbox_param(request):
+    """``(bbox, error_response)`` from ?bbox=south,west,north,east"""
     try:
-        with open(LOG_PATH) as f:
-            logs = json.load(f)
-    except:
-        logs = simulation_state['logs']
+        return spatial.parse_bbox(request.GET.get('bbox', '')), None
+    except ValueError as e:
+        return None, JsonResponse({'error': str(e)}, status=400)
+
+
+@require_http_methods(["GET"])
+@cached_response(scope_all_sensors)
+def get_sensors_within(request):
+    """Active sensors inside ?bbox=south,west,north,east"""
+    bbox, error = bbox_param(request)
+    if error:
+        return error
+    
+    index = spatial.get_index()
+    positions = index.within(*bbox)
+    return FastJsonResponse({
+        'bbox': bbox,
+        'sensors': [sensor_location(row) for row in index.sensors(positions)],
+        'count': len(positions)
+    })
+
+
+@require_http_methods(["GET"])
+@cached_response(scope_all_sensors)
+def get_nearest_sensors(request):
+    """The ?k= (default 5) active sensors nearest to ?lat=&lng=, optionally within ?max_km="""
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET.get('lng', request.GET.get('lon')))
+        k = min(int(request.GET.get('k', 5)), MAX_NEAREST)
+        max_km = float(request.GET['max_km']) if request.GET.get('max_km') else None
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({
+            'error': 'lat and lng are required numbers; k must be an integer and max_km a number'
+        }, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({'error': 'lat/lng out of range'}, status=400)
+    
+    index = spatial.get_index()
+    positions, distances = index.nearest(lat, lng, k, max_km)
+    sensors = []
+    for row, distance in zip(index.sensors(positions), distances.tolist()):
+        item = sensor_location(row)
+        item['distance_km'] = round(distance, 3)
+        sensors.append(item)
+    
+    return FastJsonResponse({
+        'point': [lat, lng],
+        'sensors': sensors,
+        'count': len(sensors)
+    })
+
+
+@require_http_methods(["GET"])
+@cached_response(scope_all_sensors)
+def get_viewport_readings(request):
+    """
+    Latest reading of every active sensor inside ?bbox= for the map. Above
+    ?limit= sensors (default 500) they are grouped into grid clusters sized
+    for ?zoom= instead, with the count and mean/max AQI of each cluster.
+    """
+    bbox, error = bbox_param(request)
+    if error:
+        return error
+    try:
+        zoom = max(0, min(int(request.GET.get('zoom', 14)), 22))
+        limit = min(int(request.GET.get('limit', MAX_VIEWPORT_SENSORS)), MAX_VIEWPORT_SENSORS)
+    except ValueError:
+        return JsonResponse({'error': 'zoom and limit must be integers'}, status=400)
+    
+    try:
+        index = spatial.get_index()
+        positions = index.within(*bbox)
+        latest = spatial.latest_readings(index.pk[positions])
+        
+        result = {
+            'bbox': bbox,
+            'zoom': zoom,
+            'count': len(positions),
+            'clustered': len(positions) > limit,
+        }
+        if result['clustered']:
+            aqi = [latest.get(pk, {}).get('air_quality') for pk in index.pk[positions].tolist()]
+            result['clusters'] = spatial.cluster(
+                index.lat[positions], index.lon[positions], zoom, values=aqi
+            )
+        else:
+            sensors = []
+            for row in index.sensors(positions):
+                item = sensor_location(row)
+                item['latest'] = latest_summary(latest.get(row['pk']))
+                sensors.append(item)
+            result['sensors'] = sensors
+        return FastJsonResponse(result)
+    
+    except Exception as e:
+        logger.error(f"Error fetching viewport readings: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def heatmap_tile(request, z, x, y):
+    """IDW-interpolated AQI overlay tile (256 px PNG), cached per contributing sensor data"""
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return JsonResponse({'error': 'Tile coordinates out of range'}, status=400)
+    
+    started = time.perf_counter()
+    try:
+        content, version, result = heatmap.get_tile(z, x, y)
+    except Exception as e:
+        logger.error(f"Error rendering heatmap tile {z}/{x}/{y}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return JsonResponse({
+            'error': str(e)
+        }, status=500)
+    app_metrics.heatmap_tiles.inc(result=result)
+    if result == 'render':
+        app_metrics.heatmap_render_duration.observe(time.perf_counter() - started)
+    
+    etag = quote_etag(version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    
+    response = HttpResponse(content, content_type='image/png')
+    response['ETag'] = etag
+    # Revalidate every time: unchanged tiles cost a 304
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 
+# ============================================================================
+# EXISTING CODE (PRESERVED)
+# ============================================================================
+
+def sensor_logs(request):
+    """Legacy endpoint - serves the log buffer, optionally after ?since=<cursor>"""
+    logs, _ = log_buffer.since(parse_log_cursor(request))
     return JsonResponse(logs, safe=False)
 
 
+def attach_latest_readings(sensors):
+    """
+    Load the latest reading of every sensor in one query. Sensors must carry
+    the ``latest_reading_id`` annotation from ``SensorViewSet.get_queryset``.
+
+    Readings are attached already rendered (``ReadingRows``): building a
+    ``ReadingSerializer`` per sensor cost ~1.5 ms each, most of the response.
+    """
+    ids = [s.latest_reading_id for s in sensors if s.latest_reading_id]
+    items = {}
+    if ids:
+        plan = reading_rows()
+        for item in plan.rows(Reading.objects.filter(pk__in=ids).values(*plan.columns)):
+            items[item['id']] = item
+    for sensor in sensors:
+        sensor.latest_reading = items.get(sensor.latest_reading_id)
+    return sensors
+
+
+@method_decorator(cached_response(scope_all_sensors), name='dispatch')
 class SensorViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Sensor.objects.filter(is_active=True)
     serializer_class = SensorSerializer
 
+    def get_queryset(self):
+        latest = Reading.objects.filter(
+            sensor=models.OuterRef('pk')
+        ).order_by('-timestamp', '-id').values('pk')[:1]
+        return super().get_queryset().annotate(latest_reading_id=models.Subquery(latest))
+
+    def list(self, request, *args, **kwargs):
+        sensors = attach_latest_readings(list(self.filter_queryset(self.get_queryset())))
+        serializer = self.get_serializer(sensors, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        sensor = attach_latest_readings([self.get_object()])[0]
+        serializer = self.get_serializer(sensor)
+        return Response(serializer.data)
+
+
+NDJSON_FIELDS = (
+    'id', 'sensor', 'sensor__sensor_id', 'slave_id', 'timestamp',
+    'temperature', 'humidity', 'air_quality', 'pm25', 'category_id',
+    'co_level', 'no_level', 'smoke', 'latitude', 'longitude',
+)
+NDJSON_CHUNK_SIZE = 2000
+
 
 class ReadingViewSet(viewsets.ModelViewSet):
-    queryset = Reading.objects.all().order_by('-timestamp')
+    queryset = Reading.objects.select_related('sensor').order_by('-timestamp')
     serializer_class = ReadingSerializer
-    pagination_class = None
+    pagination_class = ReadingCursorPagination
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+
+    def paginate_queryset(self, queryset):
+        # ?limit= keeps returning a plain (already sliced) list
+        if 'limit' in self.request.query_params:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.accepted_renderer.format == 'ndjson':
+            return self.stream_ndjson(queryset)
+        
+        # Read-only: same output as ReadingSerializer, built from .values() rows
+        plan = reading_rows()
+        queryset = queryset.values(*plan.columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(queryset))
+
+    def stream_ndjson(self, queryset):
+        """Stream rows as NDJSON straight from the cursor in constant memory"""
+        if not queryset.query.is_sliced:
+            queryset = queryset.order_by('-timestamp', '-id')
+        rows = queryset.values(*NDJSON_FIELDS).iterator(chunk_size=NDJSON_CHUNK_SIZE)
+        
+        def lines():
+            for row in rows:
+                row['sensor_id'] = row.pop('sensor__sensor_id')
+                row['category'] = row.pop('category_id')
+                row['aqi_category'], row['aqi_color'] = describe(row['category'])
+                yield dumps(row) + b'\n'
+        
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="readings.ndjson"'
+        return response
 
     def get_queryset(self):
         qs = super().get_queryset()
         sensor_q = self.request.query_params.get('sensor')
         from_q = self.request.query_params.get('from')
         to_q = self.request.query_params.get('to')
+        category_q = self.request.query_params.get('category')
         limit_q = self.request.query_params.get('limit')
 
         if sensor_q:
-            qs = qs.filter(
-                models.Q(sensor__sensor_id=sensor_q) | 
-                models.Q(sensor__id=sensor_q) | 
-                models.Q(slave_id=sensor_q)
-            )
+            sensor_filter = models.Q(sensor__sensor_id=sensor_q)
+            if sensor_q.isdigit():
+                sensor_filter |= models.Q(sensor__id=sensor_q) | models.Q(slave_id=sensor_q)
+            qs = qs.filter(sensor_filter)
 
         if from_q:
             dt = parse_datetime(from_q)
@@ -862,6 +1421,11 @@ class ReadingViewSet(viewsets.ModelViewSet):
             if dt:
                 qs = qs.filter(timestamp__lte=dt)
 
+        if category_q:
+            # ?category=4 or ?category=poor, an integer comparison either way
+            code = category_for(category_q)
+            qs = qs.filter(category_id=code) if code else qs.none()
+
         if limit_q:
             try:
                 n = int(limit_q)
@@ -892,95 +1456,113 @@ class BlogPostViewSet(viewsets.ModelViewSet):
             serializer.save(author=author)
 
 
-@api_view(['POST'])
-def ingest_reading(request):
-    payload = request.data.copy()
+# Ingest runs as async views: under ASGI each request's readings join the
+# event loop's micro-batch (api/batcher.py) and the response goes out once
+# that batch has committed; under WSGI the request is its own batch.
+
+def parse_ingest_body(request):
+    """JSON (or form-encoded) request body, or None if it cannot be parsed"""
+    if request.content_type == 'application/json' or not request.content_type:
+        try:
+            return json.loads(request.body or b'null')
+        except ValueError:
+            return None
+    return request.POST.dict()
+
+
+async def write_readings(request, readings_data, queued):
+    """``(results, errors)`` of inserting (or with ``queued`` enqueueing) the readings"""
+    if isinstance(request, ASGIRequest):
+        return await get_batcher(queued).submit(readings_data)
+    write = enqueue_readings if queued else insert_readings
+    return await sync_to_async(write)(readings_data)
+
+
+async def enqueue_response(request, readings_data):
+    """Validate and enqueue for the ingest worker; 202 once the readings are durable"""
+    try:
+        queue_ids, errors = await write_readings(request, readings_data, queued=True)
+    except Exception as e:
+        logger.error(f"Enqueue failed: {e}")
+        return FastJsonResponse({
+            'queued_count': 0,
+            'error_count': len(readings_data),
+            'error': str(e)
+        }, status=503)
     
-    sensor_id = payload.pop('sensor_id', None) or payload.get('sensor')
+    return FastJsonResponse({
+        'queued_count': len(queue_ids),
+        'error_count': len(errors),
+        'queue_ids': queue_ids,
+        'errors': errors
+    }, status=202 if queue_ids else 400)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def ingest_reading(request):
+    payload = parse_ingest_body(request)
+    if not isinstance(payload, dict):
+        return FastJsonResponse({'non_field_errors': ['Expected a JSON object.']}, status=400)
     
-    if sensor_id:
-        sensor = Sensor.objects.filter(sensor_id=str(sensor_id)).first()
-        
-        if not sensor:
-            sensor_name = payload.pop('sensor_name', str(sensor_id))
-            sensor = Sensor.objects.create(
-                sensor_id=str(sensor_id),
-                name=sensor_name,
-                is_active=True
-            )
-            logger.info(f"Created new sensor: {sensor_id}")
-        
-        payload['sensor'] = sensor.id
+    if queue_enabled():
+        return await enqueue_response(request, [payload])
     
-    serializer = ReadingSerializer(data=payload)
+    try:
+        try:
+            readings, errors = await write_readings(request, [payload], queued=False)
+        except IntegrityError:
+            readings, errors = await sync_to_async(insert_readings_each)([payload])
+    except Exception as e:
+        logger.error(f"Ingest failed: {e}")
+        return FastJsonResponse({
+            'error': str(e)
+        }, status=500)
     
-    if serializer.is_valid():
-        reading = serializer.save()
-        logger.info(f"Ingested reading for slave_id={reading.slave_id} at {reading.timestamp}")
-        return Response(
-            ReadingSerializer(reading).data,
-            status=status.HTTP_201_CREATED
-        )
-    else:
-        logger.error(f"Reading validation failed: {serializer.errors}")
-        return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
-        )
+    if errors:
+        logger.error(f"Reading validation failed: {errors[0]['errors']}")
+        return FastJsonResponse(errors[0]['errors'], status=400)
+    
+    reading = readings[0]
+    logger.info(f"Ingested reading for slave_id={reading.slave_id} at {reading.timestamp}")
+    return FastJsonResponse(ReadingSerializer(reading).data, status=201)
 
 
-@api_view(['POST'])
-def bulk_ingest_readings(request):
-    readings_data = request.data if isinstance(request.data, list) else [request.data]
+@csrf_exempt
+@require_http_methods(["POST"])
+async def bulk_ingest_readings(request):
+    payload = parse_ingest_body(request)
+    if payload is None:
+        return FastJsonResponse({'error': 'Request body must be JSON'}, status=400)
+    readings_data = payload if isinstance(payload, list) else [payload]
     
-    created_readings = []
-    errors = []
+    if queue_enabled():
+        return await enqueue_response(request, readings_data)
     
-    for idx, reading_data in enumerate(readings_data):
+    try:
         try:
-            payload = reading_data.copy()
-            
-            sensor_id = payload.pop('sensor_id', None) or payload.get('sensor')
-            
-            if sensor_id:
-                sensor = Sensor.objects.filter(sensor_id=str(sensor_id)).first()
-                if not sensor:
-                    sensor_name = payload.pop('sensor_name', str(sensor_id))
-                    sensor = Sensor.objects.create(
-                        sensor_id=str(sensor_id),
-                        name=sensor_name,
-                        is_active=True
-                    )
-                payload['sensor'] = sensor.id
-            
-            serializer = ReadingSerializer(data=payload)
-            if serializer.is_valid():
-                reading = serializer.save()
-                created_readings.append(reading.id)
-            else:
-                errors.append({
-                    'index': idx,
-                    'data': reading_data,
-                    'errors': serializer.errors
-                })
-        
-        except Exception as e:
-            errors.append({
-                'index': idx,
-                'data': reading_data,
-                'error': str(e)
-            })
+            created_readings, errors = await write_readings(request, readings_data, queued=False)
+        except IntegrityError:
+            # Duplicates are normally per-row errors already; this is a
+            # concurrent writer winning the race twice, so go row by row
+            created_readings, errors = await sync_to_async(insert_readings_each)(readings_data)
+    except Exception as e:
+        logger.error(f"Bulk ingest failed: {e}")
+        return FastJsonResponse({
+            'created_count': 0,
+            'error_count': len(readings_data),
+            'created_ids': [],
+            'error': str(e)
+        }, status=500)
     
     response_data = {
         'created_count': len(created_readings),
         'error_count': len(errors),
-        'created_ids': created_readings,
+        'created_ids': [r.pk for r in created_readings],
         'errors': errors
     }
     
-    status_code = status.HTTP_201_CREATED if created_readings else status.HTTP_400_BAD_REQUEST
-    
-    return Response(response_data, status=status_code)
+    return FastJsonResponse(response_data, status=201 if created_readings else 400)
 
 
 print('running')
\ No newline at end of file
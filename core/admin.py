@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from django.contrib import admin
-from .models import Sensor, Reading
+from .models import Sensor, Reading, AqiCategory, CompactionRun
 
 
 @admin.register(Sensor)
@@ -15,10 +15,22 @@ class SensorAdmin(admin.ModelAdmin):
 @admin.register(Reading)
 class ReadingAdmin(admin.ModelAdmin):
     list_display = ('slave_id', 'sensor', 'timestamp', 'temperature', 'humidity', 'air_quality', 'aqi_category', 'co_level', 'no_level', 'smoke')
-    list_filter = ('timestamp', 'sensor')
+    list_filter = ('timestamp', 'category', 'sensor')
     search_fields = ('slave_id', 'sensor__sensor_id', 'sensor__name')
 
 
+@admin.register(AqiCategory)
+class AqiCategoryAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'color', 'min_aqi', 'max_aqi')
+
+
+@admin.register(CompactionRun)
+class CompactionRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'dry_run', 'status', 'rows_deleted', 'bytes_reclaimed', 'finished_at')
+    list_filter = ('status', 'dry_run')
+    readonly_fields = [f.name for f in CompactionRun._meta.fields]
+
+
 from .models import BlogPost
 
 @admin.register(BlogPost)
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import (
+    ArchiveError, archive_root, day_floor, export_partitions, prune_archived, PRUNE_BATCH_SIZE,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export readings older than the retention window to Parquet files "
+        "(one per sensor and day) and optionally prune them from the Reading table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=getattr(settings, 'READING_ARCHIVE_AFTER_DAYS', 30),
+                            help="Archive whole UTC days older than this many days")
+        parser.add_argument('--before', help="Archive days before this date (YYYY-MM-DD, UTC) instead")
+        parser.add_argument('--sensor', action='append', dest='sensors',
+                            help="Only this sensor_id (repeatable)")
+        parser.add_argument('--prune', action='store_true',
+                            help="Delete archived rows from the Reading table afterwards")
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be pruned without exporting or deleting")
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError("--before must be a date like 2026-01-31")
+        else:
+            before = day_floor(timezone.now() - timedelta(days=options['older_than_days']))
+
+        sensors = options['sensors']
+        try:
+            if options['dry_run']:
+                result = prune_archived(before, sensors, options['batch_size'], dry_run=True)
+                self.stdout.write(
+                    f"Before {before:%Y-%m-%d}: {result['deleted']:,} readings already archived "
+                    f"and prunable, {result['kept']:,} not archived yet"
+                )
+                return
+
+            self.stdout.write(f"📦 Archiving readings before {before:%Y-%m-%d} into {archive_root()}")
+            result = export_partitions(before, sensors)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Archived {result['rows']:,} readings into {result['partitions']} partitions"
+            ))
+
+            if options['prune']:
+                result = prune_archived(before, sensors, options['batch_size'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ Pruned {result['deleted']:,} archived readings from the database"
+                ))
+                if result['kept']:
+                    self.stdout.write(f"ℹ️  Kept {result['kept']:,} readings that are not archived yet")
+        except ArchiveError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.rollups import apply_readings, bucket_floor, METRICS, RESOLUTIONS
+from core.models import Reading, ReadingRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild reading rollups (1 min / 1 h / 1 day) from the Reading table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Only rebuild the last N days (default: everything)")
+        parser.add_argument('--sensor', help="Only rebuild this sensor_id")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        readings = Reading.objects.filter(sensor__isnull=False)
+        rollups = ReadingRollup.objects.all()
+
+        if options['sensor']:
+            readings = readings.filter(sensor__sensor_id=options['sensor'])
+            rollups = rollups.filter(sensor__sensor_id=options['sensor'])
+            if not readings.exists():
+                raise CommandError(f"No readings for sensor {options['sensor']}")
+
+        if options['days']:
+            # Start on a day boundary so no bucket is rebuilt from partial data
+            since = bucket_floor(timezone.now() - timedelta(days=options['days']), max(RESOLUTIONS))
+            readings = readings.filter(timestamp__gte=since)
+            rollups = rollups.filter(bucket_start__gte=since)
+
+        deleted, _ = rollups.delete()
+        self.stdout.write(f"Removed {deleted} existing rollup rows")
+
+        rows = readings.order_by('sensor', 'timestamp').values(
+            'sensor_id', 'timestamp', *METRICS
+        ).iterator(chunk_size=options['batch_size'])
+
+        batch = []
+        processed = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= options['batch_size']:
+                apply_readings(batch)
+                processed += len(batch)
+                batch = []
+                self.stdout.write(f"  {processed} readings rolled up")
+        if batch:
+            apply_readings(batch)
+            processed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {ReadingRollup.objects.count()} rollup rows from {processed} readings"
+        ))
@@ -0,0 +1,132 @@
+import math
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.forecasting import HISTORY_HOURS, clear_cache, forecast_sensor, forecast_sensors
+from core.models import Sensor, Reading
+from ._bench import scratch_database, timed
+
+
+def legacy_forecast(sensor):
+    """The trend-plus-rush-hour loop get_sensor_forecast used before the NumPy model."""
+    end_time = timezone.now()
+    start_time = end_time - timedelta(hours=48)
+    readings = Reading.objects.filter(
+        sensor=sensor,
+        timestamp__gte=start_time,
+        timestamp__lte=end_time
+    ).order_by('timestamp')
+    if not readings:
+        return None
+
+    historical_aqi = [r.air_quality for r in readings if r.air_quality is not None]
+    if len(historical_aqi) < 5:
+        return None
+
+    recent_avg = sum(historical_aqi[-10:]) / len(historical_aqi[-10:])
+    older_avg = sum(historical_aqi[:10]) / min(10, len(historical_aqi[:10]))
+    trend = (recent_avg - older_avg) / len(historical_aqi)
+    last_value = historical_aqi[-1]
+
+    forecast = []
+    for i in range(24):
+        predicted_value = last_value + (trend * (i + 1))
+        current_hour = (timezone.now().hour + i) % 24
+        if 7 <= current_hour <= 9 or 17 <= current_hour <= 19:
+            predicted_value *= 1.15
+        predicted_value = max(10, min(200, predicted_value))
+        forecast_time = end_time + timedelta(hours=i + 1)
+        forecast.append({
+            'timestamp': forecast_time.isoformat(),
+            'hour': forecast_time.strftime('%H:%M'),
+            'predicted_aqi': round(predicted_value, 1),
+            'confidence': max(0.5, 1.0 - (i * 0.02))
+        })
+    return forecast
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark get_sensor_forecast: the legacy Python loop against the NumPy "
+        "model (cold fit, cached, and batch over all sensors)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensors', type=int, default=10)
+        parser.add_argument('--interval', type=int, default=60,
+                            help="Seconds between seeded readings")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            sensors = self.seed(options['sensors'], options['interval'], options['seed'])
+            repeat = options['repeat']
+
+            legacy = self.run(lambda: [legacy_forecast(s) for s in sensors], repeat)
+
+            def cold():
+                clear_cache()
+                return [forecast_sensor(s) for s in sensors]
+            numpy_cold = self.run(cold, repeat)
+
+            forecast_sensors(sensors)
+            numpy_cached = self.run(lambda: [forecast_sensor(s) for s in sensors], repeat)
+
+            def batch_cold():
+                clear_cache()
+                return forecast_sensors(sensors)
+            batch = self.run(batch_cold, repeat)
+
+        count = len(sensors)
+        self.report('legacy loop', legacy, count)
+        self.report('numpy (cold)', numpy_cold, count)
+        self.report('numpy (cached)', numpy_cached, count)
+        self.report('numpy batch', batch, count)
+        if numpy_cached:
+            self.stdout.write(self.style.SUCCESS(
+                f"Per-sensor speedup: {legacy / numpy_cold:.1f}x cold, "
+                f"{legacy / numpy_cached:.1f}x cached, {legacy / batch:.1f}x batch"
+            ))
+
+    def run(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            _, elapsed = timed(func)
+            best = min(best, elapsed)
+        return best
+
+    def report(self, label, elapsed, count):
+        self.stdout.write(
+            f"{label:<15} {elapsed * 1000:9.1f} ms for {count} sensors "
+            f"({elapsed * 1000 / count:7.2f} ms/sensor)"
+        )
+
+    def seed(self, sensor_count, interval, seed):
+        rng = random.Random(seed)
+        Sensor.objects.bulk_create([
+            Sensor(sensor_id=f"BENCH-{i:03d}", name=f"BENCH-{i:03d}")
+            for i in range(sensor_count)
+        ])
+        sensors = list(Sensor.objects.order_by('id'))
+
+        now = timezone.now()
+        steps = HISTORY_HOURS * 3600 // interval
+        batch = []
+        for step in range(steps):
+            timestamp = now - timedelta(seconds=step * interval)
+            hour = timestamp.hour + timestamp.minute / 60
+            daily = 30 * math.sin(2 * math.pi * (hour - 8) / 24)
+            for idx, sensor in enumerate(sensors):
+                batch.append(Reading(
+                    sensor=sensor,
+                    slave_id=idx + 1,
+                    timestamp=timestamp,
+                    air_quality=round(80 + daily + rng.gauss(0, 8), 1),
+                ))
+        Reading.objects.bulk_create(batch, batch_size=5000)
+        self.stdout.write(f"Seeded {len(batch):,} readings for {len(sensors)} sensors")
+        return sensors
@@ -0,0 +1,80 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from api.ingest import ingest_readings, INGEST_BATCH_SIZE
+from api.serializers import ReadingSerializer
+from core.models import Sensor, Reading
+from ._bench import scratch_database, timed
+
+
+def make_payload(count, sensors, seed):
+    rng = random.Random(seed)
+    return [{
+        'sensor_id': f"BENCH-{rng.randrange(sensors):03d}",
+        'slave_id': rng.randrange(1, 256),
+        'temperature': round(rng.uniform(20, 35), 1),
+        'humidity': round(rng.uniform(40, 80), 1),
+        'air_quality': round(rng.uniform(10, 300), 1),
+        'co_level': round(rng.uniform(0.1, 2.0), 2),
+        'no_level': round(rng.uniform(5, 50), 1),
+        'smoke': 0.0,
+        'latitude': 13.08,
+        'longitude': 80.25,
+    } for _ in range(count)]
+
+
+def legacy_loop(readings_data):
+    """The per-row loop bulk_ingest_readings used before the set-based path."""
+    created = []
+    for reading_data in readings_data:
+        payload = reading_data.copy()
+        sensor_id = payload.pop('sensor_id', None) or payload.get('sensor')
+        if sensor_id:
+            sensor = Sensor.objects.filter(sensor_id=str(sensor_id)).first()
+            if not sensor:
+                sensor = Sensor.objects.create(
+                    sensor_id=str(sensor_id),
+                    name=payload.pop('sensor_name', str(sensor_id)),
+                    is_active=True
+                )
+            payload['sensor'] = sensor.id
+        serializer = ReadingSerializer(data=payload)
+        if serializer.is_valid():
+            created.append(serializer.save().id)
+    return created
+
+
+class Command(BaseCommand):
+    help = "Benchmark bulk reading ingest (rows/sec) against the legacy per-row loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--sensors', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        payload = make_payload(rows, options['sensors'], options['seed'])
+
+        with scratch_database():
+            created, legacy_time = timed(legacy_loop, payload)
+            self.report('legacy loop', len(created), legacy_time)
+
+            Reading.objects.all().delete()
+            Sensor.objects.all().delete()
+
+            (created, errors), bulk_time = timed(
+                ingest_readings, payload, batch_size=options['batch_size']
+            )
+            self.report('bulk pipeline', len(created), bulk_time)
+
+        if bulk_time:
+            self.stdout.write(self.style.SUCCESS(
+                f"Speedup: {legacy_time / bulk_time:.1f}x"
+            ))
+
+    def report(self, label, count, elapsed):
+        rate = count / elapsed if elapsed else float('inf')
+        self.stdout.write(f"{label:<14} {count:>7} rows in {elapsed:7.3f}s  ({rate:,.0f} rows/sec)")
@@ -0,0 +1,115 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.aqi import classify
+from api.serializers import (
+    SENSOR_READING_FIELDS, ReadingSerializer, reading_columns, reading_item, reading_rows,
+)
+from core.models import Sensor, Reading
+from ._bench import scratch_database, timed
+
+
+def legacy_sensor_readings(rows, fields):
+    """get_sensor_readings' body before the fast path: isoformat() per row, stdlib JsonResponse."""
+    data = []
+    for row in rows:
+        item = reading_item(row, fields)
+        item['timestamp'] = item['timestamp'].isoformat()
+        data.append(item)
+    return JsonResponse({'readings': data, 'count': len(data)}).content
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark JSON rendering of readings: the ReadingViewSet list path (DRF "
+        "ModelSerializer + stdlib JSONRenderer against .values() rows + orjson) and "
+        "the hand-built sensor readings response"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=10000)
+        parser.add_argument('--sensors', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; timing the stdlib fallback"))
+
+        with scratch_database():
+            self.seed(options['readings'], options['sensors'], options['seed'])
+            repeat = options['repeat']
+            queryset = Reading.objects.select_related('sensor').order_by('-timestamp', '-id')
+
+            def drf():
+                data = ReadingSerializer(queryset, many=True).data
+                return JSONRenderer().render(data)
+
+            def fast():
+                plan = reading_rows()
+                return renderers.ORJSONRenderer().render(plan.rows(queryset.values(*plan.columns)))
+
+            fields = list(SENSOR_READING_FIELDS)
+            rows = list(Reading.objects.order_by('-timestamp').values(*reading_columns(fields)))
+
+            def hand_built():
+                data = [reading_item(row, fields) for row in rows]
+                return renderers.FastJsonResponse({'readings': data, 'count': len(data)}).content
+
+            results = [
+                ('viewset list, DRF serializer', self.run(drf, repeat)),
+                ('viewset list, fast path', self.run(fast, repeat)),
+                ('readings JSON, legacy', self.run(lambda: legacy_sensor_readings(rows, fields), repeat)),
+                ('readings JSON, fast path', self.run(hand_built, repeat)),
+            ]
+
+        count = options['readings']
+        for label, elapsed in results:
+            self.stdout.write(
+                f"{label:<30} {elapsed * 1000:9.1f} ms for {count:,} readings "
+                f"({elapsed * 1e6 / count:6.2f} µs/reading)"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Speedup: {results[0][1] / results[1][1]:.1f}x viewset list, "
+            f"{results[2][1] / results[3][1]:.1f}x sensor readings"
+        ))
+
+    def run(self, func, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            _, elapsed = timed(func)
+            best = min(best, elapsed)
+        return best
+
+    def seed(self, count, sensor_count, seed):
+        rng = random.Random(seed)
+        Sensor.objects.bulk_create([
+            Sensor(sensor_id=f"BENCH-{i:03d}", name=f"BENCH-{i:03d}",
+                   latitude=13.07 + rng.random() * 0.025, longitude=80.235 + rng.random() * 0.03)
+            for i in range(sensor_count)
+        ])
+        sensors = list(Sensor.objects.order_by('id'))
+
+        now = timezone.now()
+        fields = []
+        for i in range(count):
+            fields.append({
+                'sensor': sensors[i % len(sensors)],
+                'slave_id': i % len(sensors) + 1,
+                'timestamp': now - timedelta(seconds=i * 5),
+                'temperature': round(rng.uniform(24, 36), 1),
+                'humidity': round(rng.uniform(40, 90), 1),
+                'pm25': round(rng.uniform(10, 150), 1),
+                'co_level': round(rng.uniform(0.2, 3), 2),
+                'no_level': round(rng.uniform(10, 90), 1),
+                'smoke': round(rng.uniform(0, 50), 1),
+            })
+        classify(fields)
+        Reading.objects.bulk_create([Reading(**f) for f in fields], batch_size=5000)
+        self.stdout.write(f"Seeded {count:,} readings for {len(sensors)} sensors")
@@ -0,0 +1,321 @@
+import json
+import platform
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from api.aqi import category_code
+from api.forecasting import clear_cache
+from core.models import Sensor, Reading
+from ._bench import scratch_database
+
+# Percentiles / throughput compared against the baseline
+COMPARED = ('p50_ms', 'p95_ms', 'throughput')
+
+SCENARIOS = (
+    'ingest_reading',
+    'bulk_ingest_readings',
+    'readings_list',
+    'sensor_readings',
+    'sensor_forecast',
+    'sensors_list',
+)
+
+
+def summarize(latencies, elapsed, rows_per_request=1):
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'throughput': round(len(latencies) * rows_per_request / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every metric that regressed by more than ``tolerance``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in COMPARED:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            if metric == 'throughput':
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({(new - old) / old:+.0%})")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with 1M+ readings and measure throughput and "
+        "p50/p95/p99 latency of the ingest and read endpoints, optionally "
+        "failing on regression against a stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=1_000_000,
+                            help="Readings to seed before measuring")
+        parser.add_argument('--sensors', type=int, default=100)
+        parser.add_argument('--interval', type=int, default=60,
+                            help="Seconds between seeded readings of one sensor")
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Requests per read/single-ingest scenario")
+        parser.add_argument('--bulk-size', type=int, default=500,
+                            help="Readings per bulk_ingest_readings request")
+        parser.add_argument('--bulk-requests', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='+', choices=SCENARIOS,
+                            help="Run only these scenarios")
+        parser.add_argument('--response-cache', action='store_true',
+                            help="Leave the response cache on (default measures the views uncached)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the seeded scratch database between runs")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help="Store the results as the new baseline")
+        parser.add_argument('--baseline', metavar='PATH',
+                            help="Compare against this baseline and fail on regression")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative slowdown before failing (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        scenarios = options['only'] or SCENARIOS
+
+        overrides = {'ALLOWED_HOSTS': ['testserver'], 'INGEST_QUEUE_ENABLED': False}
+        if not options['response_cache']:
+            overrides['CACHES'] = {
+                'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }
+            overrides['RESPONSE_CACHE_ALIAS'] = 'default'
+
+        results = {}
+        with scratch_database(keep=options['keepdb']), override_settings(**overrides):
+            self.sensor_ids = self.seed()
+            self.client = Client()
+            for name in scenarios:
+                results[name] = getattr(self, f"bench_{name}")()
+                self.report(name, results[name])
+
+        document = {
+            'meta': {
+                'vendor': connection.vendor,
+                'readings': options['readings'],
+                'sensors': options['sensors'],
+                'response_cache': options['response_cache'],
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'recorded_at': timezone.now().isoformat(),
+            },
+            'results': results,
+        }
+        for path in filter(None, (options['output'], options['save_baseline'])):
+            with open(path, 'w') as f:
+                json.dump(document, f, indent=2)
+            self.stdout.write(f"Results written to {path}")
+
+        if options['baseline']:
+            self.check_baseline(document, options['baseline'], options['tolerance'])
+
+    # ------------------------------------------------------------------
+    # seeding
+    # ------------------------------------------------------------------
+
+    def seed(self):
+        count = self.options['readings']
+        sensor_count = self.options['sensors']
+        interval = self.options['interval']
+
+        Sensor.objects.bulk_create([
+            Sensor(sensor_id=f"BENCH-{i:04d}", name=f"BENCH-{i:04d}",
+                   latitude=13.0 + i * 0.001, longitude=80.2 + i * 0.001, is_active=True)
+            for i in range(sensor_count)
+        ], ignore_conflicts=True)
+        sensors = list(Sensor.objects.filter(sensor_id__startswith="BENCH-").order_by('id'))
+
+        existing = Reading.objects.count()
+        if existing >= count:
+            self.stdout.write(f"Reusing {existing:,} seeded readings")
+            return [s.sensor_id for s in sensors]
+
+        # Newest first, so the last 48 hours (forecast history) are always covered
+        now = timezone.now().replace(microsecond=0)
+        steps = -(-count // len(sensors))
+        started = time.perf_counter()
+        batch = []
+        written = 0
+        for step in range(steps):
+            timestamp = now - timedelta(seconds=step * interval)
+            for idx, sensor in enumerate(sensors):
+                if written + len(batch) >= count:
+                    break
+                aqi = round(self.rng.uniform(20, 250), 1)
+                batch.append(Reading(
+                    sensor=sensor,
+                    slave_id=idx + 1,
+                    timestamp=timestamp,
+                    temperature=round(self.rng.uniform(20, 35), 1),
+                    humidity=round(self.rng.uniform(40, 80), 1),
+                    air_quality=aqi,
+                    category_id=category_code(aqi),
+                    co_level=round(self.rng.uniform(0.1, 2.0), 2),
+                    no_level=round(self.rng.uniform(5, 50), 1),
+                    smoke=0.0,
+                ))
+            if len(batch) >= 20_000 or step == steps - 1:
+                Reading.objects.bulk_create(batch, batch_size=5000)
+                written += len(batch)
+                batch = []
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Seeded {written:,} readings for {len(sensors)} sensors in {elapsed:.1f}s "
+            f"({connection.vendor})"
+        )
+        return [s.sensor_id for s in sensors]
+
+    # ------------------------------------------------------------------
+    # scenarios
+    # ------------------------------------------------------------------
+
+    def measure(self, request, count, before=None, rows_per_request=1):
+        """Time ``request(i)`` ``count`` times after a warmup; fail on non-2xx."""
+        for i in range(self.options['warmup']):
+            if before:
+                before()
+            request(-1 - i)
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(count):
+            if before:
+                before()
+            t0 = time.perf_counter()
+            response = request(i)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 300:
+                raise CommandError(
+                    f"Benchmark request failed with {response.status_code}: {response.content[:300]!r}"
+                )
+        return summarize(latencies, time.perf_counter() - started, rows_per_request)
+
+    def random_sensor(self):
+        return self.rng.choice(self.sensor_ids)
+
+    def reading_payload(self, sensor_id, timestamp):
+        return {
+            'sensor_id': sensor_id,
+            'slave_id': 900,
+            'timestamp': timestamp.isoformat(),
+            'temperature': round(self.rng.uniform(20, 35), 1),
+            'humidity': round(self.rng.uniform(40, 80), 1),
+            'air_quality': round(self.rng.uniform(10, 300), 1),
+            'co_level': round(self.rng.uniform(0.1, 2.0), 2),
+            'no_level': round(self.rng.uniform(5, 50), 1),
+            'smoke': 0.0,
+        }
+
+    def ingest_clock(self):
+        # Future timestamps on a dedicated slave id never collide with seeded
+        # rows or with each other, even with --keepdb.
+        base = timezone.now() + timedelta(days=1)
+        return lambda i: base + timedelta(microseconds=(i + 1_000) * 1_000)
+
+    def bench_ingest_reading(self):
+        clock = self.ingest_clock()
+        return self.measure(lambda i: self.client.post(
+            '/api/readings/ingest/',
+            data=json.dumps(self.reading_payload(self.random_sensor(), clock(i))),
+            content_type='application/json',
+        ), self.options['requests'])
+
+    def bench_bulk_ingest_readings(self):
+        clock = self.ingest_clock()
+        size = self.options['bulk_size']
+
+        def request(i):
+            offset = (i + 1_000) * size
+            payload = [
+                self.reading_payload(sensor_id, clock(offset + j))
+                for j, sensor_id in enumerate(self.rng.choices(self.sensor_ids, k=size))
+            ]
+            return self.client.post('/api/readings/bulk-ingest/', data=json.dumps(payload),
+                                    content_type='application/json')
+
+        return self.measure(request, self.options['bulk_requests'], rows_per_request=size)
+
+    def bench_readings_list(self):
+        return self.measure(
+            lambda i: self.client.get('/api/readings/', {'sensor': self.random_sensor()}),
+            self.options['requests'],
+        )
+
+    def bench_sensor_readings(self):
+        return self.measure(
+            lambda i: self.client.get(f'/api/sensors/{self.random_sensor()}/readings/',
+                                      {'hours': 24, 'limit': 100}),
+            self.options['requests'],
+        )
+
+    def bench_sensor_forecast(self):
+        # Cold model cache, so every request fits a model like after new data
+        return self.measure(
+            lambda i: self.client.get(f'/api/sensors/{self.random_sensor()}/forecast/'),
+            self.options['requests'],
+            before=clear_cache,
+        )
+
+    def bench_sensors_list(self):
+        return self.measure(lambda i: self.client.get('/api/sensors/'), self.options['requests'])
+
+    # ------------------------------------------------------------------
+    # reporting
+    # ------------------------------------------------------------------
+
+    def report(self, name, result):
+        unit = 'rows/s' if name == 'bulk_ingest_readings' else 'req/s'
+        self.stdout.write(
+            f"{name:<22} {result['requests']:>5} req  {result['throughput']:>10,.1f} {unit:<7}"
+            f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms"
+        )
+
+    def check_baseline(self, document, path, tolerance):
+        try:
+            with open(path) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline {path}: {e}")
+
+        meta, base_meta = document['meta'], baseline.get('meta', {})
+        for key in ('vendor', 'readings', 'sensors', 'response_cache'):
+            if base_meta.get(key) != meta[key]:
+                self.stderr.write(
+                    f"⚠️ Baseline {key} was {base_meta.get(key)!r}, this run is {meta[key]!r}"
+                )
+
+        regressions = compare(document['results'], baseline, tolerance)
+        if regressions:
+            raise CommandError(
+                f"Performance regression against {path} (tolerance {tolerance:.0%}):\n  "
+                + "\n  ".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(f"✅ No regression against {path}"))
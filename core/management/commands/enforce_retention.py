@@ -0,0 +1,100 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from api.retention import DEFAULT_BATCH_SIZE, DEFAULT_PAUSE, enforce, get_policy
+
+
+def format_bytes(value):
+    if value is None:
+        return "unknown size"
+    if value < 1024:
+        return f"{value} B"
+    size = value / 1024
+    for unit in ("KB", "MB"):
+        if size < 1024:
+            return f"{size:,.1f} {unit}"
+        size /= 1024
+    return f"{size:,.1f} GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the READING_RETENTION policy: delete raw readings and rollups past "
+        "their tier's retention in bounded batches and record the run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report rows and bytes that would be reclaimed without deleting")
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'RETENTION_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        parser.add_argument('--pause', type=float,
+                            default=getattr(settings, 'RETENTION_PAUSE', DEFAULT_PAUSE),
+                            help="Seconds to sleep between delete batches")
+        parser.add_argument('--archive', action='store_true',
+                            default=getattr(settings, 'READING_RETENTION_ARCHIVE', False),
+                            help="Export raw days to the Parquet archive before deleting them")
+        parser.add_argument('--raw-days', type=float, help="Override the raw tier for this run")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Run every N seconds until stopped (default: once)")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM SQLite afterwards to return the space to the OS "
+                                 "(locks the database while it runs)")
+
+    def handle(self, *args, **options):
+        overrides = {'raw': options['raw_days']} if options['raw_days'] else None
+        try:
+            policy = get_policy(overrides)
+        except Exception as e:
+            raise CommandError(str(e))
+
+        self.running = True
+        if options['interval']:
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            close_old_connections()
+            self.run_once(policy, options)
+            if not options['interval']:
+                break
+            deadline = time.monotonic() + options['interval']
+            while self.running and time.monotonic() < deadline:
+                time.sleep(min(1.0, deadline - time.monotonic()))
+
+    def run_once(self, policy, options):
+        label = "🔎 Retention dry run" if options['dry_run'] else "🧹 Enforcing retention"
+        self.stdout.write(f"{label}: " + ", ".join(
+            f"{tier} {'forever' if days is None else f'{days:g}d'}" for tier, days in policy.items()
+        ))
+        try:
+            run = enforce(
+                policy=policy,
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                archive=options['archive'],
+                log=self.stdout.write,
+            )
+        except Exception as e:
+            self.stderr.write(f"❌ Retention run failed: {e}")
+            if not options['interval']:
+                raise CommandError(str(e))
+            return
+
+        verb = "would reclaim" if run.dry_run else "reclaimed"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Run #{run.pk}: {run.rows_deleted:,} rows, {verb} ~{format_bytes(run.bytes_reclaimed)}"
+        ))
+
+        if options['vacuum'] and not run.dry_run and run.rows_deleted and connection.vendor == 'sqlite':
+            self.stdout.write("Vacuuming SQLite database...")
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Sensor, Reading
+from ._bench import scratch_database
+
+
+def range_queries(sensor, slave_id, start, end):
+    """The range scans issued by the sensor readings, forecast and list endpoints."""
+    return {
+        'get_sensor_readings': (
+            'reading_sensor_ts_idx',
+            Reading.objects.filter(
+                sensor=sensor, timestamp__gte=start, timestamp__lte=end
+            ).order_by('-timestamp')[:100],
+        ),
+        'get_sensor_forecast': (
+            'reading_sensor_ts_idx',
+            Reading.objects.filter(
+                sensor=sensor, timestamp__gte=start, timestamp__lte=end
+            ).order_by('timestamp'),
+        ),
+        'ReadingViewSet (slave_id)': (
+            'reading_slave_ts_idx',
+            Reading.objects.filter(
+                slave_id=slave_id, timestamp__gte=start, timestamp__lte=end
+            ).order_by('-timestamp'),
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with readings and check via EXPLAIN that the "
+        "sensor/slave time-range queries use the composite indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--sensors', type=int, default=100)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            sensor, slave_id = self.seed(options['rows'], options['sensors'], options['batch_size'])
+
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            end = timezone.now()
+            start = end - timedelta(hours=24)
+
+            failures = []
+            for label, (index_name, qs) in range_queries(sensor, slave_id, start, end).items():
+                plan = qs.explain()
+                self.stdout.write(f"--- {label}\n{plan}")
+                if index_name not in plan:
+                    failures.append(f"{label} does not use {index_name}")
+
+        if failures:
+            raise CommandError("; ".join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f"All range queries use their composite index at {options['rows']:,} rows"
+        ))
+
+    def seed(self, rows, sensor_count, batch_size):
+        Sensor.objects.bulk_create([
+            Sensor(sensor_id=f"EXPLAIN-{i:04d}", name=f"EXPLAIN-{i:04d}")
+            for i in range(sensor_count)
+        ])
+        sensors = list(Sensor.objects.order_by('id'))
+
+        now = timezone.now()
+        per_sensor = max(rows // sensor_count, 1)
+        # Progress only on a terminal, where it rewrites a single line
+        progress = self.stdout.isatty()
+        batch = []
+        written = 0
+        for step in range(per_sensor):
+            timestamp = now - timedelta(minutes=step)
+            for idx, sensor in enumerate(sensors):
+                batch.append(Reading(
+                    sensor=sensor,
+                    slave_id=idx + 1,
+                    timestamp=timestamp,
+                    air_quality=float(step % 300),
+                ))
+            if len(batch) >= batch_size:
+                Reading.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+                if progress:
+                    self.stdout.write(f"\rSeeded {written:,} readings", ending='')
+                    self.stdout.flush()
+        if batch:
+            Reading.objects.bulk_create(batch)
+            written += len(batch)
+        # Ends the progress line before the plans are printed
+        prefix = "\r" if progress else ""
+        self.stdout.write(f"{prefix}Seeded {written:,} readings", ending="\n")
+
+        return sensors[0], 1
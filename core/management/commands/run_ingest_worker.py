@@ -0,0 +1,87 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.history_store import history_store
+from api.ingest_queue import get_queue, process_batch
+from api.sync import sync_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the standalone ingest worker: drain the durable ingest queue into "
+        "the database in large batched transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'INGEST_WORKER_BATCH_SIZE', 2000))
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'INGEST_WORKER_POLL_INTERVAL', 0.5),
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--sync', action='store_true',
+                            help="Also sync the simulator history into the database "
+                                 "(instead of the web process's sync thread)")
+        parser.add_argument('--sync-interval', type=float, default=10,
+                            help="Seconds between history syncs with --sync")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        queue = get_queue()
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        sync_interval = options['sync_interval']
+        next_sync = 0.0
+        backoff = poll_interval
+
+        self.stdout.write(f"🚀 Ingest worker started (queue: {queue.path}, batch size {batch_size})")
+
+        while self.running:
+            close_old_connections()
+            try:
+                written, dead = process_batch(queue, batch_size)
+                backoff = poll_interval
+            except Exception as e:
+                self.stderr.write(f"❌ Ingest batch failed, retrying in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+
+            if written or dead:
+                stats = queue.stats()
+                self.stdout.write(
+                    f"✅ Wrote {written} readings ({dead} dead-lettered), {stats['depth']} queued"
+                )
+
+            if options['sync'] and time.monotonic() >= next_sync:
+                self.sync_history()
+                next_sync = time.monotonic() + sync_interval
+
+            if written + dead < batch_size:
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+
+        self.stdout.write("🛑 Ingest worker stopped")
+
+    def sync_history(self):
+        try:
+            result = sync_store(history_store)
+            if result['synced_count']:
+                self.stdout.write(
+                    f"✅ Sync complete: {result['synced_count']} added "
+                    f"(Total synced: {result['total_synced']})"
+                )
+        except Exception as e:
+            self.stderr.write(f"❌ Database sync error: {e}")
+
+    def stop(self, signum, frame):
+        self.running = False
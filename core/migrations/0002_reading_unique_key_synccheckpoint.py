@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    """Keep the oldest row for every (sensor, slave_id, timestamp) key."""
+    Reading = apps.get_model('core', 'Reading')
+    duplicates = (
+        Reading.objects
+        .values('sensor', 'slave_id', 'timestamp')
+        .annotate(keep_id=models.Min('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates.iterator():
+        Reading.objects.filter(
+            sensor=dup['sensor'],
+            slave_id=dup['slave_id'],
+            timestamp=dup['timestamp'],
+        ).exclude(id=dup['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_slave_id', models.IntegerField(blank=True, null=True)),
+                ('total_synced', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='blogpost',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='img/'),
+        ),
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reading',
+            constraint=models.UniqueConstraint(fields=('sensor', 'slave_id', 'timestamp'), name='unique_reading_key'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_reading_unique_key_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['sensor', '-timestamp'], name='reading_sensor_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reading',
+            index=models.Index(fields=['slave_id', '-timestamp'], name='reading_slave_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# (code, name, color, min AQI, max AQI) as in AqiCategory.LEVELS at this point
+LEVELS = (
+    (1, "Good", "Green", 0, 50),
+    (2, "Satisfactory", "Light Green", 51, 100),
+    (3, "Moderate", "Yellow", 101, 200),
+    (4, "Poor", "Orange", 201, 300),
+    (5, "Very Poor", "Red", 301, 400),
+    (6, "Severe", "Maroon", 401, 500),
+)
+
+# Names stored by the old simulator without an AQI-based equivalent
+LEGACY_NAMES = {"Excellent": 1, "Unhealthy": 5}
+
+
+def seed_categories(apps, schema_editor):
+    AqiCategory = apps.get_model('core', 'AqiCategory')
+    AqiCategory.objects.bulk_create([
+        AqiCategory(code=code, name=name, color=color, min_aqi=low, max_aqi=high)
+        for code, name, color, low, high in LEVELS
+    ], ignore_conflicts=True)
+
+
+def backfill_categories(apps, schema_editor):
+    """One UPDATE from the stored AQI; the old strings only where it is missing"""
+    Reading = apps.get_model('core', 'Reading')
+    by_aqi = models.Case(
+        *[models.When(air_quality__lt=high + 0.5, then=models.Value(code)) for code, _, _, _, high in LEVELS[:-1]],
+        default=models.Value(LEVELS[-1][0]),
+    )
+    Reading.objects.filter(air_quality__isnull=False).update(category_id=by_aqi)
+
+    names = {name: code for code, name, _, _, _ in LEVELS}
+    names.update(LEGACY_NAMES)
+    for name, code in names.items():
+        Reading.objects.filter(air_quality__isnull=True, aqi_category__iexact=name).update(category_id=code)
+
+
+def restore_strings(apps, schema_editor):
+    Reading = apps.get_model('core', 'Reading')
+    for code, name, color, _, _ in LEVELS:
+        Reading.objects.filter(category_id=code).update(aqi_category=name, aqi_color=color)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_compactionrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AqiCategory',
+            fields=[
+                ('code', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('color', models.CharField(max_length=20)),
+                ('min_aqi', models.PositiveSmallIntegerField()),
+                ('max_aqi', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'verbose_name_plural': 'AQI categories',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.RunPython(seed_categories, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='reading',
+            name='pm25',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reading',
+            name='category',
+            field=models.ForeignKey(blank=True, db_column='aqi_category_code', db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='readings', to='core.aqicategory'),
+        ),
+        migrations.RunPython(backfill_categories, restore_strings),
+        migrations.RemoveField(
+            model_name='reading',
+            name='aqi_category',
+        ),
+        migrations.RemoveField(
+            model_name='reading',
+            name='aqi_color',
+        ),
+    ]
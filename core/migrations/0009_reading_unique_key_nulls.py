@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    """Keep the oldest row for every key, counting NULL sensor/slave_id as 0."""
+    Reading = apps.get_model('core', 'Reading')
+    duplicates = (
+        Reading.objects
+        .annotate(
+            sensor_key=Coalesce('sensor', models.Value(0)),
+            slave_key=Coalesce('slave_id', models.Value(0)),
+        )
+        .values('sensor_key', 'slave_key', 'timestamp')
+        .annotate(keep_id=models.Min('id'), rows=models.Count('id'))
+        .filter(rows__gt=1)
+    )
+    for dup in duplicates.iterator():
+        Reading.objects.annotate(
+            sensor_key=Coalesce('sensor', models.Value(0)),
+            slave_key=Coalesce('slave_id', models.Value(0)),
+        ).filter(
+            sensor_key=dup['sensor_key'],
+            slave_key=dup['slave_key'],
+            timestamp=dup['timestamp'],
+        ).exclude(id=dup['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_aqi_category'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='reading',
+            name='unique_reading_key',
+        ),
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reading',
+            constraint=models.UniqueConstraint(
+                Coalesce('sensor', models.Value(0)),
+                Coalesce('slave_id', models.Value(0)),
+                'timestamp',
+                name='unique_reading_key',
+            ),
+        ),
+    ]
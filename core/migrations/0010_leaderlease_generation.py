@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_reading_unique_key_nulls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderlease',
+            name='generation',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
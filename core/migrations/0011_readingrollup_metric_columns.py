@@ -0,0 +1,240 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:05
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+METRICS = ("air_quality", "temperature", "humidity", "co_level", "no_level")
+STATS = ("count", "sum", "min", "max", "last")
+WIDE_FIELDS = [f"{metric}_{stat}" for metric in METRICS for stat in STATS] + ["last_timestamp"]
+BUCKETS_PER_PASS = 2000
+
+
+def merge_metric_rows(apps, schema_editor):
+    """Fold the one-row-per-metric rollups into one row per bucket, a window of buckets at a time"""
+    ReadingRollup = apps.get_model('core', 'ReadingRollup')
+    series = ReadingRollup.objects.values('sensor_id', 'resolution').annotate(
+        first=models.Min('bucket_start'), last=models.Max('bucket_start'),
+    ).order_by()
+
+    for entry in series:
+        step = timedelta(seconds=entry['resolution'] * BUCKETS_PER_PASS)
+        start = entry['first']
+        while start <= entry['last']:
+            rows = ReadingRollup.objects.filter(
+                sensor_id=entry['sensor_id'], resolution=entry['resolution'],
+                bucket_start__gte=start, bucket_start__lt=start + step,
+            ).order_by('bucket_start', 'id')
+
+            keepers, drop = {}, []
+            for row in rows:
+                keeper = keepers.setdefault(row.bucket_start, row)
+                if keeper is not row:
+                    drop.append(row.pk)
+                for stat in STATS:
+                    setattr(keeper, f"{row.metric}_{stat}", getattr(row, stat))
+                if row.last_timestamp and (keeper.last_timestamp is None or row.last_timestamp > keeper.last_timestamp):
+                    keeper.last_timestamp = row.last_timestamp
+
+            ReadingRollup.objects.bulk_update(keepers.values(), WIDE_FIELDS, batch_size=500)
+            for i in range(0, len(drop), 500):
+                ReadingRollup.objects.filter(pk__in=drop[i:i + 500]).delete()
+            start += step
+
+
+def split_metric_rows(apps, schema_editor):
+    """Back to one row per metric and bucket"""
+    ReadingRollup = apps.get_model('core', 'ReadingRollup')
+    last_id = ReadingRollup.objects.order_by('-id').values_list('id', flat=True).first()
+    if last_id is None:
+        return
+    batch = []
+    for row in ReadingRollup.objects.filter(id__lte=last_id).iterator(chunk_size=5000):
+        for metric in METRICS:
+            if not getattr(row, f"{metric}_count"):
+                continue
+            batch.append(ReadingRollup(
+                sensor_id=row.sensor_id, resolution=row.resolution, bucket_start=row.bucket_start,
+                metric=metric, last_timestamp=row.last_timestamp,
+                **{stat: getattr(row, f"{metric}_{stat}") for stat in STATS},
+            ))
+        if len(batch) >= 5000:
+            ReadingRollup.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ReadingRollup.objects.bulk_create(batch)
+    ReadingRollup.objects.filter(id__lte=last_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_leaderlease_generation'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='readingrollup',
+            name='unique_rollup_bucket',
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='air_quality_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='air_quality_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='air_quality_min',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='air_quality_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='air_quality_last',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='temperature_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='temperature_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='temperature_min',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='temperature_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='temperature_last',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='humidity_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='humidity_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='humidity_min',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='humidity_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='humidity_last',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='co_level_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='co_level_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='co_level_min',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='co_level_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='co_level_last',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='no_level_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='no_level_sum',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='no_level_min',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='no_level_max',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='readingrollup',
+            name='no_level_last',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(merge_metric_rows, split_metric_rows),
+        # A default, so the column can be added back to existing rows when reversing
+        migrations.AlterField(
+            model_name='readingrollup',
+            name='metric',
+            field=models.CharField(choices=[('air_quality', 'Air quality'), ('temperature', 'Temperature'), ('humidity', 'Humidity'), ('co_level', 'CO level'), ('no_level', 'NO level')], default='air_quality', max_length=20),
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='metric',
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='count',
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='sum',
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='min',
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='max',
+        ),
+        migrations.RemoveField(
+            model_name='readingrollup',
+            name='last',
+        ),
+        migrations.AddConstraint(
+            model_name='readingrollup',
+            constraint=models.UniqueConstraint(fields=('sensor', 'resolution', 'bucket_start'), name='unique_rollup_bucket'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -24,6 +26,39 @@ class Sensor(models.Model):
 #         return f"{self.name} ({self.location})"
 
 
+class AqiCategory(models.Model):
+    """CPCB AQI band. Readings reference it by ``code`` instead of storing name/color strings."""
+    GOOD = 1
+    SATISFACTORY = 2
+    MODERATE = 3
+    POOR = 4
+    VERY_POOR = 5
+    SEVERE = 6
+    # (code, name, color, min AQI, max AQI)
+    LEVELS = (
+        (GOOD, "Good", "Green", 0, 50),
+        (SATISFACTORY, "Satisfactory", "Light Green", 51, 100),
+        (MODERATE, "Moderate", "Yellow", 101, 200),
+        (POOR, "Poor", "Orange", 201, 300),
+        (VERY_POOR, "Very Poor", "Red", 301, 400),
+        (SEVERE, "Severe", "Maroon", 401, 500),
+    )
+    BY_CODE = {level[0]: level for level in LEVELS}
+
+    code = models.PositiveSmallIntegerField(primary_key=True)
+    name = models.CharField(max_length=30, unique=True)
+    color = models.CharField(max_length=20)
+    min_aqi = models.PositiveSmallIntegerField()
+    max_aqi = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ["code"]
+        verbose_name_plural = "AQI categories"
+
+    def __str__(self):
+        return f"{self.code}: {self.name} ({self.min_aqi}-{self.max_aqi})"
+
+
 class Reading(models.Model):
     # raw slave id from device
     slave_id = models.IntegerField(null=True, blank=True)
@@ -39,9 +74,21 @@ class Reading(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     temperature = models.FloatField(null=True, blank=True)
     humidity = models.FloatField(null=True, blank=True)
+    # AQI (0-500); pm25 is the raw PM2.5 concentration in µg/m³
     air_quality = models.FloatField(null=True, blank=True)
-    aqi_category = models.CharField(max_length=50, blank=True)
-    aqi_color = models.CharField(max_length=20, blank=True)
+    pm25 = models.FloatField(null=True, blank=True)
+    # Compact code into AqiCategory. No DB constraint, so inserts into this
+    # (hottest) table skip the FK check; the codes are fixed (AqiCategory.LEVELS).
+    category = models.ForeignKey(
+        AqiCategory,
+        on_delete=models.DO_NOTHING,
+        related_name="readings",
+        null=True,
+        blank=True,
+        db_column="aqi_category_code",
+        db_constraint=False,
+        db_index=False,
+    )
     co_level = models.FloatField(null=True, blank=True)
     no_level = models.FloatField(null=True, blank=True)
     smoke = models.FloatField(null=True, blank=True)
@@ -50,11 +97,191 @@ class Reading(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["sensor", "-timestamp"], name="reading_sensor_ts_idx"),
+            models.Index(fields=["slave_id", "-timestamp"], name="reading_slave_ts_idx"),
+            models.Index(fields=["-timestamp", "-id"], name="reading_ts_id_idx"),
+        ]
+        constraints = [
+            # NULL never equals NULL in a unique index, so a missing sensor or
+            # slave_id is folded to 0 (as api.ingest.reading_key does)
+            models.UniqueConstraint(
+                Coalesce("sensor", Value(0)),
+                Coalesce("slave_id", Value(0)),
+                "timestamp",
+                name="unique_reading_key",
+            ),
+        ]
+
+    @property
+    def aqi_category(self):
+        level = AqiCategory.BY_CODE.get(self.category_id)
+        return level[1] if level else ""
+
+    @property
+    def aqi_color(self):
+        level = AqiCategory.BY_CODE.get(self.category_id)
+        return level[2] if level else ""
 
     def __str__(self):
         return f"slave:{self.slave_id or 'unk'} @ {self.timestamp:%Y-%m-%d %H:%M}"
 
 
+class ReadingRollup(models.Model):
+    """
+    Per-sensor count/sum/min/max/last of every metric over a time bucket,
+    one row per (sensor, resolution, bucket) with a column group per metric.
+    """
+    MINUTE = 60
+    HOUR = 3600
+    DAY = 86400
+    RESOLUTION_CHOICES = (
+        (MINUTE, "1 minute"),
+        (HOUR, "1 hour"),
+        (DAY, "1 day"),
+    )
+    METRIC_CHOICES = (
+        ("air_quality", "Air quality"),
+        ("temperature", "Temperature"),
+        ("humidity", "Humidity"),
+        ("co_level", "CO level"),
+        ("no_level", "NO level"),
+    )
+    STATS = ("count", "sum", "min", "max", "last")
+
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name="rollups")
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    # Newest reading folded into the bucket. A batch's ``*_last`` replaces the
+    # stored one when the batch is at least as new, so a metric missing from
+    # the newest reading can keep an older value if readings arrive late
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+
+    air_quality_count = models.PositiveIntegerField(default=0)
+    air_quality_sum = models.FloatField(default=0.0)
+    air_quality_min = models.FloatField(null=True, blank=True)
+    air_quality_max = models.FloatField(null=True, blank=True)
+    air_quality_last = models.FloatField(null=True, blank=True)
+
+    temperature_count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0.0)
+    temperature_min = models.FloatField(null=True, blank=True)
+    temperature_max = models.FloatField(null=True, blank=True)
+    temperature_last = models.FloatField(null=True, blank=True)
+
+    humidity_count = models.PositiveIntegerField(default=0)
+    humidity_sum = models.FloatField(default=0.0)
+    humidity_min = models.FloatField(null=True, blank=True)
+    humidity_max = models.FloatField(null=True, blank=True)
+    humidity_last = models.FloatField(null=True, blank=True)
+
+    co_level_count = models.PositiveIntegerField(default=0)
+    co_level_sum = models.FloatField(default=0.0)
+    co_level_min = models.FloatField(null=True, blank=True)
+    co_level_max = models.FloatField(null=True, blank=True)
+    co_level_last = models.FloatField(null=True, blank=True)
+
+    no_level_count = models.PositiveIntegerField(default=0)
+    no_level_sum = models.FloatField(default=0.0)
+    no_level_min = models.FloatField(null=True, blank=True)
+    no_level_max = models.FloatField(null=True, blank=True)
+    no_level_last = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["bucket_start"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sensor", "resolution", "bucket_start"],
+                name="unique_rollup_bucket",
+            ),
+        ]
+
+    def summary(self, metric):
+        """avg/min/max/last/count of ``metric`` in this bucket, or None if it has no values."""
+        count = getattr(self, f"{metric}_count")
+        if not count:
+            return None
+        return {
+            "avg": getattr(self, f"{metric}_sum") / count,
+            "min": getattr(self, f"{metric}_min"),
+            "max": getattr(self, f"{metric}_max"),
+            "last": getattr(self, f"{metric}_last"),
+            "count": count,
+        }
+
+    def __str__(self):
+        return f"{self.sensor_id}/{self.resolution}s @ {self.bucket_start:%Y-%m-%d %H:%M}"
+
+
+class SyncCheckpoint(models.Model):
+    """Durable high-water mark for the JSON-to-database sync."""
+    name = models.CharField(max_length=50, unique=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    last_slave_id = models.IntegerField(null=True, blank=True)
+    total_synced = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_timestamp or 'start'}"
+
+
+class SimulationState(models.Model):
+    """Simulator settings and latest tick, shared by every server process."""
+    name = models.CharField(max_length=50, unique=True)
+    running = models.BooleanField(default=False)
+    sensor_count = models.PositiveSmallIntegerField(default=1)
+    sensor_data = models.JSONField(default=list, blank=True)
+    tick = models.PositiveBigIntegerField(default=0)
+    reset_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({'running' if self.running else 'stopped'}, tick {self.tick})"
+
+
+class LeaderLease(models.Model):
+    """Expiring lock naming the one process that runs a background role."""
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=100, blank=True)
+    acquired_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Fencing token: bumped on every takeover, never on renewal
+    generation = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} held by {self.holder or 'nobody'} until {self.expires_at}"
+
+
+class CompactionRun(models.Model):
+    """One run of the retention policy: what it deleted (or would have, in a dry run)."""
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    )
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    dry_run = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=RUNNING)
+    policy = models.JSONField(default=dict, blank=True)
+    # tier -> {"cutoff", "rows", "bytes", "batches"}
+    tiers = models.JSONField(default=dict, blank=True)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    bytes_reclaimed = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        kind = "dry run" if self.dry_run else "compaction"
+        return f"{kind} @ {self.started_at:%Y-%m-%d %H:%M}: {self.rows_deleted} rows ({self.status})"
+
+
 class BlogPost(models.Model):
     STATUS_CHOICES = (
         ("draft", "Draft"),
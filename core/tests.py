@@ -1,3 +1,831 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection, models
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.management.commands.benchmark import compare
+from core.management.commands.explain_reading_queries import range_queries
+from api import archive, cache, ingest, ingest_queue, metrics, renderers, retention, runtime
+from api.batcher import MicroBatcher, split_results
+from api.forecasting import clear_cache, forecast_sensor
+from api.history_store import HistoryStore
+from api.logbuffer import LogBuffer
+from api.ingest import insert_readings, store_readings
+from api.rollups import apply_readings, window_summary
+from api.simulator import GridSimulator
+from api.sync import parse_record_timestamp, sync_records
+from core.models import CompactionRun, LeaderLease, Sensor, Reading, ReadingRollup, SimulationState, SyncCheckpoint
+
+
+# The response cache would answer the second request without touching the
+# database at all; count the queries of the view itself
+NO_RESPONSE_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class IngestDuplicateTests(TestCase):
+    """Readings already stored, or repeated within a batch, are per-row errors; the rest are written."""
+
+    def setUp(self):
+        self.start = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=1)
+
+    def payload(self, minute, aqi=50):
+        return {
+            'sensor_id': 'D-001', 'slave_id': 1, 'air_quality': aqi,
+            'timestamp': (self.start + timedelta(minutes=minute)).isoformat(),
+        }
+
+    def test_duplicates_are_rejected_per_row(self):
+        readings, errors = insert_readings([self.payload(0), self.payload(1)])
+        self.assertEqual((len(readings), errors), (2, []))
+
+        batch = [self.payload(1, aqi=99), self.payload(2), self.payload(2, aqi=98), self.payload(3)]
+        readings, errors = insert_readings(batch)
+        self.assertEqual([r.air_quality for r in readings], [50, 50])
+        self.assertEqual([e['index'] for e in errors], [0, 2])
+        self.assertTrue(all(e['errors'] == ingest.DUPLICATE_ERRORS for e in errors))
+
+        self.assertEqual(Reading.objects.count(), 4)
+        self.assertFalse(Reading.objects.filter(air_quality__in=[98, 99]).exists())
+        minute = ReadingRollup.objects.get(resolution=ReadingRollup.MINUTE, bucket_start=self.start + timedelta(minutes=1))
+        self.assertEqual(minute.air_quality_count, 1)
+
+    def test_bulk_ingest_reports_duplicates(self):
+        insert_readings([self.payload(0)])
+        response = self.client.post('/api/readings/bulk-ingest/', [self.payload(0), self.payload(1)],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['created_count'], body['error_count']), (1, 1))
+        self.assertEqual(body['errors'][0]['index'], 0)
+
+        response = self.client.post('/api/readings/bulk-ingest/', [self.payload(0)],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Reading.objects.count(), 2)
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class SensorListQueryTests(TestCase):
+    """/api/sensors/ loads every sensor's latest reading without a query per sensor."""
+
+    def add_sensors(self, count):
+        now = timezone.now()
+        start = Sensor.objects.count()
+        for i in range(start, start + count):
+            sensor = Sensor.objects.create(sensor_id=f"Q-{i:03d}", name=f"Q-{i:03d}")
+            Reading.objects.bulk_create([
+                Reading(sensor=sensor, slave_id=1, timestamp=now - timedelta(minutes=m), air_quality=50 + m)
+                for m in range(3)
+            ])
+
+    def list_sensors(self):
+        response = self.client.get('/api/sensors/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_sensors(self):
+        self.add_sensors(3)
+        with self.assertNumQueries(2):
+            data = self.list_sensors()
+        self.assertEqual(len(data), 3)
+
+        self.add_sensors(27)
+        with self.assertNumQueries(2):
+            data = self.list_sensors()
+        self.assertEqual(len(data), 30)
+
+    def test_latest_reading_is_the_newest(self):
+        self.add_sensors(2)
+        for item in self.list_sensors():
+            self.assertEqual(item['latest']['air_quality'], 50)
+
+
+class ReadingIndexTests(TestCase):
+    """The sensor/slave time-range queries are planned on their composite indexes."""
+
+    SENSORS = 20
+    MINUTES = 24 * 60
+
+    @classmethod
+    def setUpTestData(cls):
+        # A day of 1-minute readings for 20 sensors (28,800 rows): an hour of
+        # one sensor is 0.2% of the table, so a scan is clearly the worse plan
+        Sensor.objects.bulk_create([Sensor(sensor_id=f"IX-{i:02d}", name=f"IX-{i:02d}") for i in range(cls.SENSORS)])
+        cls.sensors = list(Sensor.objects.order_by('id'))
+        now = timezone.now()
+        Reading.objects.bulk_create([
+            Reading(sensor=sensor, slave_id=idx + 1, timestamp=now - timedelta(minutes=step), air_quality=float(step))
+            for step in range(cls.MINUTES)
+            for idx, sensor in enumerate(cls.sensors)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Reading._meta.db_table)
+        self.assertEqual(constraints['reading_sensor_ts_idx']['columns'], ['sensor_id', 'timestamp'])
+        self.assertEqual(constraints['reading_slave_ts_idx']['columns'], ['slave_id', 'timestamp'])
+
+    def test_range_queries_use_composite_indexes(self):
+        end = timezone.now()
+        start = end - timedelta(hours=1)
+        for label, (index_name, qs) in range_queries(self.sensors[0], 1, start, end).items():
+            with self.subTest(label):
+                plan = qs.explain()
+                self.assertIn(index_name, plan)
+                if connection.vendor == 'sqlite':
+                    self.assertIn('USING INDEX', plan)
+
+
+class BenchmarkBaselineTests(TestCase):
+    """``manage.py benchmark --baseline`` flags only slowdowns beyond the tolerance."""
+
+    baseline = {'results': {'sensors_list': {'p50_ms': 10.0, 'p95_ms': 20.0, 'throughput': 100.0}}}
+
+    def test_within_tolerance(self):
+        current = {'sensors_list': {'p50_ms': 12.0, 'p95_ms': 15.0, 'throughput': 80.0}}
+        self.assertEqual(compare(current, self.baseline, 0.25), [])
+
+    def test_regressions(self):
+        current = {'sensors_list': {'p50_ms': 13.0, 'p95_ms': 20.0, 'throughput': 70.0}}
+        regressions = compare(current, self.baseline, 0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('sensors_list.p50_ms: 10.0 -> 13.0'))
+        self.assertTrue(regressions[1].startswith('sensors_list.throughput'))
+
+    def test_unknown_scenario_is_ignored(self):
+        current = {'sensor_forecast': {'p50_ms': 500.0}}
+        self.assertEqual(compare(current, self.baseline, 0.25), [])
+
+
+class RollupTests(TestCase):
+    """Batches merge into one row per sensor, resolution and bucket with every metric's totals."""
+
+    def setUp(self):
+        self.sensor = Sensor.objects.create(sensor_id="R-001", name="R-001")
+        self.start = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def reading(self, second, aqi, temperature=None):
+        return Reading(sensor=self.sensor, slave_id=1, timestamp=self.start + timedelta(seconds=second),
+                       air_quality=aqi, temperature=temperature)
+
+    def test_batches_merge_into_bucket_totals(self):
+        self.assertEqual(apply_readings([self.reading(10, 40, 20.0), self.reading(50, 60)]), 3)
+        # A second batch for the same minute, one reading older than what is stored
+        apply_readings([self.reading(55, 100, 22.0), self.reading(5, 10)])
+
+        self.assertEqual(ReadingRollup.objects.count(), 3)
+        minute = ReadingRollup.objects.get(resolution=ReadingRollup.MINUTE)
+        self.assertEqual(minute.summary('air_quality'),
+                         {'avg': 52.5, 'min': 10, 'max': 100, 'last': 100, 'count': 4})
+        self.assertEqual(minute.summary('temperature'),
+                         {'avg': 21.0, 'min': 20.0, 'max': 22.0, 'last': 22.0, 'count': 2})
+        self.assertIsNone(minute.summary('co_level'))
+        self.assertEqual(minute.last_timestamp, self.start + timedelta(seconds=55))
+
+        summary = window_summary(self.sensor, self.start, self.start + timedelta(hours=1),
+                                 resolution=ReadingRollup.HOUR)
+        self.assertEqual(summary, {'avg': 52.5, 'min': 10, 'max': 100, 'count': 4})
+
+    def test_ingest_totals_match_raw_readings(self):
+        payloads = [
+            {'sensor_id': 'R-001', 'slave_id': 1, 'air_quality': (17 * i) % 300,
+             'temperature': 20 + i % 7, 'timestamp': (self.start + timedelta(seconds=20 * i)).isoformat()}
+            for i in range(150)
+        ]
+        # Several batches, as several ingest requests would write them
+        for offset in range(0, len(payloads), 40):
+            insert_readings(payloads[offset:offset + 40])
+
+        raw = Reading.objects.aggregate(count=models.Count('id'), sum=models.Sum('air_quality'),
+                                        min=models.Min('air_quality'), max=models.Max('air_quality'))
+        for resolution in (ReadingRollup.HOUR, ReadingRollup.DAY):
+            rollup = ReadingRollup.objects.get(resolution=resolution)
+            self.assertEqual(
+                (rollup.air_quality_count, rollup.air_quality_sum, rollup.air_quality_min, rollup.air_quality_max),
+                (raw['count'], raw['sum'], raw['min'], raw['max']),
+            )
+        minutes = ReadingRollup.objects.filter(resolution=ReadingRollup.MINUTE)
+        self.assertEqual(minutes.count(), 50)
+        self.assertEqual(sum(m.air_quality_count for m in minutes), 150)
+        self.assertEqual(sum(m.temperature_sum for m in minutes),
+                         Reading.objects.aggregate(total=models.Sum('temperature'))['total'])
+
+
+class ForecastRollupTests(TestCase):
+    """Forecasts fitted on the 1-minute rollups match the fit on raw readings."""
+
+    def setUp(self):
+        clear_cache()
+        self.sensor = Sensor.objects.create(sensor_id="F-001", name="F-001")
+        now = timezone.now()
+        readings = Reading.objects.bulk_create([
+            Reading(sensor=self.sensor, slave_id=1, timestamp=now - timedelta(seconds=20 * i),
+                    air_quality=80 - i * 0.01 + (i % 3))
+            for i in range(2000)
+        ])
+        apply_readings(readings)
+
+    def tearDown(self):
+        clear_cache()
+
+    def test_rollups_and_raw_agree(self):
+        from_rollups = forecast_sensor(self.sensor)
+        ReadingRollup.objects.all().delete()
+        clear_cache()
+        from_raw = forecast_sensor(self.sensor)
+
+        self.assertEqual(from_rollups['current_aqi'], from_raw['current_aqi'])
+        self.assertEqual(from_rollups['trend'], from_raw['trend'])
+        for a, b in zip(from_rollups['forecast'], from_raw['forecast']):
+            self.assertAlmostEqual(a['predicted_aqi'], b['predicted_aqi'], delta=1.0)
+
+
+class SyncRollupTests(TestCase):
+    """Replaying history that is already stored neither counts nor rolls it up twice."""
+
+    def records(self, count):
+        start = timezone.localtime(timezone.now()).replace(microsecond=0) - timedelta(minutes=count)
+        return [{
+            'name': 'SYNC-1',
+            'slave_id': 1,
+            'timestamp': (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            'aqi': 50 + i,
+        } for i in range(count)]
+
+    def rolled_up(self):
+        return sum(ReadingRollup.objects.filter(
+            resolution=ReadingRollup.MINUTE
+        ).values_list('air_quality_count', flat=True))
+
+    def test_replay_after_checkpoint_loss(self):
+        records = self.records(10)
+        self.assertEqual(sync_records(records[:6])['synced_count'], 6)
+
+        # Lose the high-water mark so the first six are offered again
+        SyncCheckpoint.objects.update(last_timestamp=None, last_slave_id=None)
+        result = sync_records(records)
+
+        self.assertEqual(result['synced_count'], 4)
+        self.assertEqual(result['total_synced'], 10)
+        self.assertEqual(Reading.objects.count(), 10)
+        self.assertEqual(self.rolled_up(), 10)
+
+    def test_row_stored_concurrently_after_the_lookup(self):
+        records = self.records(5)
+        sensor = Sensor.objects.create(sensor_id="SYNC-1", name="SYNC-1")
+        Reading.objects.create(sensor=sensor, slave_id=1, air_quality=52,
+                               timestamp=parse_record_timestamp(records[2]['timestamp']))
+
+        real = ingest.split_duplicates
+        calls = []
+
+        def lookup(readings):
+            # The first lookup runs before the concurrent insert committed
+            calls.append(len(readings))
+            if len(calls) == 1:
+                return list(range(len(readings))), []
+            return real(readings)
+
+        with mock.patch('api.ingest.split_duplicates', side_effect=lookup):
+            result = sync_records(records)
+
+        self.assertEqual(result['synced_count'], 4)
+        self.assertEqual(result['total_synced'], 4)
+        self.assertEqual(Reading.objects.count(), 5)
+        self.assertEqual(self.rolled_up(), 4)
+        self.assertEqual(len(calls), 2)
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class SensorReadingStatsTests(TestCase):
+    """avg/min/max come from one aggregate query over the returned window, zeros included."""
+
+    def setUp(self):
+        sensor = Sensor.objects.create(sensor_id="S-001", name="S-001")
+        now = timezone.now()
+        Reading.objects.bulk_create([
+            Reading(sensor=sensor, slave_id=1, timestamp=now - timedelta(minutes=i), air_quality=aqi)
+            for i, aqi in enumerate([0, 40, 80, 200])
+        ])
+
+    def test_stats_aggregate_the_limited_window(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/sensors/S-001/readings/?limit=3&fields=air_quality')
+        stats = response.json()['stats']
+        self.assertEqual((stats['current_aqi'], stats['min_aqi'], stats['max_aqi']), (0, 0, 80))
+        self.assertAlmostEqual(stats['avg_aqi'], 40.0)
+        self.assertEqual(len(queries), 3)
+        self.assertIn('AVG(', queries[-1]['sql'].upper())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}},
+    RESPONSE_CACHE_WINDOW=60,
+)
+class RelativeWindowCacheTests(TestCase):
+    """Responses over a window relative to now expire with the clock, not only on ingest."""
+
+    def setUp(self):
+        sensor = Sensor.objects.create(sensor_id="W-001", name="W-001")
+        Reading.objects.create(sensor=sensor, slave_id=1, timestamp=timezone.now(), air_quality=60)
+
+    def get(self, clock):
+        with mock.patch('api.cache.time.time', return_value=clock):
+            return self.client.get('/api/sensors/W-001/readings/?hours=1')
+
+    def test_cached_within_a_window(self):
+        first = self.get(6000.0)
+        second = self.get(6030.0)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn('max-age=30', second['Cache-Control'])
+
+    def test_next_window_is_a_new_entry(self):
+        first = self.get(6000.0)
+        later = self.get(6061.0)
+        self.assertEqual(later['X-Cache'], 'MISS')
+        self.assertNotEqual(first['ETag'], later['ETag'])
+
+        with mock.patch('api.cache.time.time', return_value=6062.0):
+            stale = self.client.get('/api/sensors/W-001/readings/?hours=1', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(stale.status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    """Polls revalidate with a 304 until ingest bumps the sensor's version."""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.addCleanup(cache.get_cache().clear)
+        Sensor.objects.create(sensor_id="C-001", name="C-001")
+
+    def ingest(self, aqi):
+        with self.captureOnCommitCallbacks(execute=True):
+            insert_readings([{'sensor_id': 'C-001', 'slave_id': 1, 'air_quality': aqi,
+                              'timestamp': timezone.now().isoformat()}])
+
+    def test_etag_revalidation_and_invalidation(self):
+        self.ingest(40)
+        first = self.client.get('/api/sensors/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/sensors/')
+            not_modified = self.client.get('/api/sensors/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((cached['X-Cache'], cached['ETag']), ('HIT', first['ETag']))
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.ingest(80)
+        changed = self.client.get('/api/sensors/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual((changed.status_code, changed['X-Cache']), (200, 'MISS'))
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.json()[0]['latest']['air_quality'], 80)
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class BatchReadingsTests(TestCase):
+    """/api/sensors/batch/readings/ only answers for active sensors."""
+
+    def setUp(self):
+        now = timezone.now()
+        for sensor_id, active in (("B-001", True), ("B-002", False)):
+            sensor = Sensor.objects.create(sensor_id=sensor_id, name=sensor_id, is_active=active)
+            Reading.objects.create(sensor=sensor, slave_id=1, timestamp=now, air_quality=70)
+
+    def test_inactive_sensor_is_missing(self):
+        response = self.client.get('/api/sensors/batch/readings/?ids=B-001,B-002')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data['sensors']), ['B-001'])
+        self.assertEqual(data['missing'], ['B-002'])
+
+
+class GridSimulatorTests(TestCase):
+    """Readings built straight from the simulator's arrays match the validated ingest path."""
+
+    FIELDS = ('sensor_id', 'slave_id', 'timestamp', 'temperature', 'humidity', 'air_quality',
+              'category_id', 'pm25', 'co_level', 'no_level', 'smoke', 'latitude', 'longitude')
+
+    def test_to_readings_matches_ingest(self):
+        sim = GridSimulator(25, seed=7)
+        sim.register_sensors()
+        timestamp = timezone.now().replace(microsecond=0)
+        arrays = sim.tick(timestamp)
+
+        stored, duplicates = store_readings(sim.to_readings(arrays, timestamp, sim.sensors()))
+        self.assertEqual((len(stored), duplicates), (25, []))
+        direct = list(Reading.objects.order_by('slave_id').values_list(*self.FIELDS))
+
+        Reading.objects.all().delete()
+        ingested, errors = insert_readings(sim.to_payloads(arrays, timestamp))
+        self.assertEqual((len(ingested), errors), (25, []))
+        self.assertEqual(list(Reading.objects.order_by('slave_id').values_list(*self.FIELDS)), direct)
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class ArchiveExportTests(TestCase):
+    """Exports stream the archive and the database oldest first; pruning opens only exported partitions."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = override_settings(READING_ARCHIVE_DIR=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.sensors = [Sensor.objects.create(sensor_id=f"AR-{i}", name=f"AR-{i}") for i in range(2)]
+        now = timezone.now()
+        Reading.objects.bulk_create([
+            Reading(sensor=sensor, slave_id=idx + 1, timestamp=now - timedelta(hours=hour), air_quality=50)
+            for hour in range(0, 24 * 5, 3)
+            for idx, sensor in enumerate(self.sensors)
+        ])
+        self.before = archive.day_floor(now - timedelta(days=2))
+
+    def export(self, fmt='parquet'):
+        response = self.client.get('/api/readings/export/', {
+            'from': (timezone.now() - timedelta(days=6)).isoformat(), 'format': fmt,
+        })
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        if fmt == 'arrow':
+            return archive.pa.ipc.open_stream(body).read_all()
+        return archive.pq.read_table(archive.pa.BufferReader(body))
+
+    def test_round_trip_and_prune(self):
+        Reading.objects.filter(sensor=self.sensors[0]).update(temperature=21.5, humidity=40.0, category_id=1)
+        old = Reading.objects.filter(timestamp__lt=self.before)
+        expected = list(old.order_by('timestamp', 'id').values(*archive.DB_FIELDS))
+        recent = Reading.objects.count() - len(expected)
+
+        result = archive.export_partitions(self.before)
+        self.assertEqual(result['rows'], len(expected))
+        self.assertEqual(archive.export_partitions(self.before)['rows'], 0)
+
+        rows = sorted(archive.table_to_rows(archive.read_archive(end=self.before)),
+                      key=lambda r: (r['timestamp'], r['id']))
+        self.assertEqual(rows, [
+            {name: row[field] for name, field in zip(archive.COLUMNS, archive.DB_FIELDS)} for row in expected
+        ])
+
+        self.assertEqual(archive.prune_archived(self.before), {'deleted': len(expected), 'kept': 0, 'before': self.before})
+        self.assertFalse(old.exists())
+        self.assertEqual(Reading.objects.count(), recent)
+        self.assertEqual(archive.pruned_before(), self.before)
+        self.assertEqual(archive.read_archive(end=self.before).num_rows, len(expected))
+
+    def test_export_spans_archive_and_database(self):
+        total = Reading.objects.count()
+        archive.export_partitions(self.before)
+        archive.prune_archived(self.before)
+        late = Reading.objects.create(sensor=self.sensors[0], slave_id=1,
+                                      timestamp=self.before - timedelta(days=1, minutes=1), air_quality=99)
+
+        for fmt in ('parquet', 'arrow'):
+            table = self.export(fmt)
+            ids = table['id'].to_pylist()
+            self.assertEqual(len(ids), total + 1)
+            self.assertEqual(len(set(ids)), len(ids))
+            self.assertIn(late.pk, ids)
+            keys = list(zip(table['timestamp'].to_pylist(), ids))
+            self.assertEqual(keys, sorted(keys))
+
+    def test_prune_reads_only_partitions_with_rows(self):
+        archive.export_partitions(self.before)
+        archive.prune_archived(self.before)
+        Reading.objects.create(sensor=self.sensors[1], slave_id=2,
+                               timestamp=self.before - timedelta(days=1, minutes=1), air_quality=99)
+
+        with mock.patch.object(archive.pq, 'read_table', wraps=archive.pq.read_table) as read_table:
+            result = archive.prune_archived(self.before)
+        self.assertEqual(read_table.call_count, 1)
+        self.assertEqual((result['deleted'], result['kept']), (0, 1))
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class RetentionTests(TestCase):
+    """Each tier loses only rows past its cut-off, and raw rows are rolled up before they go."""
+
+    def setUp(self):
+        # Midday, so readings seconds apart never straddle a day bucket
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        self.sensor = Sensor.objects.create(sensor_id="RT-001", name="RT-001")
+        insert_readings([
+            {'sensor_id': 'RT-001', 'slave_id': 1, 'air_quality': aqi,
+             'timestamp': (self.now - age).isoformat()}
+            for aqi, age in ((40, timedelta(days=10)), (60, timedelta(days=10, seconds=-20)), (80, timedelta(days=1)))
+        ])
+        # Bulk-loaded around the ingest pipeline, so never rolled up
+        self.unrolled = Reading.objects.create(sensor=self.sensor, slave_id=1, air_quality=100,
+                                               timestamp=self.now - timedelta(days=9))
+        # Rollups only, the raw rows are long gone
+        apply_readings([Reading(sensor=self.sensor, slave_id=1, air_quality=20,
+                                timestamp=self.now - timedelta(days=100))])
+
+    def enforce(self, **kwargs):
+        return retention.enforce(policy={'raw': 7, 'minute': 90}, batch_size=1, pause=0,
+                                 now=self.now, log=lambda message: None, **kwargs)
+
+    def test_dry_run_deletes_nothing(self):
+        run = self.enforce(dry_run=True)
+        self.assertEqual((run.tiers['raw']['rows'], run.tiers['minute']['rows']), (3, 1))
+        self.assertNotIn('hour', run.tiers)
+        self.assertEqual(Reading.objects.count(), 4)
+        self.assertEqual(ReadingRollup.objects.count(), 3 * 3)
+
+    def test_prunes_each_tier_past_its_cutoff(self):
+        run = self.enforce()
+        self.assertEqual(run.status, CompactionRun.COMPLETED)
+        self.assertEqual(run.tiers['raw'], dict(run.tiers['raw'], rows=3, batches=3, downsampled=1))
+        self.assertEqual(run.tiers['minute']['rows'], 1)
+        self.assertEqual(run.rows_deleted, 4)
+
+        self.assertEqual(list(Reading.objects.values_list('air_quality', flat=True)), [80])
+        old = self.now - timedelta(days=100)
+        self.assertFalse(ReadingRollup.objects.filter(resolution=ReadingRollup.MINUTE, bucket_start__lt=old + timedelta(days=1)).exists())
+        self.assertEqual(ReadingRollup.objects.filter(bucket_start__lt=old + timedelta(days=1)).count(), 2)
+
+        # The unrolled reading survives as rollups in every retained tier
+        summary = window_summary(self.sensor, self.unrolled.timestamp, self.unrolled.timestamp + timedelta(minutes=1),
+                                 resolution=ReadingRollup.MINUTE)
+        self.assertEqual(summary['max'], 100)
+        ten_days = ReadingRollup.objects.get(resolution=ReadingRollup.DAY, bucket_start__lte=self.now - timedelta(days=10),
+                                             bucket_start__gt=self.now - timedelta(days=11))
+        self.assertEqual(ten_days.air_quality_count, 2)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Concurrent submissions share one write and each gets back only its own rows and errors."""
+
+    def write(self, rows):
+        self.writes.append(list(rows))
+        if any(row == 'boom' for row in rows):
+            raise DatabaseError("boom")
+        results = [row.upper() for row in rows if row != 'bad']
+        errors = [{'index': i, 'data': row, 'errors': {}} for i, row in enumerate(rows) if row == 'bad']
+        return results, errors
+
+    def submit_all(self, submissions, max_rows=100):
+        self.writes = []
+        batcher = MicroBatcher(self.write, max_rows=max_rows, max_wait=0.01)
+
+        async def run():
+            return await asyncio.gather(*(batcher.submit(rows) for rows in submissions), return_exceptions=True)
+        return asyncio.run(run())
+
+    def test_split_results(self):
+        parts = split_results(['A', 'C', 'D'], [{'index': 1}, {'index': 4}], [2, 1, 2])
+        self.assertEqual(parts, [(['A'], [{'index': 1}]), (['C'], []), (['D'], [{'index': 1}])])
+
+    def test_one_write_per_batch(self):
+        outcomes = self.submit_all([['a', 'bad'], ['c'], ['bad', 'e']])
+        self.assertEqual(self.writes, [['a', 'bad', 'c', 'bad', 'e']])
+        self.assertEqual([results for results, _ in outcomes], [['A'], ['C'], ['E']])
+        self.assertEqual([[e['index'] for e in errors] for _, errors in outcomes], [[1], [], [0]])
+
+    def test_full_batch_is_written_without_waiting(self):
+        self.submit_all([['a', 'b'], ['c', 'd'], ['e']], max_rows=4)
+        self.assertEqual(self.writes, [['a', 'b', 'c', 'd'], ['e']])
+
+    def test_failed_batch_is_retried_per_request(self):
+        outcomes = self.submit_all([['a'], ['boom'], ['c']])
+        self.assertEqual(self.writes, [['a', 'boom', 'c'], ['a'], ['boom'], ['c']])
+        self.assertEqual(outcomes[0], (['A'], []))
+        self.assertIsInstance(outcomes[1], DatabaseError)
+        self.assertEqual(outcomes[2], (['C'], []))
+
+
+class HistoryStoreTests(SimpleTestCase):
+    """Segment bookkeeping kept by append/rotate matches a store reloaded from disk."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def batch(self, tick, size=7):
+        return [{'timestamp': f"2026-01-01 00:{tick // 60:02d}:{tick % 60:02d}", 'slave_id': i} for i in range(size)]
+
+    def test_rotation_keeps_max_records(self):
+        store = HistoryStore(self.root, segment_records=20, max_records=50)
+        dropped = sum(store.append(self.batch(tick)) for tick in range(40))
+
+        self.assertEqual(store.count() + dropped, 40 * 7)
+        self.assertGreaterEqual(store.count(), 50)
+        self.assertLess(store.count() - 21, 50)
+        self.assertEqual(len(store.tail()), store.count())
+
+        reloaded = HistoryStore(self.root, segment_records=20, max_records=50)
+        self.assertEqual(reloaded.count(), store.count())
+        self.assertEqual(reloaded.stats(), store.stats())
+        self.assertEqual(reloaded.tail(3), store.tail(3))
+
+    def test_appends_continue_after_reload(self):
+        HistoryStore(self.root, segment_records=20, max_records=50).append(self.batch(0))
+        store = HistoryStore(self.root, segment_records=20, max_records=50)
+        for tick in range(1, 10):
+            store.append(self.batch(tick))
+        self.assertEqual(store.count(), len(store.tail()))
+        self.assertEqual(store.since("2026-01-01 00:00:08"), self.batch(9))
+
+
+class LogBufferMirrorTests(SimpleTestCase):
+    """Entries mirrored from other processes are neither skipped by cursors nor resurrected."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.path = f"{root}/logs.ndjson"
+
+    def buffer(self, source, maxlen=5):
+        log = LogBuffer(self.path, maxlen=maxlen)
+        log.source = source
+        return log
+
+    def test_late_lower_ids_are_not_skipped(self):
+        early, late, reader = self.buffer(1), self.buffer(2), self.buffer(3)
+        late._last_id += 10_000  # a process started later hands out higher ids
+        late.append("from the later process")
+        late.flush()
+        reader.mirror_file()
+        _, cursor = reader.since(None)
+
+        early.append("from the earlier process")
+        early.flush()
+        reader.mirror_file()
+        entries, _ = reader.since(cursor)
+        self.assertEqual([e["message"] for e in entries], ["from the earlier process"])
+
+    def test_evicted_entries_do_not_reappear(self):
+        writer, reader = self.buffer(1), self.buffer(2, maxlen=3)
+        for i in range(6):
+            writer.append(f"line {i}")
+        writer.flush()
+        reader.mirror_file()
+        self.assertEqual([e["message"] for e in reader.snapshot()], ["line 3", "line 4", "line 5"])
+
+        reader._file_offset = None  # e.g. the file was rotated: the tail is read again
+        self.assertEqual(reader.mirror_file(), [])
+        self.assertEqual(len(reader.snapshot()), 3)
+
+    def test_cursors_are_only_valid_on_their_own_worker(self):
+        worker, other = self.buffer(1), self.buffer(2)
+        entry = worker.append("first")
+        worker.append("second")
+        self.assertEqual(worker.parse_cursor(entry["cursor"]), 1)
+        self.assertEqual([e["message"] for e in worker.since(worker.parse_cursor(entry["cursor"]))[0]], ["second"])
+        # Another worker's (or a restarted worker's) cursor means a full resync
+        self.assertIsNone(other.parse_cursor(entry["cursor"]))
+        self.assertIsNone(worker.parse_cursor("12345"))
+
+    def test_own_entries_are_not_mirrored_back(self):
+        log = self.buffer(1)
+        log.append("mine")
+        log.flush()
+        self.assertEqual(log.mirror_file(), [])
+        self.assertEqual(len(log.snapshot()), 1)
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class IngestQueueTests(TestCase):
+    """Queued readings survive a failed write and a lost ack; invalid ones are dead-lettered."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.queue = ingest_queue.IngestQueue(f"{root}/queue.sqlite3", visibility_timeout=30)
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        self.payloads = [
+            {'sensor_id': 'IQ-001', 'slave_id': 1, 'air_quality': 50 + i,
+             'timestamp': (start + timedelta(minutes=i)).isoformat()}
+            for i in range(3)
+        ]
+
+    def test_failed_write_is_released_and_retried(self):
+        self.queue.enqueue(self.payloads)
+        with mock.patch.object(ingest_queue, 'ingest_readings', side_effect=DatabaseError("locked")):
+            with self.assertRaises(DatabaseError):
+                ingest_queue.process_batch(self.queue, 10)
+        stats = self.queue.stats()
+        self.assertEqual((stats['depth'], stats['claimed']), (3, 0))
+        self.assertEqual(Reading.objects.count(), 0)
+
+        self.assertEqual(ingest_queue.process_batch(self.queue, 10), (3, 0))
+        self.assertEqual(self.queue.stats()['depth'], 0)
+        self.assertEqual(Reading.objects.count(), 3)
+
+    def test_unacknowledged_batch_is_redelivered_once_visible(self):
+        self.queue.enqueue(self.payloads)
+        claimed = self.queue.claim(10)
+        # The worker committed these but died before the ack
+        insert_readings([payload for _, payload in claimed[:2]])
+        self.assertEqual(self.queue.claim(10), [])
+
+        later = time.time() + 31
+        with mock.patch.object(ingest_queue.time, 'time', return_value=later):
+            self.assertEqual(ingest_queue.process_batch(self.queue, 10), (1, 0))
+        self.assertEqual(self.queue.stats()['depth'], 0)
+        self.assertEqual(Reading.objects.count(), 3)
+
+    def test_invalid_reading_is_dead_lettered(self):
+        self.queue.enqueue(self.payloads[:1] + [dict(self.payloads[1], air_quality='high')])
+        self.assertEqual(ingest_queue.process_batch(self.queue, 10), (1, 1))
+        stats = self.queue.stats()
+        self.assertEqual((stats['depth'], stats['dead_letter']), (0, 1))
+
+
+class LeaderLeaseTests(TestCase):
+    """A leader stops before its lease can lapse, and a fenced-off leader's writes are ignored."""
+
+    def setUp(self):
+        self.addCleanup(runtime._held.clear)
+
+    def test_takeover_fences_the_old_holder(self):
+        self.assertTrue(runtime.acquire_lease(runtime.SIMULATOR))
+        self.assertTrue(runtime.record_tick([{'aqi': 1}], role=runtime.SIMULATOR))
+
+        # The lease lapsed while this process stalled and another worker took it
+        LeaderLease.objects.filter(name=runtime.SIMULATOR).update(
+            holder='other:1:abc', generation=models.F('generation') + 1,
+            expires_at=timezone.now() + timedelta(seconds=runtime.LEASE_TTL),
+        )
+        self.assertFalse(runtime.record_tick([{'aqi': 2}], role=runtime.SIMULATOR))
+        self.assertEqual(SimulationState.objects.get().sensor_data, [{'aqi': 1}])
+        self.assertFalse(runtime.acquire_lease(runtime.SIMULATOR))
+        self.assertFalse(runtime.holds_lease(runtime.SIMULATOR))
+
+    def test_stale_generation_cannot_renew(self):
+        self.assertTrue(runtime.acquire_lease(runtime.SYNCER))
+        # The lease moved on to a newer generation than the one this process took
+        LeaderLease.objects.filter(name=runtime.SYNCER).update(generation=models.F('generation') + 1)
+        self.assertFalse(runtime.acquire_lease(runtime.SYNCER))
+
+    def test_holder_stops_before_expiry_without_renewal(self):
+        with mock.patch('api.runtime.time.monotonic', return_value=1000.0):
+            self.assertTrue(runtime.acquire_lease(runtime.SIMULATOR))
+        deadline = 1000.0 + runtime.LEASE_TTL - runtime.LEASE_MARGIN
+        with mock.patch('api.runtime.time.monotonic', return_value=deadline - 0.1):
+            self.assertTrue(runtime.holds_lease(runtime.SIMULATOR))
+        with mock.patch('api.runtime.time.monotonic', return_value=deadline):
+            self.assertFalse(runtime.holds_lease(runtime.SIMULATOR))
+
+
+class MetricTests(SimpleTestCase):
+    """Every metric type renders its own samples; the base class has none."""
+
+    def test_base_metric_is_abstract(self):
+        with self.assertRaises(TypeError):
+            metrics.Metric("aqi_test", "Test metric")
+
+    def test_counter_renders_labelled_totals(self):
+        counter = metrics.Counter("aqi_test_runs", "Test runs", labels=("result",))
+        counter.inc(result="ok")
+        counter.inc(2, result="ok")
+        self.assertEqual(counter.render(), [
+            "# HELP aqi_test_runs Test runs",
+            "# TYPE aqi_test_runs counter",
+            'aqi_test_runs_total{result="ok"} 3',
+        ])
+
+
+@override_settings(CACHES=NO_RESPONSE_CACHE)
+class TimestampFormatTests(TestCase):
+    """A reading's timestamp is the same string on the DRF, hand-built and NDJSON endpoints."""
+
+    def setUp(self):
+        sensor = Sensor.objects.create(sensor_id="TS-001", name="TS-001")
+        # A second back, so the fixed microseconds never put it after "now"
+        timestamp = (timezone.now() - timedelta(seconds=1)).replace(microsecond=123456)
+        self.reading = Reading.objects.create(sensor=sensor, slave_id=1, air_quality=42, timestamp=timestamp)
+        self.expected = self.reading.timestamp.isoformat().replace('+00:00', 'Z')
+
+    def test_every_endpoint_writes_utc_as_z(self):
+        stamps = {
+            'readings': self.client.get('/api/readings/').json()['results'][0]['timestamp'],
+            'sensor readings': self.client.get('/api/sensors/TS-001/readings/').json()['readings'][0]['timestamp'],
+            'batch readings': self.client.get(
+                '/api/sensors/batch/readings/?ids=TS-001').json()['sensors']['TS-001']['readings'][0]['timestamp'],
+        }
+        for label, stamp in stamps.items():
+            with self.subTest(label):
+                self.assertEqual(stamp, self.expected)
+
+    def test_stdlib_fallback_matches_orjson(self):
+        data = {'timestamp': self.reading.timestamp}
+        fast = renderers.dumps(data)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(json.loads(renderers.dumps(data)), json.loads(fast))
+        self.assertEqual(json.loads(fast)['timestamp'], self.expected)
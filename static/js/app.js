@@ -113,10 +113,36 @@ async function selectSensor(sensorId, sensorIndex) {
     }
 }
 
+// Readings and forecasts for every map sensor come from one batch request
+// and are reused by the sensor panel, forecast chart and activity log.
+const SENSOR_BATCH_TTL = 30000;
+window.sensorBatch = { fetchedAt: 0, data: {}, pending: null };
+
+function loadSensorBatch(force = false) {
+    const batch = window.sensorBatch;
+    if (!force && Date.now() - batch.fetchedAt < SENSOR_BATCH_TTL) {
+        return Promise.resolve(batch.data);
+    }
+    if (batch.pending) return batch.pending;
+
+    const ids = Object.values(window.sensors || {}).map(s => s.id).join(',');
+    const fields = 'timestamp,air_quality,temperature,humidity,aqi_category';
+    batch.pending = fetch(`/api/sensors/batch/readings/?ids=${encodeURIComponent(ids)}&hours=24&limit=100&fields=${fields}&forecast=1`)
+        .then(response => response.json())
+        .then(json => {
+            batch.data = json.sensors || {};
+            batch.fetchedAt = Date.now();
+            return batch.data;
+        })
+        .finally(() => {
+            batch.pending = null;
+        });
+    return batch.pending;
+}
+
 async function loadSensorData(sensorId) {
     try {
-        const response = await fetch(`/api/sensors/${sensorId}/readings/?hours=24&limit=100`);
-        const data = await response.json();
+        const data = (await loadSensorBatch())[sensorId] || {};
         
         if (data.readings && data.readings.length > 0) {
             window.selectedSensorData = {
@@ -841,8 +867,8 @@ async function showSensorAnalytics(sensorId, sensorIndex) {
 
 async function loadSensorForecast(sensorId) {
     try {
-        const response = await fetch(`/api/sensors/${sensorId}/forecast/`);
-        const data = await response.json();
+        const entry = (await loadSensorBatch())[sensorId];
+        const data = (entry && entry.forecast) || { error: 'No forecast available' };
         
         if (data.error) {
             document.querySelector('.forecast-loading').textContent = 
@@ -929,8 +955,8 @@ async function loadSensorForecast(sensorId) {
 
 async function loadSensorLogs(sensorId) {
     try {
-        const response = await fetch(`/api/sensors/${sensorId}/readings/?limit=10`);
-        const data = await response.json();
+        const entry = (await loadSensorBatch())[sensorId];
+        const data = { readings: entry ? entry.readings.slice(0, 10) : [] };
         
         const logContainer = document.getElementById(`logs-${sensorId}`);
         if (!logContainer) return;
@@ -1045,6 +1071,12 @@ function initTerminalSidebar() {
 
     let logPollingInterval = null;
     let isPolling = false;
+    // Cursors are "<epoch>:<seq>" and only valid against the worker that
+    // issued them; a foreign one makes the server answer with a full reset.
+    // Lines are de-duplicated by their source process and id.
+    let logCursor = null;
+    const shownLogs = new Set();
+    const MAX_SHOWN_LOGS = 1000;
 
     widgetBtn.addEventListener("click", () => {
         terminalSidebar.classList.remove("hidden");
@@ -1072,6 +1104,24 @@ function initTerminalSidebar() {
         terminalContent.scrollTop = terminalContent.scrollHeight;
     }
 
+    function addLogEntry(log) {
+        const key = `${log.source}:${log.id}`;
+        if (shownLogs.has(key)) return;
+        shownLogs.add(key);
+        if (shownLogs.size > MAX_SHOWN_LOGS) {
+            shownLogs.delete(shownLogs.values().next().value);
+        }
+        addTerminalLog(log.level, log.message, log.timestamp);
+    }
+
+    function isNewerCursor(cursor, current) {
+        if (!cursor) return false;
+        if (current === null) return true;
+        const [epoch, seq] = cursor.split(":");
+        const [currentEpoch, currentSeq] = current.split(":");
+        return epoch !== currentEpoch || Number(seq) > Number(currentSeq);
+    }
+
     function clearTerminal() {
         terminalContent.innerHTML = `
             <div class="terminal-line">
@@ -1087,19 +1137,24 @@ function initTerminalSidebar() {
 
     async function fetchLogs() {
         try {
-            const response = await fetch("/api/logs/");
+            const url = logCursor === null ? "/api/logs/" : `/api/logs/?since=${logCursor}`;
+            const response = await fetch(url);
             if (!response.ok) throw new Error("Failed to fetch logs");
 
             const data = await response.json();
-            terminalContent.innerHTML = "";
+            logCursor = data.cursor;
 
-            if (data.logs && data.logs.length > 0) {
-                data.logs.forEach(log => {
-                    addTerminalLog(log.level, log.message, log.timestamp);
-                });
-            } else {
-                clearTerminal();
+            // Full snapshot: redraw. Otherwise only append the new entries.
+            if (data.reset) {
+                terminalContent.innerHTML = "";
+                shownLogs.clear();
+                if (!data.logs || data.logs.length === 0) {
+                    clearTerminal();
+                    return;
+                }
             }
+
+            (data.logs || []).forEach(addLogEntry);
         } catch (err) {
             console.error("Log fetch error:", err);
             addTerminalLog("ERROR", "Failed to fetch logs from server");
@@ -1109,8 +1164,12 @@ function initTerminalSidebar() {
     function startLogPolling() {
         if (isPolling) return;
         isPolling = true;
+        logCursor = null;
         fetchLogs();
-        logPollingInterval = setInterval(fetchLogs, 2000);
+        // With the live stream up, new lines arrive as 'simulationLog' events
+        if (!window.liveStream.connected) {
+            logPollingInterval = setInterval(fetchLogs, 2000);
+        }
     }
 
     function stopLogPolling() {
@@ -1121,27 +1180,50 @@ function initTerminalSidebar() {
         }
     }
 
+    window.addEventListener('simulationLog', (e) => {
+        if (!isPolling) return;
+        const log = e.detail;
+        if (!isNewerCursor(log.cursor, logCursor)) return;
+        logCursor = log.cursor;
+        addLogEntry(log);
+    });
+
+    window.addEventListener('liveStreamChanged', (e) => {
+        if (!isPolling) return;
+        if (e.detail && logPollingInterval) {
+            clearInterval(logPollingInterval);
+            logPollingInterval = null;
+        } else if (!e.detail && !logPollingInterval) {
+            logPollingInterval = setInterval(fetchLogs, 2000);
+        }
+    });
+
+    window.addEventListener('simulationStatus', (e) => applySimulationStatus(e.detail));
+
     async function checkSimulationStatus() {
         try {
             const response = await fetch("/api/simulation_status/");
             const data = await response.json();
-
-            if (data.running) {
-                startSimBtn.disabled = true;
-                stopSimBtn.disabled = false;
-                startLogPolling();
-                startNotificationMonitoring();
-            } else {
-                startSimBtn.disabled = false;
-                stopSimBtn.disabled = true;
-                stopLogPolling();
-                stopNotificationMonitoring();
-            }
+            applySimulationStatus(data);
         } catch (err) {
             console.error("Status check error:", err);
         }
     }
 
+    function applySimulationStatus(data) {
+        if (data.running) {
+            startSimBtn.disabled = true;
+            stopSimBtn.disabled = false;
+            startLogPolling();
+            startNotificationMonitoring();
+        } else {
+            startSimBtn.disabled = false;
+            stopSimBtn.disabled = true;
+            stopLogPolling();
+            stopNotificationMonitoring();
+        }
+    }
+
     async function startSimulation() {
         try {
             startSimBtn.disabled = true;
@@ -1347,7 +1429,15 @@ async function fetchSimulatedSensorData() {
     try {
         const res = await fetch('/api/sensor-data/');
         const json = await res.json();
+        applySimulatedSensorData(json);
+    } catch (error) {
+        console.error('Error fetching simulated sensor data:', error);
+    }
+}
 
+// Shared by the polling fetch above and the 'readings' stream event
+function applySimulatedSensorData(json) {
+    try {
         if (!json.data) return;
 
         window.sensorState = {};
@@ -1388,8 +1478,78 @@ async function fetchSimulatedSensorData() {
         }
 
     } catch (error) {
-        console.error('Error fetching simulated sensor data:', error);
+        console.error('Error applying simulated sensor data:', error);
+    }
+}
+
+// ============================================================================
+// LIVE STREAM (SSE) WITH POLLING FALLBACK
+// ============================================================================
+
+window.liveStream = { connected: false };
+let sensorDataPollingInterval = null;
+
+function startSensorDataPolling() {
+    if (sensorDataPollingInterval) return;
+    fetchSimulatedSensorData();
+    sensorDataPollingInterval = setInterval(fetchSimulatedSensorData, 5000);
+}
+
+function stopSensorDataPolling() {
+    if (sensorDataPollingInterval) {
+        clearInterval(sensorDataPollingInterval);
+        sensorDataPollingInterval = null;
+    }
+}
+
+function setLiveStreamConnected(connected) {
+    if (window.liveStream.connected === connected) return;
+    window.liveStream.connected = connected;
+
+    if (connected) {
+        stopSensorDataPolling();
+    } else {
+        startSensorDataPolling();
+    }
+
+    window.dispatchEvent(new CustomEvent('liveStreamChanged', { detail: connected }));
+}
+
+function initLiveStream() {
+    if (!window.EventSource) {
+        startSensorDataPolling();
+        return;
     }
+
+    // The browser resends Last-Event-ID on reconnect, so nothing is missed
+    const source = new EventSource('/api/stream/');
+
+    source.addEventListener('open', () => setLiveStreamConnected(true));
+
+    source.addEventListener('readings', (e) => {
+        applySimulatedSensorData(JSON.parse(e.data));
+    });
+
+    source.addEventListener('log', (e) => {
+        window.dispatchEvent(new CustomEvent('simulationLog', { detail: JSON.parse(e.data) }));
+    });
+
+    source.addEventListener('status', (e) => {
+        const status = JSON.parse(e.data);
+        window.simulationRunning = status.running;
+        window.dispatchEvent(new CustomEvent('simulationStatus', { detail: status }));
+    });
+
+    source.onerror = () => {
+        // CONNECTING: the browser is retrying; CLOSED: server refused (e.g. no ASGI)
+        setLiveStreamConnected(false);
+        if (source.readyState === EventSource.CLOSED) {
+            console.warn('Live stream unavailable, falling back to polling');
+        }
+    };
+
+    // Poll until the stream confirms it is open
+    startSensorDataPolling();
 }
 
 // ============================================================================
@@ -2013,13 +2173,17 @@ function startNotificationMonitoring() {
     
     // Check sensor AQI levels every 10 seconds
     notificationMonitoringInterval = setInterval(async () => {
-        // ✅ CHECK IF SIMULATION IS RUNNING
+        // ✅ CHECK IF SIMULATION IS RUNNING (pushed by the live stream when connected)
         try {
-            const response = await fetch("/api/simulation_status/");
-            const data = await response.json();
+            let running = window.simulationRunning;
+            if (!window.liveStream.connected) {
+                const response = await fetch("/api/simulation_status/");
+                const data = await response.json();
+                running = data.running;
+            }
             
             // If simulation is not running, skip checking
-            if (!data.running) {
+            if (!running) {
                 console.log('⚠️ Simulation stopped, pausing notifications');
                 return;
             }
@@ -2126,7 +2290,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // Initialize street view with default state
     updateMapStreetView();
 
-    // Fetch data immediately and then at intervals
-    fetchSimulatedSensorData();
-    setInterval(fetchSimulatedSensorData, 5000); // Refresh every 5 seconds for better sync
+    // Live updates over SSE; polls every 5 seconds only while the stream is down
+    initLiveStream();
+
+    // Warm the per-sensor readings/forecast cache with a single request
+    loadSensorBatch().catch(error => console.error('Error loading sensor batch:', error));
 });
\ No newline at end of file
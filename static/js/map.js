@@ -9,6 +9,11 @@ window.markerStack = {};
 let markerGroup;
 let streetPolylines = {}; // Store street polylines for humidity highlighting
 let sensorRadiusCircles = {}; // Store sensor radius circles (300m)
+let viewportLayer; // Sensors/clusters loaded for the visible area
+let viewportTimer;
+let viewportController;
+let heatmapLayer; // Server-rendered AQI heatmap tiles
+let heatmapRefreshedAt = 0;
 
 // ============================================================================
 // SENSOR DATA (SOURCE OF TRUTH)
@@ -56,6 +61,8 @@ function initMap() {
     loadTiles();
     initControls();
     initMapThemeSync();
+    initViewportLoading();
+    initHeatmap();
     
     // Initialize street polylines with humidity-based colors
     setTimeout(() => {
@@ -351,6 +358,8 @@ window.addEventListener('sensorCountChanged', (e) => {
 window.addEventListener('sensorDataUpdated', () => {
     updateMarkerColors();
     updateStreetPolylineColors(); // Update street colors based on humidity
+    scheduleViewportLoad();
+    refreshHeatmap();
 });
 
 function syncMarkersToCount(newCount) {
@@ -425,6 +434,138 @@ function updateMarkerColors() {
     });
 }
 
+// ============================================================================
+// AQI HEATMAP
+// ============================================================================
+
+// The heatmap is drawn by the server as PNG tiles interpolated from every
+// sensor's latest reading; the browser only draws images, however many
+// sensors there are. Tiles carry an ETag, so a redraw re-downloads only the
+// tiles around sensors that actually reported.
+
+const HEATMAP_REFRESH_MS = 30000;
+
+function initHeatmap() {
+    map.createPane('heatmap');
+    map.getPane('heatmap').style.zIndex = 350; // above the base map, below markers
+    map.getPane('heatmap').style.pointerEvents = 'none';
+
+    heatmapLayer = L.tileLayer('/api/heatmap/{z}/{x}/{y}.png', {
+        pane: 'heatmap',
+        opacity: 0.75,
+        minZoom: 10,
+        maxZoom: 18,
+        updateWhenZooming: false
+    }).addTo(map);
+    heatmapRefreshedAt = Date.now();
+}
+
+function refreshHeatmap() {
+    if (!heatmapLayer) return;
+    // Readings arrive every few seconds; the heatmap does not need to follow each one
+    if (Date.now() - heatmapRefreshedAt < HEATMAP_REFRESH_MS) return;
+    heatmapRefreshedAt = Date.now();
+    heatmapLayer.redraw();
+}
+
+// ============================================================================
+// VIEWPORT SENSORS (SERVER-SIDE SPATIAL INDEX)
+// ============================================================================
+
+// Registered sensors beyond the simulated ones above are loaded per viewport:
+// only what is on screen, grouped into clusters when zoomed out too far.
+
+function initViewportLoading() {
+    viewportLayer = L.layerGroup().addTo(map);
+    map.on('moveend', scheduleViewportLoad);
+    scheduleViewportLoad();
+}
+
+function scheduleViewportLoad() {
+    if (!map) return;
+    clearTimeout(viewportTimer);
+    viewportTimer = setTimeout(loadViewportSensors, 250);
+}
+
+function isSimulatedSensor(sensorId) {
+    return Object.values(window.sensors).some(s => s.id === sensorId || s.name === sensorId);
+}
+
+async function loadViewportSensors() {
+    const bounds = map.getBounds();
+    const bbox = [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()]
+        .map(v => v.toFixed(5))
+        .join(',');
+
+    // Only the latest viewport matters; drop the request for the previous one
+    if (viewportController) viewportController.abort();
+    viewportController = new AbortController();
+
+    try {
+        const response = await fetch(
+            `/api/sensors/viewport/?bbox=${bbox}&zoom=${map.getZoom()}`,
+            { signal: viewportController.signal }
+        );
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        renderViewport(await response.json());
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.warn('⚠️ Viewport sensors unavailable:', error);
+        }
+    }
+}
+
+function renderViewport(data) {
+    viewportLayer.clearLayers();
+
+    if (data.clustered) {
+        data.clusters.forEach(cluster => {
+            const color = cluster.avg_aqi === null ? '#999' : getAQIColor(cluster.avg_aqi);
+            L.circleMarker([cluster.latitude, cluster.longitude], {
+                radius: Math.min(8 + Math.sqrt(cluster.count) * 2, 30),
+                fillColor: color,
+                fillOpacity: 0.6,
+                color: '#111',
+                weight: 1
+            })
+                .bindTooltip(
+                    `${cluster.count} sensors<br>` +
+                    `Avg AQI: ${cluster.avg_aqi === null ? '—' : Math.round(cluster.avg_aqi)}`
+                )
+                .on('click', e => map.setView(e.latlng, Math.min(map.getZoom() + 2, map.getMaxZoom())))
+                .addTo(viewportLayer);
+        });
+        return;
+    }
+
+    data.sensors.forEach(sensor => {
+        if (isSimulatedSensor(sensor.sensor_id)) return;
+
+        const latest = sensor.latest;
+        const aqi = latest?.air_quality;
+        const color = aqi === null || aqi === undefined ? '#999' : getAQIColor(aqi);
+        L.circleMarker([sensor.latitude, sensor.longitude], {
+            radius: 6,
+            fillColor: color,
+            fillOpacity: 0.85,
+            color: '#111',
+            weight: 1
+        })
+            .bindPopup(`
+                <b>${sensor.sensor_id}</b><br>
+                ${sensor.name || sensor.area || ''}<br>
+                AQI: ${aqi === null || aqi === undefined ? '—' : Math.round(aqi)}
+                ${latest?.aqi_category ? `(${latest.aqi_category})` : ''}
+            `)
+            .on('click', async () => {
+                if (typeof window.selectSensor === 'function') {
+                    await window.selectSensor(sensor.sensor_id);
+                }
+            })
+            .addTo(viewportLayer);
+    });
+}
+
 // ============================================================================
 // EXPOSE selectSensor FOR EXTERNAL USE
 // ============================================================================